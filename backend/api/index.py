@@ -1,4 +1,3 @@
+# This is the entry point for Vercel: it serves the exported ASGI `app`
+# (data and models are loaded on the first request)
 from app.main import app
-
-# This is the entry point for Vercel
-handler = app
\ No newline at end of file
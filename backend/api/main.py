@@ -4,8 +4,6 @@ import os
 # Add the parent directory to the path so we can import from app
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+# Vercel serves the exported ASGI `app`. Lifespan events do not run there:
+# data and models are loaded on the first request.
 from app.main import app
-
-# Export the FastAPI app for Vercel
-def handler(request):
-    return app(request)
\ No newline at end of file
@@ -0,0 +1,285 @@
+"""
+Admission control: concurrency limits and bounded queues per endpoint cost class.
+
+Every HTTP request is classified by its path:
+
+- heavy: model scoring over the universe, simulations, market fetches
+- light: small lookups (AMCs, categories, stats)
+- standard: everything else
+- exempt: health checks (/), /metrics, the API docs, the market event stream
+  (capped by its own client limit) and /api/admin/* (which replays requests
+  through the app in-process, each admitted on its own)
+
+Each class admits up to its concurrency limit; further requests wait in a
+FIFO queue of bounded size for at most ADMISSION_QUEUE_TIMEOUT_SECONDS. A
+request arriving at a full queue, or timing out in it, gets an immediate
+503 with a Retry-After header (the estimated time to drain the class's
+queue) instead of queueing without bound, so a burst of one class cannot
+starve the others and health checks always answer.
+
+Rejections, queue depth, requests in flight and queue waits are exported on
+/metrics (when instrumentation is enabled) and at /api/admission/stats.
+Limits are per process: with serve.py each worker enforces its own.
+"""
+
+import asyncio
+import math
+import os
+import time
+from collections import deque
+
+from .instrumentation import LATENCY_BUCKETS, Histogram, format_labels, histogram_lines, metrics
+
+# "0" disables admission control (no middleware is installed)
+ADMISSION_CONTROL_ENABLED = os.getenv("ADMISSION_CONTROL_ENABLED", "1") != "0"
+
+# Concurrent requests and queued requests allowed per cost class
+ADMISSION_HEAVY_CONCURRENCY = int(os.getenv("ADMISSION_HEAVY_CONCURRENCY", 4))
+ADMISSION_HEAVY_QUEUE = int(os.getenv("ADMISSION_HEAVY_QUEUE", 16))
+ADMISSION_STANDARD_CONCURRENCY = int(os.getenv("ADMISSION_STANDARD_CONCURRENCY", 16))
+ADMISSION_STANDARD_QUEUE = int(os.getenv("ADMISSION_STANDARD_QUEUE", 64))
+ADMISSION_LIGHT_CONCURRENCY = int(os.getenv("ADMISSION_LIGHT_CONCURRENCY", 64))
+ADMISSION_LIGHT_QUEUE = int(os.getenv("ADMISSION_LIGHT_QUEUE", 256))
+
+# Longest a queued request waits for a slot before it is rejected
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", 5))
+
+HEAVY_PATHS = {
+    "/api/enhanced-analysis",
+    "/api/what-if-simulation",
+    "/api/recommend",
+    "/api/recommend/batch",
+    "/api/forecast/batch",
+    "/api/market-condition",
+    "/api/market-regimes",
+    "/api/backtest"
+}
+LIGHT_PATHS = {"/api/amcs", "/api/categories", "/api/prediction-batcher/stats", "/api/admission/stats",
+               "/api/market-condition/stream/stats"}
+# The market event stream is long-lived and near free; it has its own client cap
+EXEMPT_PATHS = {"/", "/metrics", "/docs", "/redoc", "/openapi.json", "/docs/oauth2-redirect",
+                "/api/market-condition/stream"}
+EXEMPT_PREFIXES = ("/api/admin/",)
+
+MAX_RETRY_AFTER_SECONDS = 60
+
+# Weight of the latest request in the per-class service time average
+SERVICE_TIME_SMOOTHING = 0.2
+
+
+def cost_class(path):
+    """Cost class of a request path ("exempt" requests are never limited)"""
+    if path in EXEMPT_PATHS or path.startswith(EXEMPT_PREFIXES):
+        return "exempt"
+    if path in HEAVY_PATHS:
+        return "heavy"
+    if path in LIGHT_PATHS:
+        return "light"
+    return "standard"
+
+
+class ClassLimiter:
+    """Concurrency slots and a bounded FIFO wait queue for one cost class (event loop only)"""
+
+    def __init__(self, name, concurrency, queue_size, queue_timeout=ADMISSION_QUEUE_TIMEOUT_SECONDS):
+        self.name = name
+        self.concurrency = max(1, concurrency)
+        self.queue_size = max(0, queue_size)
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self._waiters = deque()
+        self.admitted = 0
+        self.rejected = {"queue_full": 0, "queue_timeout": 0}
+        self.max_queue_depth = 0
+        self.service_seconds = None  # smoothed duration of admitted requests
+        self.queue_wait = Histogram(LATENCY_BUCKETS)
+
+    @property
+    def queue_depth(self):
+        return len(self._waiters)
+
+    async def acquire(self):
+        """Take a slot, waiting in the queue if needed; returns None or the rejection reason"""
+        if self.in_flight < self.concurrency and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            self.queue_wait.observe(0.0)
+            return None
+        if len(self._waiters) >= self.queue_size:
+            self.rejected["queue_full"] += 1
+            return "queue_full"
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+        expiry = loop.call_later(self.queue_timeout, self._expire, waiter)
+        start = time.perf_counter()
+        try:
+            granted = await waiter
+        except asyncio.CancelledError:
+            # Client gone while queued; hand on a slot granted in the meantime
+            if waiter.done() and not waiter.cancelled() and waiter.result():
+                self.release()
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+        finally:
+            expiry.cancel()
+
+        if not granted:
+            self.rejected["queue_timeout"] += 1
+            return "queue_timeout"
+        self.admitted += 1
+        self.queue_wait.observe(time.perf_counter() - start)
+        return None
+
+    def _expire(self, waiter):
+        if not waiter.done():
+            self._waiters.remove(waiter)
+            waiter.set_result(False)
+
+    def release(self, duration=None):
+        """Free a slot, handing it straight to the oldest queued request"""
+        if duration is not None:
+            if self.service_seconds is None:
+                self.service_seconds = duration
+            else:
+                self.service_seconds += SERVICE_TIME_SMOOTHING * (duration - self.service_seconds)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(True)
+                return
+        self.in_flight -= 1
+
+    def retry_after(self):
+        """Seconds until the queue ahead of a new request is expected to drain"""
+        service = self.service_seconds or 1.0
+        seconds = service * (len(self._waiters) + self.in_flight) / self.concurrency
+        return min(MAX_RETRY_AFTER_SECONDS, max(1, math.ceil(seconds)))
+
+    def stats(self):
+        bounds, counts, count, total = self.queue_wait.buckets()
+        return {
+            "concurrency": self.concurrency,
+            "queue_size": self.queue_size,
+            "in_flight": self.in_flight,
+            "queue_depth": len(self._waiters),
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "service_ms": round(self.service_seconds * 1000, 3) if self.service_seconds is not None else None,
+            "mean_queue_wait_ms": round(total / count * 1000, 3) if count else 0.0
+        }
+
+
+class AdmissionController:
+    """One ClassLimiter per cost class"""
+
+    def __init__(self, limits=None, queue_timeout=ADMISSION_QUEUE_TIMEOUT_SECONDS):
+        if limits is None:
+            limits = {
+                "heavy": (ADMISSION_HEAVY_CONCURRENCY, ADMISSION_HEAVY_QUEUE),
+                "standard": (ADMISSION_STANDARD_CONCURRENCY, ADMISSION_STANDARD_QUEUE),
+                "light": (ADMISSION_LIGHT_CONCURRENCY, ADMISSION_LIGHT_QUEUE)
+            }
+        self.limiters = {
+            name: ClassLimiter(name, concurrency, queue_size, queue_timeout)
+            for name, (concurrency, queue_size) in limits.items()
+        }
+
+    def stats(self):
+        return {name: limiter.stats() for name, limiter in self.limiters.items()}
+
+    def metric_lines(self):
+        """Prometheus exposition lines for the /metrics collector"""
+        limiters = sorted(self.limiters.items())
+        lines = [
+            "# HELP admission_rejected_total Requests rejected with 503 by cost class and reason.",
+            "# TYPE admission_rejected_total counter"
+        ]
+        for name, limiter in limiters:
+            for reason, count in sorted(limiter.rejected.items()):
+                lines.append(f"admission_rejected_total{{{format_labels(cost_class=name, reason=reason)}}} {count}")
+
+        lines += [
+            "# HELP admission_admitted_total Requests admitted by cost class.",
+            "# TYPE admission_admitted_total counter"
+        ]
+        lines += [f"admission_admitted_total{{{format_labels(cost_class=name)}}} {limiter.admitted}"
+                  for name, limiter in limiters]
+
+        lines += [
+            "# HELP admission_queue_depth Requests waiting for a slot.",
+            "# TYPE admission_queue_depth gauge"
+        ]
+        lines += [f"admission_queue_depth{{{format_labels(cost_class=name)}}} {limiter.queue_depth}"
+                  for name, limiter in limiters]
+
+        lines += [
+            "# HELP admission_in_flight Requests holding a slot.",
+            "# TYPE admission_in_flight gauge"
+        ]
+        lines += [f"admission_in_flight{{{format_labels(cost_class=name)}}} {limiter.in_flight}"
+                  for name, limiter in limiters]
+
+        lines += [
+            "# HELP admission_queue_wait_seconds Time admitted requests waited for a slot.",
+            "# TYPE admission_queue_wait_seconds histogram"
+        ]
+        for name, limiter in limiters:
+            lines += histogram_lines("admission_queue_wait_seconds", format_labels(cost_class=name), limiter.queue_wait)
+        return lines
+
+
+admission_controller = AdmissionController()
+
+
+class AdmissionControlMiddleware:
+    """Holds a cost-class slot for the whole request (streamed bodies included) or answers 503"""
+
+    def __init__(self, app, controller=admission_controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        limiter = self.controller.limiters.get(cost_class(scope["path"]))
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        reason = await limiter.acquire()
+        if reason is not None:
+            await self._reject(send, limiter, reason)
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.perf_counter() - start)
+
+    async def _reject(self, send, limiter, reason):
+        body = ('{"detail":"Server busy (%s requests, %s), retry later"}' % (limiter.name, reason)).encode()
+        await send({
+            "type": "http.response.start",
+            "status": 503,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(limiter.retry_after()).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def install_admission_control(app):
+    """Add the middleware and its /metrics lines to a FastAPI app. Does nothing when disabled."""
+    if not ADMISSION_CONTROL_ENABLED:
+        return
+    app.add_middleware(AdmissionControlMiddleware)
+    metrics.add_collector(admission_controller.metric_lines)
@@ -0,0 +1,233 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .market_data import get_bar_store
+from .market_regime import MarketDataError
+from .multi_regime import ema_2d
+
+# timeframe -> (stored bar interval, resample rule or None, hours per bar)
+TIMEFRAMES = {
+    "1H": ("1h", None, 1),
+    "4H": ("1h", "4H", 4),
+    "1D": ("1d", None, 24),
+    "1W": ("1d", "W", 168)
+}
+
+# Longest backtest window per timeframe (years)
+MAX_BACKTEST_YEARS = {"1H": 2, "4H": 2, "1D": 10, "1W": 30}
+
+DEFAULT_SPAN_PAIRS = [(12, 21)]
+
+# (bars x span pairs) cells evaluated at once; bounds the per-pair intermediates (~40 bytes per cell)
+BACKTEST_CHUNK_CELLS = 1_000_000
+
+# Bars before a signal searched for the turning point it reacts to
+LAG_LOOKBACK_BARS = 50
+
+
+def load_closes(ticker, timeframe="4H", years=2.0, store=None):
+    """Close series for the backtest window from the local bar store"""
+    if timeframe not in TIMEFRAMES:
+        raise ValueError(f"Unknown timeframe: {timeframe}. Available: {', '.join(TIMEFRAMES)}")
+
+    interval, rule, _ = TIMEFRAMES[timeframe]
+    store = store or get_bar_store()
+    data = store.get_bars(ticker, interval, timedelta(days=int(365 * years)))
+    if data.empty:
+        raise MarketDataError(f"No {interval} bars available for {ticker}")
+
+    closes = data['Close']
+    if rule:
+        closes = closes.resample(rule).last()
+    return closes.dropna()
+
+
+def span_grid(fast_spans, slow_spans):
+    """All (fast, slow) pairs with fast < slow"""
+    return [(int(f), int(s)) for f in fast_spans for s in slow_spans if f < s]
+
+
+def _forward_extremes(close, horizon):
+    """Per bar: return after `horizon` bars and bars until the highest / lowest close within it"""
+    n = len(close)
+    forward_return = np.full(n, np.nan)
+    bars_to_peak = np.full(n, np.nan)
+    bars_to_trough = np.full(n, np.nan)
+    if n > horizon:
+        windows = sliding_window_view(close, horizon + 1)
+        forward_return[:n - horizon] = windows[:, -1] / windows[:, 0] - 1
+        bars_to_peak[:n - horizon] = windows.argmax(axis=1)
+        bars_to_trough[:n - horizon] = windows.argmin(axis=1)
+    return forward_return, bars_to_peak, bars_to_trough
+
+
+def _backward_extremes(close, lookback):
+    """Per bar: bars since the lowest / highest close of the preceding `lookback` bars"""
+    n = len(close)
+    bars_since_low = np.full(n, np.nan)
+    bars_since_high = np.full(n, np.nan)
+    if n > lookback:
+        windows = sliding_window_view(close, lookback + 1)
+        bars_since_low[lookback:] = lookback - windows.argmin(axis=1)
+        bars_since_high[lookback:] = lookback - windows.argmax(axis=1)
+    return bars_since_low, bars_since_high
+
+
+def _masked_mean(values, mask):
+    """Column means of values (T,) or (T x P) over a (T x P) mask; NaN where the mask is empty"""
+    values = np.broadcast_to(values[:, None] if values.ndim == 1 else values, mask.shape)
+    valid = mask & ~np.isnan(values)
+    counts = valid.sum(axis=0)
+    totals = np.where(valid, values, 0.0).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, totals / np.maximum(counts, 1), np.nan), counts
+
+
+def backtest_crossovers(close, span_pairs=DEFAULT_SPAN_PAIRS, horizon=30, chunk_cells=BACKTEST_CHUNK_CELLS):
+    """
+    Replay the EMA crossover rule for many (fast, slow) span pairs at once.
+
+    Per-bar quantities (forward and backward extremes, log returns) are
+    computed once. Pairs are then evaluated in chunks of at most
+    `chunk_cells` (bars x pairs) cells: the EMAs of the chunk's distinct
+    spans are gathered into a (time x pair) spread matrix, and crossovers,
+    hit rates, forward returns, lead and lag times and the long-only
+    strategy return are reduced over the time axis for all its pairs
+    together, so memory stays bounded however many pairs and bars there are.
+
+    A bullish signal is a hit when the close `horizon` bars later is higher,
+    a bearish one when it is lower. Lead time is the number of bars from the
+    signal to the best close within the horizon (the move the signal gives
+    advance notice of); lag is the number of bars since the turning point
+    the signal reacted to.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    pairs = np.asarray(span_pairs, dtype=np.int64).reshape(-1, 2)
+    n = len(close)
+    if n < 2:
+        raise ValueError("Not enough bars to backtest")
+
+    forward_return, bars_to_peak, bars_to_trough = _forward_extremes(close, horizon)
+    bars_since_low, bars_since_high = _backward_extremes(close, LAG_LOOKBACK_BARS)
+    has_outcome = ~np.isnan(forward_return)
+    bar_stats = {
+        "forward_return": forward_return,
+        "bars_to_peak": bars_to_peak,
+        "bars_to_trough": bars_to_trough,
+        "bars_since_low": bars_since_low,
+        "bars_since_high": bars_since_high,
+        "up_after": np.where(has_outcome, forward_return > 0, np.nan),
+        "down_after": np.where(has_outcome, forward_return < 0, np.nan),
+        "log_returns": np.diff(np.log(close))
+    }
+
+    chunk = max(1, chunk_cells // n)
+    results = []
+    for start in range(0, len(pairs), chunk):
+        results += _backtest_pairs(close, pairs[start:start + chunk], bar_stats)
+    return results, float(close[-1] / close[0] - 1)
+
+
+def _backtest_pairs(close, pairs, bar_stats):
+    """Result rows of backtest_crossovers for one chunk of span pairs"""
+    n = len(close)
+    spans, inverse = np.unique(pairs, return_inverse=True)
+    inverse = inverse.reshape(pairs.shape)
+    emas = np.hstack([ema_2d(close[:, None], span) for span in spans])  # (T x distinct spans)
+
+    spread = emas[:, inverse[:, 0]] - emas[:, inverse[:, 1]]  # (T x pairs)
+    del emas
+    above = spread > 0
+    del spread
+
+    # Signal at bar t when the sign of the spread differs from bar t-1, after the slow EMA warm-up
+    crossed = np.zeros_like(above)
+    crossed[1:] = above[1:] != above[:-1]
+    warmed_up = np.arange(n)[:, None] >= pairs[:, 1][None, :]
+    crossed &= warmed_up
+    bullish = crossed & above
+    bearish = crossed & ~above
+    del crossed
+
+    bull_return, bull_evaluated = _masked_mean(bar_stats["forward_return"], bullish)
+    bear_return, bear_evaluated = _masked_mean(bar_stats["forward_return"], bearish)
+    bull_hit, _ = _masked_mean(bar_stats["up_after"], bullish)
+    bear_hit, _ = _masked_mean(bar_stats["down_after"], bearish)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        evaluated = bull_evaluated + bear_evaluated
+        hit_rate = np.where(
+            evaluated > 0,
+            (np.nan_to_num(bull_hit) * bull_evaluated + np.nan_to_num(bear_hit) * bear_evaluated) / np.maximum(evaluated, 1),
+            np.nan
+        )
+
+    bull_lead, _ = _masked_mean(bar_stats["bars_to_peak"], bullish)
+    bear_lead, _ = _masked_mean(bar_stats["bars_to_trough"], bearish)
+    bull_lag, _ = _masked_mean(bar_stats["bars_since_low"], bullish)
+    bear_lag, _ = _masked_mean(bar_stats["bars_since_high"], bearish)
+    bullish_count = bullish.sum(axis=0)
+    bearish_count = bearish.sum(axis=0)
+    del bullish, bearish
+
+    # Long while fast > slow (decided on bar t, held over bar t+1), flat otherwise
+    position = (above & warmed_up)[:-1]
+    strategy_return = np.expm1((position * bar_stats["log_returns"][:, None]).sum(axis=0))
+    time_in_market = position.mean(axis=0)
+
+    def rounded(value, digits=4):
+        return None if np.isnan(value) else round(float(value), digits)
+
+    results = []
+    for j, (fast, slow) in enumerate(pairs):
+        results.append({
+            "fast_span": int(fast),
+            "slow_span": int(slow),
+            "signals": {
+                "bullish": int(bullish_count[j]),
+                "bearish": int(bearish_count[j]),
+                "evaluated": int(evaluated[j])
+            },
+            "hit_rate": rounded(hit_rate[j]),
+            "bullish_hit_rate": rounded(bull_hit[j]),
+            "bearish_hit_rate": rounded(bear_hit[j]),
+            "avg_return_after_bullish_percent": rounded(bull_return[j] * 100, 2),
+            "avg_return_after_bearish_percent": rounded(bear_return[j] * 100, 2),
+            "avg_lead_bars": {"bullish": rounded(bull_lead[j], 1), "bearish": rounded(bear_lead[j], 1)},
+            "avg_lag_bars": {"bullish": rounded(bull_lag[j], 1), "bearish": rounded(bear_lag[j], 1)},
+            "strategy_return_percent": rounded(strategy_return[j] * 100, 2),
+            "time_in_market": rounded(time_in_market[j])
+        })
+    return results
+
+
+def run_backtest(ticker, timeframe="4H", years=2.0, span_pairs=DEFAULT_SPAN_PAIRS, horizon=30, store=None):
+    """Load stored bars for a ticker and backtest the crossover rule for each span pair"""
+    closes = load_closes(ticker, timeframe, years, store)
+    if len(closes) <= max(slow for _, slow in span_pairs) + 1:
+        raise MarketDataError("Insufficient data for the requested spans")
+
+    results, buy_and_hold_return = backtest_crossovers(closes.to_numpy(), span_pairs, horizon)
+
+    def best(key):
+        scored = [r for r in results if r[key] is not None]
+        if not scored:
+            return None
+        top = max(scored, key=lambda r: r[key])
+        return {"fast_span": top["fast_span"], "slow_span": top["slow_span"], key: top[key]}
+
+    return {
+        "ticker": ticker,
+        "timeframe": timeframe,
+        "horizon_bars": horizon,
+        "horizon_hours": horizon * TIMEFRAMES[timeframe][2],
+        "start": closes.index[0].isoformat(),
+        "end": closes.index[-1].isoformat(),
+        "bars": len(closes),
+        "buy_and_hold_return_percent": round(buy_and_hold_return * 100, 2),
+        "results": results,
+        "best_by_hit_rate": best("hit_rate"),
+        "best_by_strategy_return": best("strategy_return_percent"),
+        "last_updated": datetime.now().isoformat()
+    }
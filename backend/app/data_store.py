@@ -0,0 +1,123 @@
+import hashlib
+import os
+import threading
+import numpy as np
+import pandas as pd
+
+# Copy-on-write makes every filter/selection a lazy view of the shared snapshot:
+# request paths only pay for the rows and columns they actually materialize,
+# and any write to a derived frame copies instead of mutating the snapshot.
+pd.set_option('mode.copy_on_write', True)
+
+# Funds dataset loaded by the API (e.g. a synthetic universe for benchmarks)
+DEFAULT_DATA_PATH = os.getenv(
+    "FUNDS_DATA_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'mutual_funds_cleaned.csv')
+)
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def load_funds_data(data_path=None):
+    """
+    Load the funds dataset once per path and return the shared snapshot.
+
+    The same DataFrame is handed to the API layer, the recommendation system
+    and the model loader, so it must be treated as read-only: select with
+    masks/positions and add columns only to the (small) result frames.
+    """
+    path = os.path.abspath(data_path or DEFAULT_DATA_PATH)
+
+    with _snapshots_lock:
+        df = _snapshots.get(path)
+        if df is None:
+            df = pd.read_csv(path)
+            _snapshots[path] = df
+        return df
+
+
+_name_indexes = {}
+
+
+def file_sha256(path):
+    """Content hash of a file (staleness checks of bundles and snapshots built from it)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def register_snapshot(df, data_path=None, name_positions=None, column='scheme_name'):
+    """
+    Install an already-built DataFrame (e.g. from a snapshot bundle) as the
+    shared snapshot of a data path, optionally with its precomputed name
+    index (first-row positions of each distinct name).
+    """
+    path = os.path.abspath(data_path or DEFAULT_DATA_PATH)
+    with _snapshots_lock:
+        _snapshots[path] = df
+        if name_positions is not None:
+            positions = np.asarray(name_positions)
+            index = pd.Series(positions, index=df[column].to_numpy()[positions])
+            _name_indexes[(id(df), column)] = (df, index)
+
+
+def name_index(df, column='scheme_name'):
+    """
+    Position of the first row for each value of a column, as a Series indexed
+    by value. Built once per snapshot, so name lookups are hash probes
+    instead of full-column scans.
+    """
+    key = (id(df), column)
+    with _snapshots_lock:
+        cached = _name_indexes.get(key)
+        if cached is None or cached[0] is not df:
+            index = pd.Series(np.arange(len(df)), index=df[column])
+            index = index[~index.index.duplicated()]
+            cached = (df, index)
+            _name_indexes[key] = cached
+        return cached[1]
+
+
+def lookup_positions(df, names, column='scheme_name'):
+    """Positions of the first row matching each name, in request order (-1 where not found)"""
+    positions = name_index(df, column).reindex(list(names))
+    return positions.fillna(-1).to_numpy(dtype=np.int64)
+
+
+def training_features(df, target_column):
+    """Model features (missing values filled with column medians) and target for one return horizon"""
+    exclude_cols = ['scheme_name', 'fund_manager', 'amc_name', target_column]
+
+    # Exclude other return columns when predicting one
+    return_cols = ['return_1yr', 'return_3yr', 'return_5yr']
+    for col in return_cols:
+        if col != target_column and col in df.columns:
+            exclude_cols.append(col)
+
+    feature_cols = [col for col in df.columns if col not in exclude_cols]
+
+    X = df[feature_cols].fillna(df[feature_cols].median())
+    y = df[target_column].fillna(df[target_column].median())
+
+    return X, y, feature_cols
+
+
+def build_feature_matrix(df, feature_cols, fill_values=None):
+    """Dense float64 feature matrix in model column order; missing columns use fill_values"""
+    X = np.empty((len(df), len(feature_cols)), dtype=np.float64)
+    for j, col in enumerate(feature_cols):
+        if col in df.columns:
+            X[:, j] = df[col].to_numpy(dtype=np.float64)
+        else:
+            X[:, j] = fill_values[col] if fill_values is not None else np.nan
+    return X
+
+
+def select_positions(mask, limit=None):
+    """Positional indices of rows matching a boolean mask, optionally truncated"""
+    positions = np.flatnonzero(np.asarray(mask, dtype=bool))
+    if limit is not None:
+        positions = positions[:limit]
+    return positions
@@ -1,63 +1,50 @@
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import GradientBoostingRegressor, ExtraTreesRegressor
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error, r2_score
 import pickle
+from .data_store import DEFAULT_DATA_PATH, load_funds_data, build_feature_matrix, select_positions, training_features
+from .model_tuning import build_model, load_model_configs
+from .portfolio_optimizer import CorrelationAwareOptimizer
+from .instrumentation import span
 import warnings
 warnings.filterwarnings('ignore')
 
 class DiversifiedMutualFundSystem:
-    def __init__(self, data_path=None, load_from_pickle=False):
+    def __init__(self, data_path=None, load_from_pickle=False, snapshot=None):
         if data_path is None:
-            import os
-            data_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'mutual_funds_cleaned.csv')
+            data_path = DEFAULT_DATA_PATH
         """Initialize the diversified mutual fund recommendation system"""
-        self.df = pd.read_csv(data_path)
+        self.df = load_funds_data(data_path)
         self.models = {}
         self.feature_columns = {}
-        
-        if load_from_pickle:
+        self.optimizer = CorrelationAwareOptimizer()
+        self._feature_matrices = {}
+        self._predictions = {}
+        self._risk_model_cache = None
+        
+        if snapshot is not None:
+            self.load_snapshot(snapshot)
+        elif load_from_pickle:
             self.load_models_from_pickle()
         else:
             self.train_optimized_models()
     
     def prepare_features(self, target_column):
         """Prepare features for model training"""
-        exclude_cols = ['scheme_name', 'fund_manager', 'amc_name', target_column]
-        
-        # Exclude other return columns when predicting one
-        return_cols = ['return_1yr', 'return_3yr', 'return_5yr']
-        for col in return_cols:
-            if col != target_column and col in self.df.columns:
-                exclude_cols.append(col)
-        
-        feature_cols = [col for col in self.df.columns if col not in exclude_cols]
-        
-        X = self.df[feature_cols].fillna(self.df[feature_cols].median())
-        y = self.df[target_column].fillna(self.df[target_column].median())
-        
-        return X, y, feature_cols
+        return training_features(self.df, target_column)
     
     def train_optimized_models(self):
         """Train the best performing models for each time horizon"""
+        # sklearn is only needed for training (unpickling imports what it needs)
+        from sklearn.model_selection import train_test_split
+        from sklearn.metrics import mean_squared_error, r2_score
+        
         print("Training optimized models for diversified portfolio system...")
         print("="*70)
         
-        # Best model configurations based on analysis
+        # Per-horizon configurations: defaults, or the result of python -m app.model_tuning --apply
         model_configs = {
-            'return_1yr': {
-                'model': GradientBoostingRegressor(n_estimators=200, random_state=42),
-                'name': 'Gradient Boosting (200 trees)'
-            },
-            'return_3yr': {
-                'model': GradientBoostingRegressor(n_estimators=200, random_state=42),
-                'name': 'Gradient Boosting (200 trees)'
-            },
-            'return_5yr': {
-                'model': ExtraTreesRegressor(n_estimators=200, random_state=42),
-                'name': 'Extra Trees (200 trees)'
-            }
+            target: {'model': build_model(config), 'name': config['name']}
+            for target, config in load_model_configs().items()
         }
         
         for target, config in model_configs.items():
@@ -148,21 +135,24 @@ class DiversifiedMutualFundSystem:
         
         print(f"\n✅ Model loading complete!")
     
+    def load_snapshot(self, snapshot):
+        """Use the models and the precomputed dataset state of a snapshot bundle"""
+        for target, model_data in snapshot.models.items():
+            self.models[target] = model_data['model']
+            self.feature_columns[target] = model_data['feature_columns']
+        self._feature_matrices.update(snapshot.feature_matrices)
+        self._predictions.update(snapshot.predictions)
+        self._risk_model_cache = snapshot.risk_model
+        print(f"✅ Models and dataset state loaded from snapshot bundle")
+    
     def train_single_model(self, target):
         """Train a single model for specific target"""
+        from sklearn.model_selection import train_test_split
+        from sklearn.metrics import mean_squared_error, r2_score
+        
         model_configs = {
-            'return_1yr': {
-                'model': GradientBoostingRegressor(n_estimators=200, random_state=42),
-                'name': 'Gradient Boosting (200 trees)'
-            },
-            'return_3yr': {
-                'model': GradientBoostingRegressor(n_estimators=200, random_state=42),
-                'name': 'Gradient Boosting (200 trees)'
-            },
-            'return_5yr': {
-                'model': ExtraTreesRegressor(n_estimators=200, random_state=42),
-                'name': 'Extra Trees (200 trees)'
-            }
+            target: {'model': build_model(config), 'name': config['name']}
+            for target, config in load_model_configs().items()
         }
         
         if target in model_configs and target in self.df.columns:
@@ -218,9 +208,13 @@ class DiversifiedMutualFundSystem:
             
             # Create system instance
             system = DiversifiedMutualFundSystem.__new__(DiversifiedMutualFundSystem)
-            system.df = pd.read_csv(data_path)
+            system.df = load_funds_data(data_path)
             system.models = system_data['models']
             system.feature_columns = system_data['feature_columns']
+            system.optimizer = CorrelationAwareOptimizer()
+            system._feature_matrices = {}
+            system._predictions = {}
+            system._risk_model_cache = None
             
             print(f"✅ Complete system loaded from pickle!")
             print(f"System version: {system_data['system_version']}")
@@ -258,32 +252,63 @@ class DiversifiedMutualFundSystem:
         prediction = model.predict([fund_features])[0]
         return prediction
     
-    def get_diversified_recommendations(self, investment_amount, horizon, risk_tolerance='moderate', 
-                                     category_preference=None, top_n=10):
-        """
-        Get top 2 diversified mutual fund recommendations for portfolio splitting
+    def _feature_matrix(self, target_col):
+        """Feature matrix of the full dataset for one model, built once and reused"""
+        if target_col not in self._feature_matrices:
+            feature_cols = self.feature_columns[target_col]
+            medians = {col: self.df[col].median() for col in feature_cols if col in self.df.columns}
+            self._feature_matrices[target_col] = build_feature_matrix(self.df, feature_cols, medians)
+        return self._feature_matrices[target_col]
+    
+    def _dataset_predictions(self, target_col):
+        """Predictions for every fund in the dataset (NaN where unscorable), computed once"""
+        if target_col not in self._predictions:
+            self._predictions[target_col] = self._predict_matrix(target_col, self._feature_matrix(target_col))
+        return self._predictions[target_col]
+    
+    def _risk_model(self):
+        """Factor risk model of the full dataset, built once and reused"""
+        if self._risk_model_cache is None:
+            self._risk_model_cache = self.optimizer.build_risk_model(self.df)
+        return self._risk_model_cache
+    
+    def predict_fund_returns_batch(self, funds, horizon):
+        """Predict returns for every row of a DataFrame with a single model call
         
-        Parameters:
-        - investment_amount: Total amount to invest
-        - horizon: Investment timeline (1, 3, or 5 years)
-        - risk_tolerance: 'conservative', 'moderate', 'aggressive'
-        - category_preference: 'Equity', 'Hybrid', 'Debt', None
-        - top_n: Number of funds to evaluate before selecting top 2
+        Rows whose features cannot be scored (missing values) get NaN.
         """
-        
         target_col = f'return_{horizon}yr'
         
         if target_col not in self.models:
             raise ValueError(f"Model for {horizon}-year horizon not available")
         
-        # Filter funds based on criteria
-        df_filtered = self.df.copy()
+        # Use median value for missing features, as in the single-fund path
+        feature_cols = self.feature_columns[target_col]
+        medians = {col: self.df[col].median() for col in feature_cols if col not in funds.columns}
+        return self._predict_matrix(target_col, build_feature_matrix(funds, feature_cols, medians))
+    
+    def _predict_matrix(self, target_col, X):
+        predictions = np.full(len(X), np.nan)
+        valid = ~np.isnan(X).any(axis=1)
+        if valid.any():
+            predictions[valid] = self.models[target_col].predict(X[valid])
+        return predictions
+    
+    def score_candidate_pool(self, horizon, risk_tolerance='moderate', category_preference=None):
+        """
+        Filter and score the candidate pool shared by every profile with the same
+        horizon, risk tolerance and category preference.
+        
+        The pool is a compact frame (one row per eligible fund) holding the
+        fund's position in the dataset, its scores and the minimum-investment
+        columns; the investment-amount filter is not applied here, so one pool
+        can serve many investment amounts. Funds that could not be scored have
+        a NaN predicted_return.
+        """
+        target_col = f'return_{horizon}yr'
         
-        # Filter by investment amount (minimum investment)
-        df_filtered = df_filtered[
-            (df_filtered['min_sip'] <= investment_amount/2) |  # Can invest half amount
-            (df_filtered['min_lumpsum'] <= investment_amount/2)
-        ]
+        if target_col not in self.models:
+            raise ValueError(f"Model for {horizon}-year horizon not available")
         
         # Filter by risk tolerance
         risk_mapping = {
@@ -292,44 +317,30 @@ class DiversifiedMutualFundSystem:
             'aggressive': (5, 6)
         }
         
-        min_risk, max_risk = risk_mapping[risk_tolerance]
-        df_filtered = df_filtered[
-            (df_filtered['risk_level'] >= min_risk) & 
-            (df_filtered['risk_level'] <= max_risk)
-        ]
-        
-        # Filter by category preference
-        if category_preference:
-            category_col = f'category_{category_preference}'
-            if category_col in df_filtered.columns:
-                df_filtered = df_filtered[df_filtered[category_col] == True]
-        
-        # Remove funds with missing target returns
-        df_filtered = df_filtered.dropna(subset=[target_col])
-        
-        if len(df_filtered) < 2:
-            return pd.DataFrame(), "Insufficient funds match your criteria. Please adjust preferences."
+        if risk_tolerance not in risk_mapping:
+            raise ValueError(f"Unknown risk tolerance: {risk_tolerance}")
         
-        # Predict returns for all filtered funds
-        print(f"Evaluating {len(df_filtered)} funds for {horizon}-year investment...")
-        
-        predicted_returns = []
-        fund_indices = []
-        
-        for idx, (fund_idx, fund_row) in enumerate(df_filtered.iterrows()):
-            try:
-                predicted_return = self.predict_fund_returns(fund_row.to_dict(), horizon)
-                predicted_returns.append(predicted_return)
-                fund_indices.append(fund_idx)
-            except Exception as e:
-                continue
-        
-        if len(predicted_returns) < 2:
-            return pd.DataFrame(), "Unable to generate predictions. Please try different criteria."
+        min_risk, max_risk = risk_mapping[risk_tolerance]
+        with span("filter"):
+            risk_level = self.df['risk_level'].to_numpy()
+            mask = (risk_level >= min_risk) & (risk_level <= max_risk)
+            
+            # Filter by category preference
+            if category_preference:
+                category_col = f'category_{category_preference}'
+                if category_col in self.df.columns:
+                    mask &= self.df[category_col].to_numpy() == True
+            
+            # Remove funds with missing target returns
+            mask &= self.df[target_col].notna().to_numpy()
+            positions = select_positions(mask)
+            
+        print(f"Evaluating {len(positions)} funds for {horizon}-year investment...")
+        with span("predict"):
+            predicted = self._dataset_predictions(target_col)[positions]
         
-        # Add predicted returns to dataframe
-        df_with_predictions = df_filtered.loc[fund_indices].copy()
-        df_with_predictions['predicted_return'] = predicted_returns
+        def column(name):
+            return self.df[name].to_numpy()[positions]
         
         # Calculate comprehensive score for ranking
         weights = {
@@ -340,111 +351,110 @@ class DiversifiedMutualFundSystem:
             'rating': 0.10  # 10% weight to rating
         }
         
-        df_with_predictions['comprehensive_score'] = (
-            weights['predicted_return'] * df_with_predictions['predicted_return'] +
-            weights['risk_adjusted_score'] * df_with_predictions['risk_adjusted_score'] +
-            weights['stability_score'] * df_with_predictions['stability_score'] +
-            weights['cost_efficiency'] * df_with_predictions['cost_efficiency'] +
-            weights['rating'] * df_with_predictions['rating']
+        comprehensive_score = (
+            weights['predicted_return'] * predicted +
+            weights['risk_adjusted_score'] * column('risk_adjusted_score') +
+            weights['stability_score'] * column('stability_score') +
+            weights['cost_efficiency'] * column('cost_efficiency') +
+            weights['rating'] * column('rating')
         )
         
-        # Sort by comprehensive score
-        top_funds = df_with_predictions.nlargest(top_n, 'comprehensive_score')
-        
-        # Select top 2 for diversification with different characteristics
-        diversified_picks = self.select_diversified_pair(top_funds, investment_amount)
-        
-        return diversified_picks, f"Selected top 2 diversified funds from {len(df_filtered)} eligible options."
+        return pd.DataFrame({
+            'position': positions,
+            'predicted_return': predicted,
+            'comprehensive_score': comprehensive_score,
+            'min_sip': column('min_sip'),
+            'min_lumpsum': column('min_lumpsum')
+        })
     
-    def select_diversified_pair(self, top_funds, investment_amount):
-        """Select 2 funds that provide good diversification"""
+    def get_diversified_recommendations(self, investment_amount, horizon, risk_tolerance='moderate', 
+                                     category_preference=None, top_n=None, n_funds=2,
+                                     candidate_pool=None):
+        """
+        Get diversified mutual fund recommendations for portfolio splitting
+        
+        Parameters:
+        - investment_amount: Total amount to invest
+        - horizon: Investment timeline (1, 3, or 5 years)
+        - risk_tolerance: 'conservative', 'moderate', 'aggressive'
+        - category_preference: 'Equity', 'Hybrid', 'Debt', None
+        - top_n: Optionally restrict the optimizer to the top_n funds by comprehensive score
+          (None optimizes over the full eligible universe)
+        - n_funds: Number of funds in the recommended portfolio
+        - candidate_pool: Pre-scored pool from score_candidate_pool for the same
+          horizon, risk tolerance and category (scored on demand when None)
+        """
         
-        if len(top_funds) < 2:
-            return top_funds
+        if candidate_pool is None:
+            candidate_pool = self.score_candidate_pool(horizon, risk_tolerance, category_preference)
         
-        # Strategy: Pick the best fund + a complementary fund for diversification
-        best_fund = top_funds.iloc[0]
+        # Filter by investment amount (minimum investment)
+        with span("filter"):
+            df_filtered = candidate_pool[
+                (candidate_pool['min_sip'] <= investment_amount/2) |  # Can invest half amount
+                (candidate_pool['min_lumpsum'] <= investment_amount/2)
+            ]
         
-        # Find a complementary fund with different characteristics
-        remaining_funds = top_funds.iloc[1:].copy()
+        if len(df_filtered) < 2:
+            return pd.DataFrame(), "Insufficient funds match your criteria. Please adjust preferences."
         
-        # Calculate diversification score for each remaining fund
-        diversification_scores = []
+        df_with_predictions = df_filtered[df_filtered['predicted_return'].notna()]
         
-        for idx, fund in remaining_funds.iterrows():
-            # Diversification factors
-            risk_diff = abs(fund['risk_level'] - best_fund['risk_level'])
-            category_diff = self.calculate_category_difference(fund, best_fund)
-            amc_diff = 1 if fund['amc_name'] != best_fund['amc_name'] else 0
-            size_diff = abs(fund['fund_size'] - best_fund['fund_size'])
-            
-            # Normalize size difference
-            size_diff_norm = min(size_diff / (top_funds['fund_size'].std() + 0.001), 1)
-            
-            # Combined diversification score
-            div_score = (
-                0.3 * risk_diff +  # Different risk levels
-                0.3 * category_diff +  # Different categories/sub-categories
-                0.2 * amc_diff +  # Different AMCs
-                0.2 * size_diff_norm  # Different fund sizes
-            )
-            
-            diversification_scores.append(div_score)
+        if len(df_with_predictions) < 2:
+            return pd.DataFrame(), "Unable to generate predictions. Please try different criteria."
         
-        # Select fund with highest diversification score
-        if diversification_scores:
-            best_div_idx = np.argmax(diversification_scores)
-            second_fund = remaining_funds.iloc[best_div_idx]
-            
-            # Create final selection
-            selected_funds = pd.DataFrame([best_fund, second_fund])
-        else:
-            # Fallback to top 2 funds
-            selected_funds = top_funds.head(2)
+        candidates = df_with_predictions
+        if top_n is not None:
+            candidates = df_with_predictions.nlargest(top_n, 'comprehensive_score')
         
-        # Add investment allocation
-        selected_funds = selected_funds.copy()
-        selected_funds['suggested_allocation'] = investment_amount / 2
-        selected_funds['allocation_percentage'] = 50.0
+        # Weight funds by predicted return against their estimated covariance
+        with span("optimize"):
+            diversified_picks = self.select_optimized_portfolio(
+                candidates, investment_amount, n_funds, risk_tolerance
+            )
         
-        return selected_funds
+        return diversified_picks, f"Selected top {len(diversified_picks)} diversified funds from {len(df_filtered)} eligible options."
     
-    def calculate_category_difference(self, fund1, fund2):
-        """Calculate difference between fund categories"""
-        # Check main categories
-        main_categories = ['category_Equity', 'category_Hybrid', 'category_Debt', 'category_Other']
+    def select_optimized_portfolio(self, candidates, investment_amount, n_funds=2,
+                                   risk_tolerance='moderate'):
+        """
+        Select n_funds funds and weight them by predicted return minus a covariance risk penalty
         
-        fund1_main = None
-        fund2_main = None
+        candidates is a scored pool from score_candidate_pool; only the selected
+        funds' dataset rows are materialized.
+        """
         
-        for cat in main_categories:
-            if cat in fund1 and fund1[cat]:
-                fund1_main = cat
-            if cat in fund2 and fund2[cat]:
-                fund2_main = cat
+        if candidates.empty:
+            return pd.DataFrame()
         
-        # Different main categories = high diversification
-        if fund1_main != fund2_main:
-            return 1.0
+        positions = candidates['position'].to_numpy()
+        loadings, idiosyncratic = self._risk_model()
+        result = self.optimizer.optimize(
+            None, candidates['predicted_return'].to_numpy(), n_funds, risk_tolerance,
+            risk_model=(loadings[positions], idiosyncratic[positions])
+        )
         
-        # Same main category, check sub-categories
-        sub_categories = [col for col in fund1.index if col.startswith('sub_category_')]
+        chosen = candidates.iloc[result['indices']]
+        selected_funds = self.df.iloc[chosen['position'].to_numpy()]
+        weights = result['weights']
         
-        fund1_subs = [col for col in sub_categories if fund1[col]]
-        fund2_subs = [col for col in sub_categories if fund2[col]]
+        selected_funds['predicted_return'] = chosen['predicted_return'].to_numpy()
+        selected_funds['comprehensive_score'] = chosen['comprehensive_score'].to_numpy()
         
-        # Different sub-categories = medium diversification
-        if not set(fund1_subs).intersection(set(fund2_subs)):
-            return 0.5
+        # Add investment allocation
+        selected_funds['portfolio_weight'] = weights
+        selected_funds['suggested_allocation'] = investment_amount * weights
+        selected_funds['allocation_percentage'] = weights * 100
         
-        return 0.0  # Same categories
+        return selected_funds
     
     def generate_investment_plan(self, investment_amount, horizon, risk_tolerance='moderate', 
-                               category_preference=None):
+                               category_preference=None, n_funds=2, candidate_pool=None):
         """Generate complete investment plan with diversified recommendations"""
         
         recommendations, message = self.get_diversified_recommendations(
-            investment_amount, horizon, risk_tolerance, category_preference
+            investment_amount, horizon, risk_tolerance, category_preference, n_funds=n_funds,
+            candidate_pool=candidate_pool
         )
         
         if recommendations.empty:
@@ -463,7 +473,7 @@ class DiversifiedMutualFundSystem:
                 'investment_horizon': f"{horizon} year(s)",
                 'risk_tolerance': risk_tolerance,
                 'category_preference': category_preference or 'Any',
-                'diversification_strategy': 'Top 2 performers with complementary characteristics'
+                'diversification_strategy': f'Top {len(recommendations)} funds weighted by predicted return against estimated covariance'
             },
             'recommendations': []
         }
@@ -490,13 +500,18 @@ class DiversifiedMutualFundSystem:
         
         # Add diversification analysis
         if len(recommendations) >= 2:
-            fund1, fund2 = recommendations.iloc[0], recommendations.iloc[1]
+            stats = self.optimizer.analyze(
+                recommendations, recommendations['predicted_return'], recommendations['portfolio_weight']
+            )
             
             plan['diversification_analysis'] = {
-                'risk_diversification': f"Risk levels: {fund1['risk_level']} vs {fund2['risk_level']}",
-                'amc_diversification': f"AMCs: {fund1['amc_name']} vs {fund2['amc_name']}",
-                'size_diversification': f"Fund sizes: {fund1['fund_size']:.2f} vs {fund2['fund_size']:.2f}",
-                'return_correlation': 'Optimized for low correlation between funds'
+                'risk_diversification': "Risk levels: " + " vs ".join(str(r) for r in recommendations['risk_level']),
+                'amc_diversification': "AMCs: " + " vs ".join(recommendations['amc_name']),
+                'size_diversification': "Fund sizes: " + " vs ".join(f"{s:.2f}" for s in recommendations['fund_size']),
+                'return_correlation': f"Average estimated pairwise correlation: {stats['average_correlation']:.2f}",
+                'expected_portfolio_return': round(stats['expected_return'], 2),
+                'estimated_portfolio_volatility': round(stats['volatility'], 2),
+                'correlation_matrix': [[round(float(c), 3) for c in row] for row in stats['correlation_matrix']]
             }
         
         return plan
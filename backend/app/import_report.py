@@ -0,0 +1,162 @@
+"""
+Cold-start report: import time of the API module by package, the time of
+the lazy data / model initialization that follows on the first request, and
+a before / after comparison of the deferred heavy imports.
+
+    python -m app.import_report [--module app.main] [--top 15] [--repeat 3]
+
+The comparison imports the module as it is (lazy) and after importing
+DEFERRED_MODULES first, as app.main did at module level before they were
+deferred (eager), and lists what each deferred module adds. It also flags
+any deferred module the lazy import still pulls in.
+
+Each measurement runs in a fresh interpreter, so nothing is cached by the
+reporting process itself.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported at module level by app.main / diversified_portfolio_system before
+# they were deferred to first use (or dropped)
+DEFERRED_MODULES = [
+    "matplotlib.pyplot",
+    "seaborn",
+    "scipy.stats",
+    "scipy.signal",
+    "sklearn.ensemble",
+    "sklearn.model_selection",
+    "sklearn.metrics",
+    "sklearn.preprocessing",
+    "sklearn.decomposition"
+]
+
+INIT_SNIPPET = """
+import time
+start = time.perf_counter()
+import {module} as target
+imported = time.perf_counter()
+target.ensure_initialized()
+print("TIMING", imported - start, time.perf_counter() - imported)
+"""
+
+COMPARE_SNIPPET = """
+import importlib
+import sys
+import time
+start = time.perf_counter()
+for name in {preload!r} + [{module!r}]:
+    before = time.perf_counter()
+    importlib.import_module(name)
+    print("MODULE", name, time.perf_counter() - before)
+print("TIMING", time.perf_counter() - start)
+print("LOADED", *[name for name in {deferred!r} if name in sys.modules])
+"""
+
+
+def import_times(module):
+    """Self time (us) per top-level package and the total import time of `module`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    by_package = defaultdict(int)
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_part, cumulative_part, name = line.split("|")
+        self_us = int(self_part.split(":")[1])
+        cumulative_us = int(cumulative_part)
+        by_package[name.strip().split(".")[0]] += self_us
+        if name.strip() == module:
+            total = cumulative_us
+    return total, dict(by_package)
+
+
+def initialization_times(module):
+    """(import seconds, ensure_initialized seconds) in a fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, "-c", INIT_SNIPPET.format(module=module)],
+        cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    )
+    for line in result.stdout.splitlines():
+        if line.startswith("TIMING"):
+            _, imported, initialized = line.split()
+            return float(imported), float(initialized)
+    raise RuntimeError("Initialization timing not reported")
+
+
+def _timed_import(module, preload):
+    """(total seconds, [(name, marginal seconds)], deferred modules loaded) in a fresh interpreter"""
+    snippet = COMPARE_SNIPPET.format(module=module, preload=list(preload), deferred=DEFERRED_MODULES)
+    result = subprocess.run([sys.executable, "-c", snippet], cwd=BACKEND_DIR, capture_output=True, text=True, check=True)
+    total, modules, loaded = None, [], []
+    for line in result.stdout.splitlines():
+        fields = line.split()
+        if fields and fields[0] == "MODULE":
+            modules.append((fields[1], float(fields[2])))
+        elif fields and fields[0] == "TIMING":
+            total = float(fields[1])
+        elif fields and fields[0] == "LOADED":
+            loaded = fields[1:]
+    if total is None:
+        raise RuntimeError("Import timing not reported")
+    return total, modules, loaded
+
+
+def deferred_import_comparison(module, repeat=3):
+    """
+    Best-of-`repeat` import time of `module` as it is (lazy) and with
+    DEFERRED_MODULES imported first (eager)
+    """
+    lazy = min((_timed_import(module, []) for _ in range(repeat)), key=lambda run: run[0])
+    eager = min((_timed_import(module, DEFERRED_MODULES) for _ in range(repeat)), key=lambda run: run[0])
+    return {
+        "lazy_seconds": lazy[0],
+        "eager_seconds": eager[0],
+        "eager_modules": eager[1],
+        "loaded_when_lazy": lazy[2]
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time and lazy initialization report")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per side of the comparison (best is kept)")
+    parser.add_argument("--skip-init", action="store_true", help="skip the first-request initialization timing")
+    parser.add_argument("--skip-compare", action="store_true", help="skip the eager vs lazy import comparison")
+    args = parser.parse_args()
+
+    total, by_package = import_times(args.module)
+    print(f"📦 import {args.module}: {total / 1000:.0f} ms")
+    print(f"   {'package':<28}{'self ms':>10}{'share':>8}")
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:args.top]:
+        share = self_us / total * 100 if total else 0
+        print(f"   {package:<28}{self_us / 1000:>10.1f}{share:>7.1f}%")
+
+    if not args.skip_init:
+        imported, initialized = initialization_times(args.module)
+        print(f"🚀 cold start: import {imported * 1000:.0f} ms + first-request initialization {initialized * 1000:.0f} ms")
+
+    if not args.skip_compare:
+        comparison = deferred_import_comparison(args.module, args.repeat)
+        eager, lazy = comparison["eager_seconds"], comparison["lazy_seconds"]
+        saved = eager - lazy
+        print(f"⚖️  deferred imports: eager {eager * 1000:.0f} ms -> lazy {lazy * 1000:.0f} ms "
+              f"(saves {saved * 1000:.0f} ms, {saved / eager * 100 if eager else 0:.0f}%)")
+        print(f"   {'added, in import order':<28}{'ms':>10}")
+        for name, seconds in comparison["eager_modules"]:
+            print(f"   {name:<28}{seconds * 1000:>10.1f}")
+        if comparison["loaded_when_lazy"]:
+            print(f"❌ still imported by {args.module}: {', '.join(comparison['loaded_when_lazy'])}")
+
+
+if __name__ == "__main__":
+    main()
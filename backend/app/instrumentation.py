@@ -0,0 +1,331 @@
+"""
+Lightweight request instrumentation: named spans around hot-path stages,
+a Server-Timing response header and Prometheus-format metrics.
+
+    with span("predict"):
+        ...
+
+Spans record into the current request's timing (a context variable, so
+code run in the threadpool from a request records too; spans outside a
+request are no-ops). Every request also gets three stages of its own:
+parse (body and validation, up to the endpoint call), handler (the
+endpoint; the named spans nest inside it) and serialize (from the
+endpoint's return to the response start). They are sent as a
+Server-Timing header and feed per-endpoint request / error counters and
+latency histograms served at /metrics.
+
+With INSTRUMENTATION_ENABLED=0 nothing is installed: no middleware, no
+endpoint wrapper, no /metrics route, and span() returns a shared no-op.
+Metrics are per process (each serve.py worker keeps its own).
+"""
+
+import bisect
+import contextvars
+import functools
+import inspect
+import os
+import threading
+import time
+
+from fastapi.routing import APIRoute
+from starlette.responses import PlainTextResponse
+
+# Spans, Server-Timing and /metrics; "0" disables them entirely
+INSTRUMENTATION_ENABLED = os.getenv("INSTRUMENTATION_ENABLED", "1") != "0"
+
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+UNMATCHED_ENDPOINT = "unmatched"
+
+_current = contextvars.ContextVar("request_timing", default=None)
+
+
+class RequestTiming:
+    """Stage durations (seconds, summed per name) of one request"""
+
+    __slots__ = ("start", "stages", "handler_start", "handler_end")
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.stages = {}
+        self.handler_start = None
+        self.handler_end = None
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def enter_handler(self):
+        self.handler_start = time.perf_counter()
+        self.add("parse", self.handler_start - self.start)
+
+    def exit_handler(self):
+        self.handler_end = time.perf_counter()
+        self.add("handler", self.handler_end - self.handler_start)
+
+    def response_started(self):
+        now = time.perf_counter()
+        if self.handler_end is not None:
+            self.add("serialize", now - self.handler_end)
+        return now - self.start
+
+    def server_timing(self, total):
+        entries = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.stages.items()]
+        entries.append(f"total;dur={total * 1000:.3f}")
+        return ", ".join(entries)
+
+
+class _Span:
+    __slots__ = ("name", "timing", "start")
+
+    def __init__(self, name, timing):
+        self.name = name
+        self.timing = timing
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.timing.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name):
+    """Context manager timing a named stage of the current request"""
+    timing = _current.get() if INSTRUMENTATION_ENABLED else None
+    if timing is None:
+        return _NOOP_SPAN
+    return _Span(name, timing)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(**labels):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+class Histogram:
+    """Fixed-bucket histogram (counts per upper bound, plus an overflow bucket)"""
+
+    def __init__(self, bounds):
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.total += value
+            self.max = max(self.max, value)
+
+    def buckets(self):
+        """(bounds, per-bucket counts without the overflow bucket, count, total), read consistently"""
+        with self._lock:
+            return self.bounds, self.counts[:-1], self.count, self.total
+
+    def snapshot(self):
+        with self._lock:
+            labels = [f"le_{bound:g}" for bound in self.bounds] + ["inf"]
+            return {
+                "count": self.count,
+                "mean": round(self.total / self.count, 3) if self.count else None,
+                "max": round(self.max, 3),
+                "buckets": dict(zip(labels, self.counts))
+            }
+
+
+class MetricsRegistry:
+    """Per-endpoint request / error counters and latency histograms"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}  # (endpoint, method, status) -> count
+        self.errors = {}  # (endpoint, method) -> count
+        self.durations = {}  # (endpoint, method) -> Histogram
+        self.stages = {}  # (endpoint, stage) -> Histogram
+        self.collectors = []  # callables returning extra exposition lines
+
+    def _histogram(self, histograms, key):
+        histogram = histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = histograms.setdefault(key, Histogram(LATENCY_BUCKETS))
+        return histogram
+
+    def record(self, endpoint, method, status, duration, stages):
+        with self._lock:
+            key = (endpoint, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            if status >= 500:
+                self.errors[(endpoint, method)] = self.errors.get((endpoint, method), 0) + 1
+        self._histogram(self.durations, (endpoint, method)).observe(duration)
+        for stage, seconds in stages.items():
+            self._histogram(self.stages, (endpoint, stage)).observe(seconds)
+
+    def add_collector(self, collect):
+        """Append the lines returned by collect() to every /metrics rendering"""
+        self.collectors.append(collect)
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            requests = sorted(self.requests.items())
+            errors = sorted(self.errors.items())
+            durations = sorted(self.durations.items())
+            stages = sorted(self.stages.items())
+
+        lines = [
+            "# HELP http_requests_total Requests by endpoint, method and status.",
+            "# TYPE http_requests_total counter"
+        ]
+        for (endpoint, method, status), count in requests:
+            lines.append(f"http_requests_total{{{format_labels(endpoint=endpoint, method=method, status=status)}}} {count}")
+
+        lines += [
+            "# HELP http_request_errors_total Requests that failed with a 5xx status or an unhandled exception.",
+            "# TYPE http_request_errors_total counter"
+        ]
+        for (endpoint, method), count in errors:
+            lines.append(f"http_request_errors_total{{{format_labels(endpoint=endpoint, method=method)}}} {count}")
+
+        lines += [
+            "# HELP http_request_duration_seconds Request latency up to the end of the response.",
+            "# TYPE http_request_duration_seconds histogram"
+        ]
+        for (endpoint, method), histogram in durations:
+            lines += histogram_lines("http_request_duration_seconds", format_labels(endpoint=endpoint, method=method), histogram)
+
+        lines += [
+            "# HELP http_request_stage_duration_seconds Time per request spent in a named stage.",
+            "# TYPE http_request_stage_duration_seconds histogram"
+        ]
+        for (endpoint, stage), histogram in stages:
+            lines += histogram_lines("http_request_stage_duration_seconds", format_labels(endpoint=endpoint, stage=stage), histogram)
+
+        for collect in self.collectors:
+            lines += collect()
+        return "\n".join(lines) + "\n"
+
+
+def histogram_lines(name, labels, histogram):
+    bounds, counts, count, total = histogram.buckets()
+    lines = []
+    cumulative = 0
+    for bound, bucket_count in zip(bounds, counts):
+        cumulative += bucket_count
+        lines.append(f'{name}_bucket{{{labels},le="{bound:g}"}} {cumulative}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+    lines.append(f"{name}_sum{{{labels}}} {total:.6f}")
+    lines.append(f"{name}_count{{{labels}}} {count}")
+    return lines
+
+
+metrics = MetricsRegistry()
+
+
+def _timed_endpoint(path, endpoint):
+    """Wrap an endpoint so its call delimits the parse / handler / serialize stages"""
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            timing = _current.get()
+            if timing is None:
+                return await endpoint(*args, **kwargs)
+            timing.enter_handler()
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                timing.exit_handler()
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            timing = _current.get()
+            if timing is None:
+                return endpoint(*args, **kwargs)
+            timing.enter_handler()
+            try:
+                return endpoint(*args, **kwargs)
+            finally:
+                timing.exit_handler()
+
+    wrapper.route_path = path
+    return wrapper
+
+
+class InstrumentedRoute(APIRoute):
+    """APIRoute whose endpoint reports its route path and handler timing"""
+
+    def __init__(self, path, endpoint, **kwargs):
+        super().__init__(path, _timed_endpoint(path, endpoint), **kwargs)
+
+
+class InstrumentationMiddleware:
+    """Times each HTTP request, adds Server-Timing and records the request in the registry"""
+
+    def __init__(self, app, registry=metrics):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = RequestTiming()
+        token = _current.set(timing)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = timing.server_timing(timing.response_started()).encode("latin-1")
+                message = {**message, "headers": [*message.get("headers", []), (b"server-timing", header)]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        except Exception:
+            status = 500
+            raise
+        finally:
+            _current.reset(token)
+            # The router stores the matched endpoint in the scope; unmatched paths share one label
+            endpoint = getattr(scope.get("endpoint"), "route_path", UNMATCHED_ENDPOINT)
+            self.registry.record(endpoint, scope["method"], status, time.perf_counter() - timing.start, timing.stages)
+
+
+async def metrics_endpoint(request):
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+metrics_endpoint.route_path = "/metrics"
+
+
+def install_instrumentation(app):
+    """
+    Instrument a FastAPI app: call before its routes are declared so they
+    are created as InstrumentedRoute. Does nothing when disabled.
+    """
+    if not INSTRUMENTATION_ENABLED:
+        return
+    app.router.route_class = InstrumentedRoute
+    app.add_middleware(InstrumentationMiddleware)
+    app.add_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
@@ -1,23 +1,31 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
 from typing import Optional, List, Dict, Any
-import pandas as pd
 import numpy as np
 import os
+import asyncio
 from .diversified_portfolio_system import DiversifiedMutualFundSystem
 from .model_loader_utility import MutualFundModelLoader
+from .data_store import load_funds_data, lookup_positions, select_positions
+from .market_regime import MarketRegimeService, MarketDataError, MarketDataUnavailableError, fetch_market_condition, fetch_simulation_regime
+from .backtest import DEFAULT_SPAN_PAIRS, MAX_BACKTEST_YEARS, TIMEFRAMES, run_backtest, span_grid
+from .what_if import DEFAULT_WAIT_MONTHS, MONTE_CARLO_PERCENTILES, predicted_returns_grid, simulate_wait_grid, simulate_wait_monte_carlo, simulate_wait_schedule_grid
+from .prediction_batcher import PredictionMicroBatcher
+from .snapshot_bundle import open_snapshot_bundle
+from .instrumentation import install_instrumentation, metrics, span
+from .admission_control import admission_controller, install_admission_control
+from .static_snapshots import install_static_snapshots, static_snapshot_store
+from .memory_report import benchmark_peaks, collect_report, sample_requests, trace_request
+from .projections import INVESTMENT_MODES, contribution_schedule, invested_amounts, monthly_rate, project_values, projection_rows
+from .market_stream import MarketEventStream, MarketStreamFullError
+from .multi_regime import DEFAULT_INDEX, MARKET_INDICES, fetch_index_regimes, fund_market_index
+import hmac
 import json
+import threading
 import warnings
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
-import seaborn as sns
-from scipy import stats
-from sklearn.preprocessing import StandardScaler
-from sklearn.decomposition import PCA
-import base64
-import io
 warnings.filterwarnings('ignore')
 
 
@@ -29,6 +37,15 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Request stage spans, Server-Timing header and /metrics (before any route is declared)
+install_instrumentation(app)
+
+# Concurrency limits and bounded queues per endpoint cost class (503 + Retry-After when full)
+install_admission_control(app)
+
+# Dataset-only GET endpoints answered from prebuilt files when deployed (ahead of admission control)
+install_static_snapshots(app)
+
 # Add CORS middleware for Next.js frontend
 app.add_middleware(
     CORSMiddleware,
@@ -47,24 +64,85 @@ app.add_middleware(
 ml_system = None
 model_loader = None
 funds_data = None
+prediction_batcher = None
 
-@app.on_event("startup")
-async def startup_event():
-    """Initialize ML models and load data on startup"""
+# Upper bound on (fast, slow) pairs evaluated by one /api/backtest call
+MAX_BACKTEST_PAIRS = 5000
+
+# Bounds of the what-if simulation grid
+MAX_WAIT_MONTHS = 120
+MAX_HORIZON_YEARS = 30
+MAX_WHAT_IF_GRID = 200000
+MAX_WHAT_IF_SCENARIOS = 5000  # waits x funds in the per-fund scenario table
+MAX_MONTE_CARLO_PATHS = 200000
+MAX_MONTE_CARLO_DRAWS = 150_000_000  # paths x funds x (waits + 1)
+MAX_SIP_PROJECTION_MONTHS = 20_000_000  # waits x funds x projected months, summed over horizons
+MAX_FORECAST_BATCH_FUNDS = 2000
+
+# Largest portfolio /api/recommend builds
+MAX_PORTFOLIO_FUNDS = 20
+
+# Investor profiles accepted by one /api/recommend/batch call (~25 ms each)
+MAX_BATCH_PROFILES = 200
+
+# Required in the X-Admin-Token header of /api/admin/* endpoints (unset disables them)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+market_regime_service = MarketRegimeService(sources={
+    "condition": fetch_market_condition,
+    "simulation": fetch_simulation_regime,
+    "indices": fetch_index_regimes
+})
+
+# Pushes market condition / regime changes to SSE clients (one computation for all viewers)
+market_event_stream = MarketEventStream(market_regime_service)
+metrics.add_collector(market_event_stream.metric_lines)
+
+_init_lock = threading.Lock()
+
+def ensure_initialized():
+    """
+    Load the ML system, the models and the funds snapshot once per process.
+    
+    Safe to call from any thread and as often as needed: the startup hook,
+    the first request under serverless handlers (which run without lifespan
+    events) and the preforking server (serve.py), which calls it in the
+    parent so workers inherit everything already loaded.
+    """
+    global ml_system, model_loader, funds_data, prediction_batcher
+    
+    if prediction_batcher is not None:
+        return
+    
+    with _init_lock:
+        if prediction_batcher is not None:
+            return
+        _load_models_and_data()
+        
+        # Concurrent single-fund predictions share one model call per horizon
+        prediction_batcher = PredictionMicroBatcher(model_loader, funds_data)
+
+def _load_models_and_data():
+    """Load the ML system, the models and the funds snapshot"""
     global ml_system, model_loader, funds_data
     
     try:
+        # Prebuilt snapshot bundle (dataset, models and derived state), if deployed
+        snapshot = open_snapshot_bundle()
+        
         # Load ML system
-        ml_system = DiversifiedMutualFundSystem(load_from_pickle=True)
+        ml_system = DiversifiedMutualFundSystem(load_from_pickle=True, snapshot=snapshot)
         
         # Load individual models
         model_loader = MutualFundModelLoader()
-        model_loader.load_all_models()
+        if snapshot is not None:
+            model_loader.load_snapshot(snapshot)
+        else:
+            model_loader.load_all_models()
         
-        # Load funds data
-        import os
-        data_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'mutual_funds_cleaned.csv')
-        funds_data = pd.read_csv(data_path)
+        # Shared read-only snapshot of the funds data (parsed once, also used by the models)
+        funds_data = load_funds_data()
+        lookup_positions(funds_data, [])  # build the name index up front
         
         print("✅ ML models and data loaded successfully")
         
@@ -72,6 +150,32 @@ async def startup_event():
         print(f"❌ Error loading models: {e}")
         raise e
 
+class LazyInitializationMiddleware:
+    """Loads data and models on the first request when no startup event ran (Lambda, Vercel)"""
+    
+    def __init__(self, app):
+        self.app = app
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and prediction_batcher is None and not static_snapshot_store.serves(scope):
+            await run_in_threadpool(ensure_initialized)
+        await self.app(scope, receive, send)
+
+app.add_middleware(LazyInitializationMiddleware)
+
+@app.on_event("startup")
+async def startup_event():
+    """Initialize ML models and load data on startup"""
+    await run_in_threadpool(ensure_initialized)
+    market_regime_service.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background refresh tasks"""
+    await market_regime_service.stop()
+    if prediction_batcher is not None:
+        prediction_batcher.shutdown()
+
 # Pydantic models for request/response
 class RecommendationRequest(BaseModel):
     amc_name: Optional[str] = None
@@ -79,6 +183,11 @@ class RecommendationRequest(BaseModel):
     amount: int
     tenure: int  # in years
     risk_tolerance: str = "moderate"
+    num_funds: int = Field(2, ge=1, le=MAX_PORTFOLIO_FUNDS)  # number of funds in the optimized portfolio
+
+class BatchRecommendationRequest(BaseModel):
+    profiles: List[RecommendationRequest]
+    stream: bool = False  # stream NDJSON results as each candidate pool finishes
 
 class FundFilterRequest(BaseModel):
     amc_name: Optional[str] = None
@@ -90,6 +199,18 @@ class FundFilterRequest(BaseModel):
 class ForecastRequest(BaseModel):
     fund_name: str
     horizon: int = 5
+    investment_mode: str = "lumpsum"  # "lumpsum", "sip" or "step_up_sip"
+    amount: float = 100  # lump sum, or the monthly instalment of an SIP
+    step_up_percent: float = 10  # yearly instalment increase of a step-up SIP
+    stream: bool = False  # stream every month of the horizon as newline-delimited JSON
+
+class ForecastBatchRequest(BaseModel):
+    fund_names: List[str]
+    horizons: List[int] = [1, 3, 5]
+    investment_mode: str = "lumpsum"  # "lumpsum", "sip" or "step_up_sip"
+    amount: float = 100  # lump sum, or the monthly instalment of an SIP
+    step_up_percent: float = 10  # yearly instalment increase of a step-up SIP
+    projection_months: int = 12  # monthly projection rows returned per horizon
 
 class AnalysisRequest(BaseModel):
     analysis_type: str  # 'correlation', 'pca', 'trends', 'performance'
@@ -105,6 +226,28 @@ class WhatIfSimulationRequest(BaseModel):
     investment_amount: float
     duration_years: int  # 1, 3, or 5
     market_regime: Optional[str] = None  # "bull", "sideways", "volatile" - will be auto-detected if not provided
+    wait_months: Optional[List[int]] = None  # wait periods to simulate (default 1, 3 and 6 months)
+    horizons: Optional[List[float]] = None  # extra investment horizons (years) for the grid
+    monte_carlo: bool = False  # add percentile bands and P(wait beats now) from simulated return paths
+    num_paths: int = 10000
+    seed: Optional[int] = None  # fixes the simulated paths; a random seed is reported when omitted
+    investment_mode: str = "lumpsum"  # "sip" / "step_up_sip": investment_amount is the monthly instalment
+    step_up_percent: float = 10
+
+class MemoryTraceRequest(BaseModel):
+    method: str = "GET"
+    path: str  # e.g. "/api/recommend"
+    body: Optional[Dict[str, Any]] = None  # JSON body for POST requests
+    top: int = 15  # allocating source lines returned
+
+class BacktestRequest(BaseModel):
+    index: str = "NIFTY 50"  # index name (see /api/market-regimes)
+    timeframe: str = "4H"  # "1H", "4H", "1D" or "1W"
+    years: float = 2.0
+    horizon_bars: int = 30  # bars after a signal used to judge it
+    span_pairs: Optional[List[List[int]]] = None  # explicit [fast, slow] pairs
+    fast_spans: Optional[List[int]] = None  # or a sweep over fast x slow spans
+    slow_spans: Optional[List[int]] = None
 
 # API Endpoints
 
@@ -243,25 +386,25 @@ async def get_funds(filter_request: FundFilterRequest):
         raise HTTPException(status_code=500, detail="Data not loaded")
     
     try:
-        df_filtered = funds_data.copy()
+        # Apply filters as one mask over the shared snapshot
+        mask = np.ones(len(funds_data), dtype=bool)
         
-        # Apply filters
         if filter_request.amc_name:
-            df_filtered = df_filtered[df_filtered['amc_name'] == filter_request.amc_name]
+            mask &= funds_data['amc_name'].to_numpy() == filter_request.amc_name
         
         if filter_request.category:
             category_col = f'category_{filter_request.category}'
-            if category_col in df_filtered.columns:
-                df_filtered = df_filtered[df_filtered[category_col] == True]
+            if category_col in funds_data.columns:
+                mask &= funds_data[category_col].to_numpy() == True
         
         if filter_request.risk_level:
-            df_filtered = df_filtered[df_filtered['risk_level'] == filter_request.risk_level]
+            mask &= funds_data['risk_level'].to_numpy() == filter_request.risk_level
         
         if filter_request.min_rating:
-            df_filtered = df_filtered[df_filtered['rating'] >= filter_request.min_rating]
+            mask &= funds_data['rating'].to_numpy() >= filter_request.min_rating
         
-        # Limit results
-        df_filtered = df_filtered.head(filter_request.limit)
+        # Limit results; only the selected rows are materialized
+        df_filtered = funds_data.iloc[select_positions(mask, filter_request.limit)]
         
         # Prepare response
         funds = []
@@ -293,6 +436,38 @@ async def get_funds(filter_request: FundFilterRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error filtering funds: {str(e)}")
 
+CATEGORY_MAPPING = {
+    "Equity": "Equity",
+    "Hybrid": "Hybrid", 
+    "Debt": "Debt",
+    "Other": "Other"
+}
+
+def build_recommendation_response(request: RecommendationRequest, plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape an investment plan into the /api/recommend response for one profile"""
+    
+    # Filter by AMC if specified
+    recommendations = plan['recommendations']
+    if request.amc_name:
+        recommendations = [rec for rec in recommendations if rec['amc_name'] == request.amc_name]
+        
+        if not recommendations:
+            # If no recommendations for specific AMC, fall back to the unfiltered plan
+            return {
+                "status": "partial_match",
+                "message": f"No suitable funds found for {request.amc_name}. Showing alternative recommendations.",
+                "recommendations": plan['recommendations'],
+                "investment_summary": plan['investment_summary']
+            }
+    
+    return {
+        "status": "success",
+        "message": plan['message'],
+        "recommendations": recommendations,
+        "investment_summary": plan['investment_summary'],
+        "diversification_analysis": plan.get('diversification_analysis', {})
+    }
+
 @app.post("/api/recommend")
 async def get_recommendations(request: RecommendationRequest):
     """Get AI-powered fund recommendations based on specific inputs"""
@@ -301,58 +476,103 @@ async def get_recommendations(request: RecommendationRequest):
         raise HTTPException(status_code=500, detail="ML system not loaded")
     
     try:
-        # Map category to our system's format
-        category_mapping = {
-            "Equity": "Equity",
-            "Hybrid": "Hybrid", 
-            "Debt": "Debt",
-            "Other": "Other"
-        }
+        category_preference = CATEGORY_MAPPING.get(request.category) if request.category else None
         
-        category_preference = category_mapping.get(request.category) if request.category else None
-        
-        # Generate recommendations
-        plan = ml_system.generate_investment_plan(
+        # Generate recommendations (in the threadpool, keeping the event loop free)
+        plan = await run_in_threadpool(
+            ml_system.generate_investment_plan,
             investment_amount=request.amount,
             horizon=request.tenure,
             risk_tolerance=request.risk_tolerance,
-            category_preference=category_preference
+            category_preference=category_preference,
+            n_funds=request.num_funds
         )
         
         if plan['status'] != 'success':
             raise HTTPException(status_code=400, detail=plan['message'])
         
-        # Filter by AMC if specified
-        recommendations = plan['recommendations']
-        if request.amc_name:
-            recommendations = [rec for rec in recommendations if rec['amc_name'] == request.amc_name]
-            
-            if not recommendations:
-                # If no recommendations for specific AMC, get alternative suggestions
-                alternative_plan = ml_system.generate_investment_plan(
-                    investment_amount=request.amount,
-                    horizon=request.tenure,
-                    risk_tolerance=request.risk_tolerance,
-                    category_preference=category_preference
+        return build_recommendation_response(request, plan)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating recommendations: {str(e)}")
+
+def iter_batch_recommendations(profiles: List[RecommendationRequest]):
+    """
+    Yield (index, result) for every profile, scoring each distinct candidate pool once.
+    
+    Profiles sharing tenure, risk tolerance and category reuse one filtered and
+    predicted pool; only the cheap amount filter and the optimizer run per profile.
+    Results are yielded pool by pool as they finish.
+    """
+    pools = {}
+    for index, profile in enumerate(profiles):
+        category_preference = CATEGORY_MAPPING.get(profile.category) if profile.category else None
+        key = (profile.tenure, profile.risk_tolerance, category_preference)
+        pools.setdefault(key, []).append(index)
+    
+    for (tenure, risk_tolerance, category_preference), indices in pools.items():
+        try:
+            pool = ml_system.score_candidate_pool(tenure, risk_tolerance, category_preference)
+        except Exception as e:
+            for index in indices:
+                yield index, {"status": "error", "message": f"Error generating recommendations: {str(e)}"}
+            continue
+        
+        for index in indices:
+            profile = profiles[index]
+            try:
+                plan = ml_system.generate_investment_plan(
+                    investment_amount=profile.amount,
+                    horizon=tenure,
+                    risk_tolerance=risk_tolerance,
+                    category_preference=category_preference,
+                    n_funds=profile.num_funds,
+                    candidate_pool=pool
                 )
-                
-                return {
-                    "status": "partial_match",
-                    "message": f"No suitable funds found for {request.amc_name}. Showing alternative recommendations.",
-                    "recommendations": alternative_plan['recommendations'],
-                    "investment_summary": alternative_plan['investment_summary']
-                }
+                if plan['status'] != 'success':
+                    result = {"status": "error", "message": plan['message']}
+                else:
+                    result = build_recommendation_response(profile, plan)
+            except Exception as e:
+                result = {"status": "error", "message": f"Error generating recommendations: {str(e)}"}
+            yield index, result
+
+@app.post("/api/recommend/batch")
+async def get_batch_recommendations(request: BatchRecommendationRequest):
+    """Get recommendations for many investor profiles, scoring each shared candidate pool once"""
+    
+    if ml_system is None:
+        raise HTTPException(status_code=500, detail="ML system not loaded")
+    if not request.profiles or len(request.profiles) > MAX_BATCH_PROFILES:
+        raise HTTPException(status_code=400, detail=f"profiles must contain 1 to {MAX_BATCH_PROFILES} profiles")
+    
+    if request.stream:
+        # Newline-delimited JSON, one line per profile in completion order
+        def stream_results():
+            for index, result in iter_batch_recommendations(request.profiles):
+                yield json.dumps({"index": index, **result}, default=str) + "\n"
+        
+        return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+    
+    def collect_results():
+        results = [None] * len(request.profiles)
+        for index, result in iter_batch_recommendations(request.profiles):
+            results[index] = {"index": index, **result}
+        return results
+    
+    try:
+        results = await run_in_threadpool(collect_results)
         
         return {
-            "status": "success",
-            "message": plan['message'],
-            "recommendations": recommendations,
-            "investment_summary": plan['investment_summary'],
-            "diversification_analysis": plan.get('diversification_analysis', {})
+            "results": results,
+            "total_profiles": len(request.profiles),
+            "successful": sum(1 for r in results if r["status"] != "error")
         }
         
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error generating recommendations: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error generating batch recommendations: {str(e)}")
 
 @app.post("/api/forecast")
 async def get_fund_forecast(request: ForecastRequest):
@@ -363,19 +583,24 @@ async def get_fund_forecast(request: ForecastRequest):
     
     try:
         # Find the fund
-        fund_data = funds_data[funds_data['scheme_name'] == request.fund_name]
+        position = lookup_positions(funds_data, [request.fund_name])[0]
         
-        if fund_data.empty:
+        if position < 0:
             raise HTTPException(status_code=404, detail="Fund not found")
         
-        fund_row = fund_data.iloc[0]
+        fund_row = funds_data.iloc[position]
         
         # Generate predictions for different horizons
         predictions = {}
         
-        for horizon in [1, 3, 5]:
+        with span("predict"):
+            results = await asyncio.gather(
+                *(prediction_batcher.predict(position, horizon) for horizon in [1, 3, 5]), return_exceptions=True
+            )
+        for horizon, predicted_return in zip([1, 3, 5], results):
             try:
-                predicted_return = model_loader.predict_fund_return(fund_row.to_dict(), horizon)
+                if isinstance(predicted_return, Exception):
+                    raise predicted_return
                 predictions[f"{horizon}_year"] = {
                     "predicted_return": float(predicted_return),
                     "historical_return": float(fund_row[f'return_{horizon}yr']),
@@ -387,20 +612,18 @@ async def get_fund_forecast(request: ForecastRequest):
                 }
         
         # Generate monthly projections for requested horizon
-        monthly_projections = []
-        if request.horizon in [1, 3, 5]:
+        values, invested = None, None
+        if request.horizon in [1, 3, 5] and "predicted_return" in predictions[f"{request.horizon}_year"]:
             annual_return = predictions[f"{request.horizon}_year"]["predicted_return"]
-            monthly_return = annual_return / 12
-            
-            for month in range(1, request.horizon * 12 + 1):
-                projected_value = 100 * ((1 + monthly_return/100) ** month)
-                monthly_projections.append({
-                    "month": month,
-                    "projected_value": round(projected_value, 2),
-                    "return_percentage": round(projected_value - 100, 2)
-                })
+            with span("project"):
+                contributions = contribution_schedule(
+                    request.horizon * 12, request.investment_mode, request.amount,
+                    step_up_percent=request.step_up_percent
+                )
+                values = project_values(monthly_rate(annual_return, "nominal"), contributions)
+                invested = invested_amounts(contributions)
         
-        return {
+        summary = {
             "fund_name": request.fund_name,
             "amc_name": fund_row['amc_name'],
             "current_metrics": {
@@ -411,23 +634,209 @@ async def get_fund_forecast(request: ForecastRequest):
                 "fund_age": float(fund_row['fund_age'])
             },
             "predictions": predictions,
-            "monthly_projections": monthly_projections[:12] if monthly_projections else [],  # First year only
-            "forecast_horizon": request.horizon
+            "forecast_horizon": request.horizon,
+            "investment_mode": request.investment_mode
+        }
+        if values is not None:
+            summary["final_projection"] = next(projection_rows(values[-1:], invested[-1:], first_month=len(values)))
+        
+        if request.stream:
+            # Newline-delimited JSON: the summary, then one line per month of the full horizon
+            def stream_projections():
+                yield json.dumps(summary, default=str) + "\n"
+                if values is not None:
+                    for row in projection_rows(values, invested):
+                        yield json.dumps(row) + "\n"
+            
+            return StreamingResponse(stream_projections(), media_type="application/x-ndjson")
+        
+        return {
+            **summary,
+            "monthly_projections": list(projection_rows(values[:12], invested[:12])) if values is not None else []  # First year only
         }
         
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating forecast: {str(e)}")
 
+def build_batch_forecasts(request):
+    """
+    Forecasts for many funds: one name lookup, one model call per horizon and
+    one projection pass over the whole (fund x horizon x month) grid.
+    """
+    positions = lookup_positions(funds_data, request.fund_names)
+    found = positions >= 0
+    funds = funds_data.iloc[positions[found]]
+    horizons = request.horizons
+    
+    predicted = np.full((len(funds), len(horizons)), np.nan)
+    errors = {}
+    with span("predict"):
+        for j, horizon in enumerate(horizons):
+            try:
+                predicted[:, j] = model_loader.predict_fund_returns_batch(funds, horizon)
+            except Exception as e:
+                errors[horizon] = f"Prediction failed: {str(e)}"
+    
+    # Every horizon's curve is a prefix of the longest one (constant monthly rate)
+    months = max(horizons) * 12
+    with span("project"):
+        contributions = contribution_schedule(
+            months, request.investment_mode, request.amount, step_up_percent=request.step_up_percent
+        )
+        values = project_values(monthly_rate(np.nan_to_num(predicted), "nominal")[..., None], contributions)  # (F x H x months)
+        invested = invested_amounts(contributions)
+    
+    columns = {col: funds[col].to_numpy() for col in
+               ['scheme_name', 'amc_name', 'risk_level', 'rating', 'expense_ratio', 'fund_size', 'fund_age']}
+    history = {h: funds[f'return_{h}yr'].to_numpy(dtype=np.float64) for h in set(horizons)}
+    
+    forecasts = []
+    for i in range(len(funds)):
+        predictions, projections = {}, {}
+        for j, horizon in enumerate(horizons):
+            key = f"{horizon}_year"
+            if horizon in errors or np.isnan(predicted[i, j]):
+                predictions[key] = {"error": errors.get(horizon, "Prediction failed: missing features")}
+                continue
+            predictions[key] = {
+                "predicted_return": float(predicted[i, j]),
+                "historical_return": float(history[horizon][i]),
+                "confidence": "high" if horizon == 3 else "medium"  # 3-year has highest accuracy
+            }
+            horizon_months = horizon * 12
+            shown = min(request.projection_months, horizon_months)
+            projections[key] = {
+                "monthly_projections": list(projection_rows(values[i, j, :shown], invested[:shown])),
+                "final_projection": next(projection_rows(
+                    values[i, j, horizon_months - 1:horizon_months], invested[horizon_months - 1:horizon_months],
+                    first_month=horizon_months
+                ))
+            }
+        
+        forecasts.append({
+            "fund_name": columns['scheme_name'][i],
+            "amc_name": columns['amc_name'][i],
+            "current_metrics": {
+                "risk_level": int(columns['risk_level'][i]),
+                "rating": int(columns['rating'][i]),
+                "expense_ratio": float(columns['expense_ratio'][i]),
+                "fund_size": float(columns['fund_size'][i]),
+                "fund_age": float(columns['fund_age'][i])
+            },
+            "predictions": predictions,
+            "projections": projections
+        })
+    
+    return {
+        "forecasts": forecasts,
+        "not_found": [name for name, ok in zip(request.fund_names, found) if not ok],
+        "horizons": horizons,
+        "investment_mode": request.investment_mode
+    }
+
+@app.post("/api/forecast/batch")
+async def get_batch_forecast(request: ForecastBatchRequest):
+    """Forecasts and monthly projections for many funds and horizons in one call"""
+    
+    if model_loader is None or funds_data is None:
+        raise HTTPException(status_code=500, detail="Models or data not loaded")
+    
+    if not request.fund_names or len(request.fund_names) > MAX_FORECAST_BATCH_FUNDS:
+        raise HTTPException(status_code=400, detail=f"fund_names must contain 1 to {MAX_FORECAST_BATCH_FUNDS} funds")
+    if not request.horizons or any(h not in [1, 3, 5] for h in request.horizons):
+        raise HTTPException(status_code=400, detail="horizons must be 1, 3 or 5 years")
+    if request.projection_months < 0:
+        raise HTTPException(status_code=400, detail="projection_months must not be negative")
+    
+    try:
+        return await run_in_threadpool(build_batch_forecasts, request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating forecasts: {str(e)}")
+
+@app.get("/api/prediction-batcher/stats")
+async def get_prediction_batcher_stats():
+    """Batch size and queue wait histograms of the prediction micro-batcher"""
+    
+    if prediction_batcher is None:
+        raise HTTPException(status_code=500, detail="Models or data not loaded")
+    
+    return prediction_batcher.stats()
+
+@app.get("/api/admission/stats")
+async def get_admission_stats():
+    """Concurrency, queue depth, admissions and rejections per endpoint cost class"""
+    return admission_controller.stats()
+
+def check_admin_token(token: Optional[str]):
+    """Admin endpoints exist only when ADMIN_TOKEN is configured, and require it in X-Admin-Token"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Admin endpoints are disabled (ADMIN_TOKEN is not set)")
+    if not hmac.compare_digest((token or "").encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+# tracemalloc is process-wide: one traced run at a time
+_memory_trace_lock = asyncio.Lock()
+
+@app.get("/api/admin/memory")
+async def get_memory_report(
+    benchmark: bool = Query(False, description="Also measure the peak traced memory of a sample request per endpoint"),
+    repeats: int = Query(1, ge=1, le=10),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """Byte footprint of the loaded DataFrames, models, caches and indexes"""
+    
+    check_admin_token(x_admin_token)
+    if ml_system is None or model_loader is None or funds_data is None:
+        raise HTTPException(status_code=500, detail="Models or data not loaded")
+    
+    try:
+        result = {}
+        if benchmark:
+            async with _memory_trace_lock:
+                result["benchmark"] = await benchmark_peaks(app, sample_requests(funds_data), repeats)
+        
+        report = await run_in_threadpool(
+            collect_report, ml_system, model_loader, funds_data,
+            {"market_regime_snapshots": market_regime_service.snapshots()}
+        )
+        return {**report, **result}
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error building memory report: {str(e)}")
+
+@app.post("/api/admin/memory/trace")
+async def trace_request_memory(request: MemoryTraceRequest, x_admin_token: Optional[str] = Header(None)):
+    """Run one request in-process under tracemalloc and report its peak memory and top allocators"""
+    
+    check_admin_token(x_admin_token)
+    if not request.path.startswith("/") or request.path.startswith("/api/admin"):
+        raise HTTPException(status_code=400, detail="path must be an API path outside /api/admin")
+    if request.method.upper() not in ("GET", "POST"):
+        raise HTTPException(status_code=400, detail="method must be GET or POST")
+    
+    try:
+        async with _memory_trace_lock:
+            return await trace_request(app, request.method, request.path, request.body, max(0, request.top))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error tracing request: {str(e)}")
+
 @app.get("/api/enhanced-analysis")
-async def get_enhanced_analysis():
+def get_enhanced_analysis():
     """Get enhanced descriptive analysis with correlations, trends, and patterns"""
+    # A plain def: FastAPI runs it in the threadpool, off the event loop
     
     if funds_data is None:
         raise HTTPException(status_code=500, detail="Data not loaded")
     
     try:
+        from scipy import stats
+        
         # Correlation Analysis
         numeric_cols = ['return_1yr', 'return_3yr', 'return_5yr', 'risk_level', 
                        'expense_ratio', 'fund_size', 'fund_age', 'rating', 
@@ -583,17 +992,28 @@ async def compare_funds(request: ComparisonRequest):
     try:
         comparison_data = []
         
-        for fund_name in request.fund_names:
-            fund = funds_data[funds_data['scheme_name'] == fund_name]
-            
-            if fund.empty:
+        positions = lookup_positions(funds_data, request.fund_names)
+        
+        # All predictions are requested together so they share micro-batches
+        predicted = {}
+        if model_loader is not None:
+            found = [int(position) for position in positions if position >= 0]
+            requests = [(position, horizon) for position in found for horizon in [1, 3, 5]]
+            with span("predict"):
+                results = await asyncio.gather(
+                    *(prediction_batcher.predict(position, horizon) for position, horizon in requests), return_exceptions=True
+                )
+            predicted = dict(zip(requests, results))
+        
+        for fund_name, position in zip(request.fund_names, positions):
+            if position < 0:
                 comparison_data.append({
                     "fund_name": fund_name,
                     "error": "Fund not found"
                 })
                 continue
             
-            fund_row = fund.iloc[0]
+            fund_row = funds_data.iloc[position]
             fund_info = {
                 "fund_name": fund_name,
                 "amc_name": fund_row['amc_name']
@@ -609,7 +1029,9 @@ async def compare_funds(request: ComparisonRequest):
                 try:
                     predictions = {}
                     for horizon in [1, 3, 5]:
-                        pred = model_loader.predict_fund_return(fund_row.to_dict(), horizon)
+                        pred = predicted[(int(position), horizon)]
+                        if isinstance(pred, Exception):
+                            raise pred
                         predictions[f"predicted_{horizon}yr"] = float(pred)
                     fund_info["predictions"] = predictions
                 except:
@@ -723,19 +1145,22 @@ async def get_top_performers(
         raise HTTPException(status_code=500, detail="Data not loaded")
     
     try:
-        df_filtered = funds_data.copy()
+        mask = np.ones(len(funds_data), dtype=bool)
         
         # Filter by category if specified
         if category:
             category_col = f'category_{category}'
-            if category_col in df_filtered.columns:
-                df_filtered = df_filtered[df_filtered[category_col] == True]
+            if category_col in funds_data.columns:
+                mask &= funds_data[category_col].to_numpy() == True
         
         # Get top performers
-        if metric not in df_filtered.columns:
+        if metric not in funds_data.columns:
             raise HTTPException(status_code=400, detail=f"Invalid metric: {metric}")
         
-        top_funds = df_filtered.nlargest(limit, metric)
+        # Rank only the metric column; only the top rows are materialized
+        candidates = select_positions(mask)
+        top_positions = funds_data[metric].iloc[candidates].reset_index(drop=True).nlargest(limit).index
+        top_funds = funds_data.iloc[candidates[top_positions]]
         
         performers = []
         for _, fund in top_funds.iterrows():
@@ -756,7 +1181,7 @@ async def get_top_performers(
             "metric": metric,
             "category": category or "All",
             "top_performers": performers,
-            "total_evaluated": len(df_filtered)
+            "total_evaluated": len(candidates)
         }
         
     except HTTPException:
@@ -820,368 +1245,379 @@ async def get_dashboard_data():
 @app.get("/api/market-condition")
 async def get_market_condition():
     """
-    Fetch Nifty 50 data, calculate EMA 12/21 on 4H timeframe, 
-    and suggest market condition based on crossover
+    Nifty 50 EMA 12/21 crossover on the 4H timeframe, served from the
+    background-refreshed snapshot together with its age
     """
     try:
-        import yfinance as yf
-        from datetime import datetime, timedelta
-        
-        # Fetch Nifty 50 data (^NSEI is the Yahoo Finance ticker for Nifty 50)
-        ticker = "^NSEI"
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=365)  # Past 1 year
-        
-        # Download data
-        nifty = yf.download(ticker, start=start_date, end=end_date, interval="1h", progress=False)
-        
-        if nifty.empty:
-            raise HTTPException(status_code=500, detail="Failed to fetch Nifty 50 data")
-        
-        # Resample to 4H timeframe
-        nifty_4h = nifty['Close'].resample('4H').last().dropna()
-        
-        if len(nifty_4h) < 21:
-            raise HTTPException(status_code=500, detail="Insufficient data for EMA calculation")
-        
-        # Calculate EMA 12 and EMA 21
-        ema_12 = nifty_4h.ewm(span=12, adjust=False).mean()
-        ema_21 = nifty_4h.ewm(span=21, adjust=False).mean()
-        
-        # Get latest values
-        latest_price = float(nifty_4h.iloc[-1])
-        latest_ema_12 = float(ema_12.iloc[-1])
-        latest_ema_21 = float(ema_21.iloc[-1])
-        
-        # Previous values to detect crossover
-        prev_ema_12 = float(ema_12.iloc[-2]) if len(ema_12) > 1 else latest_ema_12
-        prev_ema_21 = float(ema_21.iloc[-2]) if len(ema_21) > 1 else latest_ema_21
-        
-        # Determine market condition
-        # Bullish: EMA 12 > EMA 21 (good to invest)
-        # Bearish: EMA 12 < EMA 21 (not good to invest)
-        is_bullish = latest_ema_12 > latest_ema_21
-        was_bullish = prev_ema_12 > prev_ema_21
-        
-        # Detect crossover
-        crossover = None
-        if is_bullish != was_bullish:
-            if is_bullish:
-                crossover = "bullish"  # Golden cross (EMA 12 crossed above EMA 21)
-            else:
-                crossover = "bearish"  # Death cross (EMA 12 crossed below EMA 21)
-        
-        # Calculate percentage difference
-        ema_diff_percent = ((latest_ema_12 - latest_ema_21) / latest_ema_21) * 100
-        
-        # Market condition recommendation
-        if is_bullish:
-            condition = "bullish"
-            recommendation = "favorable"
-            message = "Market conditions are favorable for investment. EMA 12 is above EMA 21, indicating upward momentum."
-        else:
-            condition = "bearish"
-            recommendation = "caution"
-            message = "Market conditions suggest caution. EMA 12 is below EMA 21, indicating potential downward pressure."
-        
-        # Calculate trend strength (distance between EMAs)
-        trend_strength = abs(ema_diff_percent)
-        if trend_strength < 0.5:
-            strength = "weak"
-        elif trend_strength < 1.5:
-            strength = "moderate"
-        else:
-            strength = "strong"
-        
-        # Calculate estimated time for market improvement (if currently bearish)
-        estimated_improvement_time = None
-        estimated_improvement_date = None
-        improvement_confidence = None
-        
-        if not is_bullish:
-            # Calculate rate of change for EMA 12 and EMA 21 over last 10 periods
-            lookback_periods = min(10, len(ema_12) - 1)
-            if lookback_periods > 0:
-                # Get recent EMA values
-                recent_ema_12 = ema_12.iloc[-lookback_periods:].values
-                recent_ema_21 = ema_21.iloc[-lookback_periods:].values
-                
-                # Calculate average rate of change per 4H period
-                ema_12_changes = np.diff(recent_ema_12)
-                ema_21_changes = np.diff(recent_ema_21)
-                
-                avg_ema_12_change = np.mean(ema_12_changes) if len(ema_12_changes) > 0 else 0
-                avg_ema_21_change = np.mean(ema_21_changes) if len(ema_21_changes) > 0 else 0
-                
-                # Net convergence rate (how fast EMA 12 is catching up to EMA 21)
-                convergence_rate = avg_ema_12_change - avg_ema_21_change
-                
-                # Current gap
-                current_gap = latest_ema_21 - latest_ema_12
-                
-                # Estimate periods needed for crossover (if convergence is positive)
-                if convergence_rate > 0 and current_gap > 0:
-                    periods_to_crossover = current_gap / convergence_rate
-                    # Convert 4H periods to hours, then to days
-                    hours_to_improvement = periods_to_crossover * 4
-                    days_to_improvement = hours_to_improvement / 24
-                    
-                    # Cap at reasonable maximum (e.g., 90 days)
-                    if days_to_improvement > 0 and days_to_improvement <= 90:
-                        estimated_improvement_time = {
-                            "days": int(days_to_improvement),
-                            "hours": int(hours_to_improvement % 24),
-                            "total_hours": int(hours_to_improvement)
-                        }
-                        
-                        # Calculate estimated date
-                        estimated_date = datetime.now() + timedelta(hours=hours_to_improvement)
-                        estimated_improvement_date = estimated_date.isoformat()
-                        
-                        # Calculate confidence based on trend consistency
-                        ema_12_std = np.std(ema_12_changes) if len(ema_12_changes) > 0 else 1
-                        ema_21_std = np.std(ema_21_changes) if len(ema_21_changes) > 0 else 1
-                        
-                        # Lower volatility = higher confidence
-                        volatility_score = (ema_12_std + ema_21_std) / 2
-                        if volatility_score < abs(convergence_rate) * 0.3:
-                            improvement_confidence = "high"
-                        elif volatility_score < abs(convergence_rate) * 0.6:
-                            improvement_confidence = "medium"
-                        else:
-                            improvement_confidence = "low"
-                    else:
-                        # If estimate is too far out or negative, provide general guidance
-                        estimated_improvement_time = {
-                            "days": None,
-                            "hours": None,
-                            "total_hours": None,
-                            "message": "Market recovery timeline uncertain. Monitor EMA convergence trends."
-                        }
-                        improvement_confidence = "low"
-                else:
-                    # Diverging trend - market getting worse
-                    estimated_improvement_time = {
-                        "days": None,
-                        "hours": None,
-                        "total_hours": None,
-                        "message": "EMAs are diverging. Wait for trend reversal signals before investing."
-                    }
-                    improvement_confidence = "low"
-        
-        response = {
-            "ticker": ticker,
-            "current_price": latest_price,
-            "ema_12": latest_ema_12,
-            "ema_21": latest_ema_21,
-            "ema_diff_percent": round(ema_diff_percent, 2),
-            "condition": condition,
-            "recommendation": recommendation,
-            "message": message,
-            "crossover": crossover,
-            "trend_strength": strength,
-            "last_updated": datetime.now().isoformat(),
-            "timeframe": "4H",
-            "data_points": len(nifty_4h),
-            "period": "1 year"
-        }
-        
-        # Add improvement estimates if available
-        if estimated_improvement_time:
-            response["estimated_improvement_time"] = estimated_improvement_time
-        if estimated_improvement_date:
-            response["estimated_improvement_date"] = estimated_improvement_date
-        if improvement_confidence:
-            response["improvement_confidence"] = improvement_confidence
-        
-        return response
+        return await market_regime_service.market_condition()
         
-    except HTTPException:
-        raise
     except ImportError:
         raise HTTPException(status_code=500, detail="yfinance library not installed. Run: pip install yfinance")
+    except MarketDataUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except MarketDataError as e:
+        raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching market condition: {str(e)}")
 
-def classify_market_regime(ema_diff_percent: float, trend_strength: str, volatility: float = None) -> str:
+@app.get("/api/market-condition/stream")
+async def stream_market_condition(
+    sources: Optional[str] = Query(None, description="Comma-separated: condition, indices, simulation (default: all)"),
+    last_event_id: Optional[str] = Header(None)
+):
     """
-    Classify market regime based on EMA analysis and volatility
-    Returns: "bull", "sideways", or "volatile"
+    Server-sent events: the market condition, index regimes and what-if
+    regime, pushed only when a new 4H bar or a crossover changes them
     """
-    # Strong bullish trend
-    if ema_diff_percent > 1.0 and trend_strength in ["strong", "moderate"]:
-        return "bull"
     
-    # Strong bearish trend or high volatility
-    if ema_diff_percent < -1.0 or (volatility and volatility > 15):
-        return "volatile"
+    selected = [name.strip() for name in sources.split(",") if name.strip()] if sources else None
+    if selected is not None:
+        unknown = [name for name in selected if name not in market_event_stream.sources]
+        if unknown or not selected:
+            raise HTTPException(status_code=400, detail=f"Unknown sources: {', '.join(unknown)}. Use: {', '.join(market_event_stream.sources)}")
     
-    # Sideways market (weak trend, small EMA difference)
-    return "sideways"
+    try:
+        subscriber = market_event_stream.subscribe(selected)
+    except MarketStreamFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    
+    return StreamingResponse(
+        market_event_stream.events(subscriber, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/api/market-condition/stream/stats")
+async def get_market_stream_stats():
+    """Connected stream clients and published events"""
+    return market_event_stream.stats()
+
+@app.get("/api/market-regimes")
+async def get_market_regimes(
+    indices: Optional[str] = None,
+    fund_names: Optional[List[str]] = Query(None)
+):
+    """
+    EMA 12/21 regimes (4H) for the broad and sectoral indices, computed for all
+    indices together from one concurrent refresh.
+
+    indices: optional comma-separated index names to return (default: all)
+    fund_names: optional funds to map to the index whose regime applies to them
+    """
+    try:
+        snapshot, info = await market_regime_service.get("indices")
+
+        regimes = snapshot["indices"]
+        if indices:
+            requested = [name.strip().upper() for name in indices.split(",") if name.strip()]
+            unknown = [name for name in requested if name not in MARKET_INDICES]
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Unknown indices: {', '.join(unknown)}. Available: {', '.join(MARKET_INDICES)}")
+            regimes = {name: regimes[name] for name in requested if name in regimes}
+
+        response = {**snapshot, "indices": regimes, **info}
+
+        if fund_names:
+            fund_regimes = []
+            positions = lookup_positions(funds_data, fund_names) if funds_data is not None else []
+            for fund_name, position in zip(fund_names, positions):
+                if position < 0:
+                    continue
+                index_name = fund_market_index(funds_data.iloc[position].to_dict())
+                if index_name not in snapshot["indices"]:
+                    # Sector index unavailable: fall back to the broad market
+                    index_name = DEFAULT_INDEX
+                index_regime = snapshot["indices"].get(index_name, {})
+                fund_regimes.append({
+                    "fund_name": fund_name,
+                    "index": index_name,
+                    "condition": index_regime.get("condition"),
+                    "market_regime": index_regime.get("market_regime")
+                })
+            response["fund_regimes"] = fund_regimes
+
+        return response
+
+    except HTTPException:
+        raise
+    except MarketDataUnavailableError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except MarketDataError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching market regimes: {str(e)}")
+
+@app.post("/api/backtest")
+async def backtest_crossover_signal(request: BacktestRequest):
+    """
+    Historical hit rate, lead time and return after signal of the EMA
+    crossover rule, for one or many (fast, slow) span pairs
+    """
+    if request.span_pairs:
+        span_pairs = [tuple(pair) for pair in request.span_pairs]
+    elif request.fast_spans and request.slow_spans:
+        span_pairs = span_grid(request.fast_spans, request.slow_spans)
+    else:
+        span_pairs = DEFAULT_SPAN_PAIRS
+
+    if not span_pairs or any(len(pair) != 2 or not 1 <= pair[0] < pair[1] for pair in span_pairs):
+        raise HTTPException(status_code=400, detail="Span pairs must be [fast, slow] with 1 <= fast < slow")
+    if len(span_pairs) > MAX_BACKTEST_PAIRS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BACKTEST_PAIRS} span pairs per backtest")
+    if request.timeframe not in TIMEFRAMES:
+        raise HTTPException(status_code=400, detail=f"Unknown timeframe: {request.timeframe}. Available: {', '.join(TIMEFRAMES)}")
+    if request.horizon_bars < 1 or request.years <= 0:
+        raise HTTPException(status_code=400, detail="horizon_bars and years must be positive")
+    if request.years > MAX_BACKTEST_YEARS[request.timeframe]:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BACKTEST_YEARS[request.timeframe]} years of {request.timeframe} bars per backtest")
+    if request.index.upper() not in MARKET_INDICES:
+        raise HTTPException(status_code=400, detail=f"Unknown index: {request.index}. Available: {', '.join(MARKET_INDICES)}")
+
+    ticker = MARKET_INDICES[request.index.upper()]
+
+    try:
+        result = await run_in_threadpool(
+            run_backtest, ticker, request.timeframe, request.years, span_pairs, request.horizon_bars
+        )
+        return {"index": request.index, **result}
+
+    except MarketDataError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error running backtest: {str(e)}")
+
+def build_what_if_response(request: WhatIfSimulationRequest, selected_funds, wait_periods: List[int], horizons: List[int],
+                           primary: int, market_regime: str, market_regime_status: Dict[str, Any]) -> JSONResponse:
+    """
+    Simulate a validated what-if request and render its JSON response
+    (CPU bound: called in the threadpool)
+    """
+    # One batched prediction per model, then the whole (wait x fund x horizon) grid at once
+    base_returns = predicted_returns_grid(model_loader, selected_funds, horizons)
+    if request.investment_mode == "lumpsum":
+        grid = simulate_wait_grid(base_returns, request.investment_amount, horizons, wait_periods, market_regime)
+    else:
+        grid = simulate_wait_schedule_grid(
+            base_returns, request.investment_amount, horizons, wait_periods,
+            market_regime, request.investment_mode, request.step_up_percent
+        )
+    
+    invest_now_profit = np.round(grid["invest_now_profit"], 2)
+    total_wait_profit = np.round(grid["total_wait_profit"], 2)
+    avg_invest_now_profit = invest_now_profit.mean(axis=0)  # (H,)
+    avg_wait_profit = total_wait_profit.mean(axis=1)  # (W x H)
+    avg_net_difference = avg_invest_now_profit[None, :] - avg_wait_profit
+    
+    fund_names = selected_funds['scheme_name'].tolist()
+    amc_names = selected_funds['amc_name'].tolist()
+    
+    # Scenario details for the requested duration, rounded a whole column at a time
+    h = primary
+    now_value = np.round(grid["invest_now_value"][:, h], 2).tolist()
+    now_profit = invest_now_profit[:, h].tolist()
+    now_rate = np.round(grid["invest_now_rate"][:, h] * 100, 2).tolist()
+    wait_value = np.round(grid["wait_value"][:, :, h], 2).tolist()
+    wait_profit = np.round(grid["wait_profit"][:, :, h], 2).tolist()
+    wait_rate = np.round(grid["wait_rate"][:, :, h] * 100, 2).tolist()
+    effective_duration = np.round(grid["effective_duration"][:, h], 2).tolist()
+    idle_earnings = np.round(grid["idle_earnings"][:, h], 2).tolist()
+    total_value = np.round(grid["total_wait_value"][:, :, h], 2).tolist()
+    total_profit = total_wait_profit[:, :, h].tolist()
+    net_difference = np.round(grid["invest_now_profit"][None, :, h] - grid["total_wait_profit"][:, :, h], 2).tolist()
+    invest_now_wins = (grid["invest_now_profit"][None, :, h] > grid["total_wait_profit"][:, :, h]).tolist()
+    
+    scenarios = []
+    for w, wait_months in enumerate(wait_periods):
+        scenario_results = [
+            {
+                "fund_name": fund_names[f],
+                "amc_name": amc_names[f],
+                "invest_now": {
+                    "final_value": now_value[f],
+                    "profit": now_profit[f],
+                    "return_percentage": now_rate[f],
+                    "duration_years": request.duration_years
+                },
+                "wait_and_invest": {
+                    "final_value": wait_value[w][f],
+                    "profit": wait_profit[w][f],
+                    "return_percentage": wait_rate[w][f],
+                    "duration_years": effective_duration[w],
+                    "idle_earnings": idle_earnings[w]
+                },
+                "total_wait_scenario": {
+                    "final_value": total_value[w][f],
+                    "profit": total_profit[w][f],
+                    "net_difference": net_difference[w][f],
+                    "recommendation": "invest_now" if invest_now_wins[w][f] else "wait"
+                }
+            }
+            for f in range(len(fund_names))
+        ]
+        
+        # Aggregate results across all funds
+        scenario_now_profit = float(avg_invest_now_profit[h])
+        scenario_wait_profit = float(avg_wait_profit[w, h])
+        
+        scenarios.append({
+            "wait_months": wait_months,
+            "market_regime": market_regime,
+            "fund_results": scenario_results,
+            "aggregate": {
+                "avg_invest_now_profit": round(scenario_now_profit, 2),
+                "avg_wait_profit": round(scenario_wait_profit, 2),
+                "net_difference": round(scenario_now_profit - scenario_wait_profit, 2),
+                "recommendation": "invest_now" if scenario_now_profit > scenario_wait_profit else "wait",
+                "recommendation_strength": "strong" if abs(scenario_now_profit - scenario_wait_profit) > (grid["invested"][h] * 0.05) else "moderate"
+            }
+        })
+    
+    monte_carlo = None
+    if request.monte_carlo:
+        seed = request.seed if request.seed is not None else int(np.random.SeedSequence().entropy % (2 ** 32))
+        mc = simulate_wait_monte_carlo(
+            base_returns[:, primary], selected_funds, request.investment_amount,
+            request.duration_years, wait_periods, market_regime, request.num_paths, seed
+        )
+        
+        def bands(values):
+            return {f"p{q}": round(float(v), 2) for q, v in zip(MONTE_CARLO_PERCENTILES, values)}
+        
+        monte_carlo = {
+            "num_paths": request.num_paths,
+            "seed": seed,
+            "duration_years": request.duration_years,
+            "percentiles": MONTE_CARLO_PERCENTILES,
+            "invest_now_profit_bands": bands(mc["portfolio_bands"][0]),
+            "funds": [
+                {"fund_name": fund_names[f], "invest_now_profit_bands": bands(mc["fund_bands"][f, 0])}
+                for f in range(len(fund_names))
+            ],
+            "scenarios": [
+                {
+                    "wait_months": wait_months,
+                    "prob_wait_beats_now": round(float(mc["portfolio_prob_wait_beats_now"][w]), 4),
+                    "total_wait_profit_bands": bands(mc["portfolio_bands"][w + 1]),
+                    "fund_results": [
+                        {
+                            "fund_name": fund_names[f],
+                            "prob_wait_beats_now": round(float(mc["fund_prob_wait_beats_now"][w, f]), 4),
+                            "total_wait_profit_bands": bands(mc["fund_bands"][f, w + 1])
+                        }
+                        for f in range(len(fund_names))
+                    ]
+                }
+                for w, wait_months in enumerate(wait_periods)
+            ]
+        }
+    
+    # Best action per horizon across all wait periods
+    best_wait = avg_wait_profit.argmax(axis=0)
+    best_actions = [
+        {
+            "horizon_years": horizon,
+            "action": "wait" if avg_wait_profit[best_wait[j], j] > avg_invest_now_profit[j] else "invest_now",
+            "best_wait_months": wait_periods[best_wait[j]],
+            "avg_invest_now_profit": round(float(avg_invest_now_profit[j]), 2),
+            "best_avg_wait_profit": round(float(avg_wait_profit[best_wait[j], j]), 2)
+        }
+        for j, horizon in enumerate(horizons)
+    ]
+    
+    return JSONResponse({
+        "investment_amount": request.investment_amount,
+        "duration_years": request.duration_years,
+        "market_regime": market_regime,
+        "market_regime_status": market_regime_status,
+        "scenarios": scenarios,
+        "grid": {
+            "wait_months": wait_periods,
+            "horizons": horizons,
+            "investment_mode": request.investment_mode,
+            "invested": np.round(grid["invested"], 2).tolist(),
+            "funds": fund_names,
+            "predicted_annual_returns": np.round(base_returns, 2).tolist(),
+            "invest_now_profit": invest_now_profit.tolist(),
+            "total_wait_profit": total_wait_profit.tolist(),
+            "avg_net_difference": np.round(avg_net_difference, 2).tolist(),
+            "recommendation": np.where(avg_net_difference > 0, "invest_now", "wait").tolist(),
+            "best_actions": best_actions
+        },
+        **({"monte_carlo": monte_carlo} if monte_carlo is not None else {}),
+        "summary": {
+            "best_scenario": max(scenarios, key=lambda x: x["aggregate"]["avg_invest_now_profit"] - x["aggregate"]["avg_wait_profit"]),
+            "worst_wait_period": min(scenarios, key=lambda x: x["aggregate"]["avg_wait_profit"]),
+            "general_recommendation": "invest_now" if all(s["aggregate"]["recommendation"] == "invest_now" for s in scenarios) else "wait"
+        }
+    })
 
 @app.post("/api/what-if-simulation")
 async def what_if_simulation(request: WhatIfSimulationRequest):
     """
-    Simulate "What If I Wait?" scenarios comparing investing now vs waiting 1, 3, or 6 months
+    Simulate "What If I Wait?" scenarios comparing investing now vs waiting
+    (1, 3 or 6 months by default, or any list of wait periods), over one or
+    more investment horizons
     """
     if funds_data is None or model_loader is None:
         raise HTTPException(status_code=500, detail="Data or models not loaded")
     
     try:
-        from datetime import datetime, timedelta
-        import yfinance as yf
-        
         # Get current market regime if not provided
         market_regime = request.market_regime
+        market_regime_status = {"source": "request"}
         if not market_regime:
             try:
-                # Fetch market condition to determine regime
-                ticker = "^NSEI"
-                end_date = datetime.now()
-                start_date = end_date - timedelta(days=90)
-                nifty = yf.download(ticker, start=start_date, end=end_date, interval="1d", progress=False)
-                
-                if not nifty.empty:
-                    # Calculate volatility (standard deviation of returns)
-                    returns = nifty['Close'].pct_change().dropna()
-                    volatility = float(returns.std() * 100) if len(returns) > 0 else 10.0
-                    
-                    # Get EMA-based regime
-                    nifty_4h = nifty['Close'].resample('4H').last().dropna()
-                    if len(nifty_4h) >= 21:
-                        ema_12 = nifty_4h.ewm(span=12, adjust=False).mean()
-                        ema_21 = nifty_4h.ewm(span=21, adjust=False).mean()
-                        ema_diff = ((ema_12.iloc[-1] - ema_21.iloc[-1]) / ema_21.iloc[-1]) * 100
-                        trend_strength = "strong" if abs(ema_diff) > 1.5 else ("moderate" if abs(ema_diff) > 0.5 else "weak")
-                        market_regime = classify_market_regime(float(ema_diff), trend_strength, volatility)
-                    else:
-                        market_regime = "sideways"
-                else:
-                    market_regime = "sideways"
-            except:
-                market_regime = "sideways"  # Default fallback
-        
-        # Find funds
-        selected_funds = []
-        for fund_name in request.fund_names:
-            fund = funds_data[funds_data['scheme_name'] == fund_name]
-            if not fund.empty:
-                selected_funds.append(fund.iloc[0].to_dict())
-        
-        if not selected_funds:
-            raise HTTPException(status_code=404, detail="No matching funds found")
-        
-        # Historical return adjustments based on market regime
-        # These are based on historical analysis of how different regimes affect returns
-        regime_adjustments = {
-            "bull": {
-                "1_month": 0.02,  # +2% for waiting in bull market (missed gains)
-                "3_month": 0.05,  # +5%
-                "6_month": 0.10   # +10%
-            },
-            "sideways": {
-                "1_month": 0.0,   # No significant impact
-                "3_month": -0.01,  # Slight negative
-                "6_month": -0.02   # Slight negative
-            },
-            "volatile": {
-                "1_month": -0.03,  # -3% (waiting might be better in volatile market)
-                "3_month": -0.05,  # -5%
-                "6_month": -0.08   # -8%
-            }
-        }
+                market_regime, info = await market_regime_service.simulation_regime()
+                market_regime_status = {"source": "stale" if info["stale"] else "live", **info}
+            except Exception as e:
+                # No snapshot and the upstream is failing: say so instead of pretending
+                market_regime = "sideways"
+                market_regime_status = {"source": "fallback", "error": str(e)}
         
-        # Simulate scenarios
-        scenarios = []
-        wait_periods = [1, 3, 6]  # months
+        # Find funds (first row per requested name, in request order)
+        positions = lookup_positions(funds_data, request.fund_names)
+        positions = positions[positions >= 0]
         
-        for wait_months in wait_periods:
-            scenario_results = []
-            
-            for fund in selected_funds:
-                # Get base predicted return using ML model
-                horizon = request.duration_years
-                try:
-                    base_return = model_loader.predict_fund_return(fund, horizon)
-                except:
-                    # Fallback to historical return
-                    base_return = fund.get(f'return_{horizon}yr', 10.0)
-                
-                # Apply market regime adjustment
-                regime_key = f"{wait_months}_month"
-                adjustment = regime_adjustments.get(market_regime, regime_adjustments["sideways"]).get(regime_key, 0.0)
-                
-                # Calculate returns for investing now vs waiting
-                # Investing now: full duration
-                invest_now_return = base_return / 100
-                invest_now_value = request.investment_amount * ((1 + invest_now_return) ** horizon)
-                invest_now_profit = invest_now_value - request.investment_amount
-                
-                # Waiting: reduced duration (horizon - wait_months/12)
-                effective_duration = max(0.5, horizon - (wait_months / 12))
-                wait_return = (base_return + (adjustment * 100)) / 100
-                wait_value = request.investment_amount * ((1 + wait_return) ** effective_duration)
-                wait_profit = wait_value - request.investment_amount
-                
-                # Opportunity cost: money sitting idle during wait period
-                # Assuming conservative 4% annual return (FD/savings account)
-                idle_return = 0.04 * (wait_months / 12)
-                idle_value = request.investment_amount * (1 + idle_return)
-                total_wait_value = wait_value + (idle_value - request.investment_amount)
-                total_wait_profit = total_wait_value - request.investment_amount
-                
-                scenario_results.append({
-                    "fund_name": fund['scheme_name'],
-                    "amc_name": fund['amc_name'],
-                    "invest_now": {
-                        "final_value": round(invest_now_value, 2),
-                        "profit": round(invest_now_profit, 2),
-                        "return_percentage": round(invest_now_return * 100, 2),
-                        "duration_years": horizon
-                    },
-                    "wait_and_invest": {
-                        "final_value": round(wait_value, 2),
-                        "profit": round(wait_profit, 2),
-                        "return_percentage": round(wait_return * 100, 2),
-                        "duration_years": round(effective_duration, 2),
-                        "idle_earnings": round(idle_value - request.investment_amount, 2)
-                    },
-                    "total_wait_scenario": {
-                        "final_value": round(total_wait_value, 2),
-                        "profit": round(total_wait_profit, 2),
-                        "net_difference": round(invest_now_profit - total_wait_profit, 2),
-                        "recommendation": "invest_now" if invest_now_profit > total_wait_profit else "wait"
-                    }
-                })
-            
-            # Aggregate results across all funds
-            avg_invest_now_profit = sum(r["invest_now"]["profit"] for r in scenario_results) / len(scenario_results)
-            avg_wait_profit = sum(r["total_wait_scenario"]["profit"] for r in scenario_results) / len(scenario_results)
-            
-            scenarios.append({
-                "wait_months": wait_months,
-                "market_regime": market_regime,
-                "fund_results": scenario_results,
-                "aggregate": {
-                    "avg_invest_now_profit": round(avg_invest_now_profit, 2),
-                    "avg_wait_profit": round(avg_wait_profit, 2),
-                    "net_difference": round(avg_invest_now_profit - avg_wait_profit, 2),
-                    "recommendation": "invest_now" if avg_invest_now_profit > avg_wait_profit else "wait",
-                    "recommendation_strength": "strong" if abs(avg_invest_now_profit - avg_wait_profit) > (request.investment_amount * 0.05) else "moderate"
-                }
-            })
+        if len(positions) == 0:
+            raise HTTPException(status_code=404, detail="No matching funds found")
         
-        return {
-            "investment_amount": request.investment_amount,
-            "duration_years": request.duration_years,
-            "market_regime": market_regime,
-            "scenarios": scenarios,
-            "summary": {
-                "best_scenario": max(scenarios, key=lambda x: x["aggregate"]["avg_invest_now_profit"] - x["aggregate"]["avg_wait_profit"]),
-                "worst_wait_period": min(scenarios, key=lambda x: x["aggregate"]["avg_wait_profit"]),
-                "general_recommendation": "invest_now" if all(s["aggregate"]["recommendation"] == "invest_now" for s in scenarios) else "wait"
-            }
-        }
+        selected_funds = funds_data.iloc[positions]
+        
+        wait_periods = DEFAULT_WAIT_MONTHS if request.wait_months is None else request.wait_months  # months
+        horizons = list(request.horizons or [])
+        if request.duration_years not in horizons:
+            horizons.insert(0, request.duration_years)
+        primary = horizons.index(request.duration_years)
+        
+        if not wait_periods:
+            raise HTTPException(status_code=400, detail="wait_months must not be empty")
+        if any(w < 0 or w > MAX_WAIT_MONTHS for w in wait_periods):
+            raise HTTPException(status_code=400, detail=f"wait_months must be between 0 and {MAX_WAIT_MONTHS}")
+        if any(h <= 0 or h > MAX_HORIZON_YEARS for h in horizons):
+            raise HTTPException(status_code=400, detail=f"horizons must be between 0 and {MAX_HORIZON_YEARS} years")
+        if len(wait_periods) * len(positions) * len(horizons) > MAX_WHAT_IF_GRID:
+            raise HTTPException(status_code=400, detail=f"Simulation grid too large (max {MAX_WHAT_IF_GRID} wait x fund x horizon cells)")
+        if len(wait_periods) * len(positions) > MAX_WHAT_IF_SCENARIOS:
+            raise HTTPException(status_code=400, detail=f"Scenario table too large (max {MAX_WHAT_IF_SCENARIOS} wait x fund results)")
+        if request.investment_mode not in INVESTMENT_MODES:
+            raise HTTPException(status_code=400, detail=f"investment_mode must be one of: {', '.join(INVESTMENT_MODES)}")
+        if request.investment_mode != "lumpsum":
+            projection_months = sum(max(h * 12, max(wait_periods) + 6) for h in horizons)
+            if len(wait_periods) * len(positions) * projection_months > MAX_SIP_PROJECTION_MONTHS:
+                raise HTTPException(status_code=400, detail="SIP simulation too large: reduce wait periods, funds or horizons")
+        if request.monte_carlo:
+            if request.investment_mode != "lumpsum":
+                raise HTTPException(status_code=400, detail="Monte Carlo mode supports lump sum investments only")
+            if not 1 <= request.num_paths <= MAX_MONTE_CARLO_PATHS:
+                raise HTTPException(status_code=400, detail=f"num_paths must be between 1 and {MAX_MONTE_CARLO_PATHS}")
+            if request.num_paths * len(positions) * (len(wait_periods) + 1) > MAX_MONTE_CARLO_DRAWS:
+                raise HTTPException(status_code=400, detail="Monte Carlo request too large: reduce num_paths, funds or wait periods")
+        
+        # Everything past validation (grid, scenario table, JSON encoding) runs off the event loop
+        return await run_in_threadpool(
+            build_what_if_response, request, selected_funds, wait_periods, horizons, primary,
+            market_regime, market_regime_status
+        )
         
     except HTTPException:
         raise
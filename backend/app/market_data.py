@@ -0,0 +1,246 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# On-disk record layout: one structured .npy per ticker and interval, memory-mapped on read
+BAR_DTYPE = np.dtype([('ts', '<i8')] + [(col.lower(), '<f8') for col in BAR_COLUMNS])
+
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'market_cache')
+
+# Bars older than this are dropped from the store when it is rewritten
+MARKET_DATA_RETENTION_DAYS = int(os.getenv("MARKET_DATA_RETENTION_DAYS", 3650))
+
+
+def _safe_name(ticker):
+    name = ''.join(ch if ch.isalnum() or ch in '-_.' else '_' for ch in ticker)
+    # A leading dot would make "." / ".." (or a hidden file) out of the ticker
+    return '_' + name[1:] if name.startswith('.') else name
+
+
+def _normalize_bars(data):
+    """OHLCV frame with a sorted, de-duplicated, timezone-aware DatetimeIndex"""
+    if data is None or data.empty:
+        return pd.DataFrame(columns=BAR_COLUMNS, index=pd.DatetimeIndex([], tz='UTC'))
+
+    if isinstance(data.columns, pd.MultiIndex):
+        # yfinance returns (price, ticker) columns even for a single ticker
+        data = data.droplevel(-1, axis=1)
+
+    data = data.reindex(columns=BAR_COLUMNS)
+    index = pd.DatetimeIndex(data.index)
+    if index.tz is None:
+        index = index.tz_localize('UTC')
+    data.index = index
+    data = data[~data.index.duplicated(keep='last')].sort_index()
+    return data.astype(np.float64)
+
+
+class MarketDataProvider:
+    """Source of OHLCV bars; implementations return bars in [start, end)"""
+
+    name = "base"
+
+    def fetch_bars(self, ticker, interval, start, end):
+        raise NotImplementedError
+
+
+class YFinanceProvider(MarketDataProvider):
+    """Bars downloaded from Yahoo Finance"""
+
+    name = "yfinance"
+
+    def fetch_bars(self, ticker, interval, start, end):
+        import yfinance as yf
+
+        data = yf.download(ticker, start=start, end=end, interval=interval, progress=False)
+        return _normalize_bars(data)
+
+
+class FileFixtureProvider(MarketDataProvider):
+    """
+    Bars read from CSV fixtures, for tests and offline deployments.
+
+    Expects <fixture_dir>/<ticker>_<interval>.csv (ticker with non-alphanumeric
+    characters replaced by '_') with a timestamp first column and
+    Open/High/Low/Close/Volume columns.
+    """
+
+    name = "file"
+
+    def __init__(self, fixture_dir):
+        self.fixture_dir = fixture_dir
+        self._cache = {}
+
+    def fixture_path(self, ticker, interval):
+        return os.path.join(self.fixture_dir, f"{_safe_name(ticker)}_{interval}.csv")
+
+    def fetch_bars(self, ticker, interval, start, end):
+        key = (ticker, interval)
+        if key not in self._cache:
+            path = self.fixture_path(ticker, interval)
+            if not os.path.exists(path):
+                return _normalize_bars(None)
+            self._cache[key] = _normalize_bars(pd.read_csv(path, index_col=0, parse_dates=True))
+
+        bars = self._cache[key]
+        start = pd.Timestamp(start)
+        end = pd.Timestamp(end)
+        if start.tzinfo is None:
+            start = start.tz_localize(bars.index.tz)
+        if end.tzinfo is None:
+            end = end.tz_localize(bars.index.tz)
+        return bars[(bars.index >= start) & (bars.index < end)]
+
+
+def create_provider():
+    """Provider selected by MARKET_DATA_PROVIDER ('yfinance' or 'file')"""
+    provider = os.getenv("MARKET_DATA_PROVIDER", "yfinance").lower()
+    if provider == "file":
+        fixture_dir = os.getenv("MARKET_DATA_FIXTURE_DIR")
+        if not fixture_dir:
+            raise ValueError("MARKET_DATA_FIXTURE_DIR must be set when MARKET_DATA_PROVIDER=file")
+        return FileFixtureProvider(fixture_dir)
+    if provider == "yfinance":
+        return YFinanceProvider()
+    raise ValueError(f"Unknown market data provider: {provider}")
+
+
+class BarStore:
+    """
+    Local on-disk bar store with incremental (delta) fetching.
+
+    Each ticker/interval is one memory-mapped structured array plus a small
+    metadata file. get_bars only asks the provider for bars newer than the
+    last stored timestamp (re-fetching the last, possibly still forming, bar)
+    and merges them in.
+    """
+
+    def __init__(self, provider=None, root_dir=None, retention_days=MARKET_DATA_RETENTION_DAYS):
+        self.provider = provider or create_provider()
+        self.root_dir = root_dir or os.getenv("MARKET_DATA_DIR", DEFAULT_STORE_DIR)
+        self.retention = timedelta(days=retention_days)
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def _lock(self, ticker, interval):
+        with self._locks_guard:
+            return self._locks.setdefault((ticker, interval), threading.Lock())
+
+    def _paths(self, ticker, interval):
+        base = os.path.join(self.root_dir, _safe_name(ticker))
+        return (os.path.join(base, f"{interval}.npy"),
+                os.path.join(base, f"{interval}.json"))
+
+    def state_path(self, ticker, name):
+        """Path for derived state (e.g. indicator checkpoints) stored alongside a ticker's bars"""
+        return os.path.join(self.root_dir, _safe_name(ticker), name)
+
+    def _load_meta(self, ticker, interval):
+        _, meta_path = self._paths(ticker, interval)
+        if not os.path.exists(meta_path):
+            return {}
+        with open(meta_path) as f:
+            return json.load(f)
+
+    def load(self, ticker, interval):
+        """Stored bars as a DataFrame (backed by a read-only memory map)"""
+        bars_path, _ = self._paths(ticker, interval)
+        if not os.path.exists(bars_path):
+            return _normalize_bars(None)
+
+        records = np.load(bars_path, mmap_mode='r')
+        tz = self._load_meta(ticker, interval).get('tz', 'UTC')
+
+        index = pd.DatetimeIndex(pd.to_datetime(np.asarray(records['ts']), utc=True)).tz_convert(tz)
+        return pd.DataFrame({col: records[col.lower()] for col in BAR_COLUMNS}, index=index)
+
+    def _save(self, ticker, interval, bars, coverage_start):
+        bars_path, meta_path = self._paths(ticker, interval)
+        os.makedirs(os.path.dirname(bars_path), exist_ok=True)
+
+        records = np.empty(len(bars), dtype=BAR_DTYPE)
+        records['ts'] = bars.index.tz_convert('UTC').asi8
+        for col in BAR_COLUMNS:
+            records[col.lower()] = bars[col].to_numpy(dtype=np.float64)
+
+        # Write-then-rename so concurrent readers never see a partial file
+        tmp_path = f"{bars_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.save(f, records)
+        os.replace(tmp_path, bars_path)
+
+        tmp_meta_path = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_meta_path, 'w') as f:
+            json.dump({
+                'ticker': ticker,
+                'interval': interval,
+                'tz': str(bars.index.tz),
+                'provider': self.provider.name,
+                'bars': len(bars),
+                'coverage_start': coverage_start.isoformat(),
+                'updated_at': datetime.now().isoformat()
+            }, f)
+        os.replace(tmp_meta_path, meta_path)
+
+    def get_bars(self, ticker, interval, lookback):
+        """
+        Bars for the last `lookback` (a timedelta), fetching only what is
+        missing since the last stored bar.
+        """
+        now = pd.Timestamp.now(tz='UTC')
+        window_start = now - lookback
+
+        with self._lock(ticker, interval):
+            stored = self.load(ticker, interval)
+            coverage_start = self._load_meta(ticker, interval).get('coverage_start')
+            coverage_start = pd.Timestamp(coverage_start) if coverage_start else None
+
+            if stored.empty or coverage_start is None or coverage_start > window_start:
+                # Nothing stored, or the store does not reach back far enough: full window
+                fetch_start = window_start
+                coverage_start = window_start
+            else:
+                # Delta fetch from the last stored bar, which may still have been forming
+                fetch_start = stored.index[-1]
+
+            fresh = self.provider.fetch_bars(ticker, interval, fetch_start.to_pydatetime(), now.to_pydatetime())
+
+            if not fresh.empty:
+                if stored.empty:
+                    merged = fresh
+                else:
+                    fresh = fresh.tz_convert(stored.index.tz)
+                    merged = pd.concat([stored, fresh])
+                    merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+
+                cutoff = merged.index[-1] - self.retention
+                merged = merged[merged.index >= cutoff]
+                coverage_start = max(coverage_start, cutoff)
+
+                try:
+                    self._save(ticker, interval, merged, coverage_start)
+                except OSError as e:
+                    # Read-only filesystems (e.g. serverless) still get the merged bars
+                    print(f"❌ Could not persist {ticker} {interval} bars: {e}")
+                stored = merged
+
+        return stored[stored.index >= window_start]
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_bar_store():
+    """Process-wide bar store configured from the environment"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = BarStore()
+        return _default_store
@@ -0,0 +1,512 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .market_data import get_bar_store
+from .regime_indicator import StreamingEMAIndicator, get_indicator
+
+NIFTY_TICKER = "^NSEI"  # Yahoo Finance ticker for Nifty 50
+
+# How often the background scheduler recomputes the market condition snapshot
+MARKET_CONDITION_REFRESH_SECONDS = float(os.getenv("MARKET_CONDITION_REFRESH_SECONDS", 900))
+
+# Snapshots older than this are served flagged as stale while a refresh runs
+MARKET_CONDITION_MAX_AGE_SECONDS = float(os.getenv("MARKET_CONDITION_MAX_AGE_SECONDS", MARKET_CONDITION_REFRESH_SECONDS or 900))
+
+# Hard upper bound on a single upstream market data fetch
+MARKET_DATA_TIMEOUT_SECONDS = float(os.getenv("MARKET_DATA_TIMEOUT_SECONDS", 15))
+
+# Consecutive failures that open the circuit, and how long it stays open
+MARKET_DATA_CIRCUIT_FAILURES = int(os.getenv("MARKET_DATA_CIRCUIT_FAILURES", 3))
+MARKET_DATA_CIRCUIT_COOLDOWN_SECONDS = float(os.getenv("MARKET_DATA_CIRCUIT_COOLDOWN_SECONDS", 60))
+
+
+# Serializes updates of the shared streaming EMA state
+_indicator_lock = threading.Lock()
+
+
+class MarketDataError(Exception):
+    """Raised when market data cannot be fetched or is insufficient for the indicators"""
+
+
+class MarketDataUnavailableError(MarketDataError):
+    """Raised when the upstream timed out or its circuit breaker is open"""
+
+
+def analyze_market_condition(closes_4h, ticker=NIFTY_TICKER):
+    """
+    Calculate EMA 12/21 on a 4H close series and suggest a market condition
+    based on the crossover.
+    """
+    indicator = StreamingEMAIndicator()
+    indicator.update(closes_4h)
+    return evaluate_market_condition(indicator, ticker)
+
+
+def evaluate_market_condition(indicator, ticker=NIFTY_TICKER):
+    """Suggest a market condition from the EMA 12/21 state of a StreamingEMAIndicator"""
+    state = indicator.snapshot()
+    if state is None or state['data_points'] < 21:
+        raise MarketDataError("Insufficient data for EMA calculation")
+
+    ema_12 = state['ema_fast']
+    ema_21 = state['ema_slow']
+
+    # Get latest values
+    latest_price = state['latest_price']
+    latest_ema_12 = float(ema_12[-1])
+    latest_ema_21 = float(ema_21[-1])
+
+    # Previous values to detect crossover
+    prev_ema_12 = float(ema_12[-2]) if len(ema_12) > 1 else latest_ema_12
+    prev_ema_21 = float(ema_21[-2]) if len(ema_21) > 1 else latest_ema_21
+
+    # Determine market condition
+    # Bullish: EMA 12 > EMA 21 (good to invest)
+    # Bearish: EMA 12 < EMA 21 (not good to invest)
+    is_bullish = latest_ema_12 > latest_ema_21
+    was_bullish = prev_ema_12 > prev_ema_21
+
+    # Detect crossover
+    crossover = None
+    if is_bullish != was_bullish:
+        if is_bullish:
+            crossover = "bullish"  # Golden cross (EMA 12 crossed above EMA 21)
+        else:
+            crossover = "bearish"  # Death cross (EMA 12 crossed below EMA 21)
+
+    # Calculate percentage difference
+    ema_diff_percent = ((latest_ema_12 - latest_ema_21) / latest_ema_21) * 100
+
+    # Market condition recommendation
+    if is_bullish:
+        condition = "bullish"
+        recommendation = "favorable"
+        message = "Market conditions are favorable for investment. EMA 12 is above EMA 21, indicating upward momentum."
+    else:
+        condition = "bearish"
+        recommendation = "caution"
+        message = "Market conditions suggest caution. EMA 12 is below EMA 21, indicating potential downward pressure."
+
+    # Calculate trend strength (distance between EMAs)
+    trend_strength = abs(ema_diff_percent)
+    if trend_strength < 0.5:
+        strength = "weak"
+    elif trend_strength < 1.5:
+        strength = "moderate"
+    else:
+        strength = "strong"
+
+    # Calculate estimated time for market improvement (if currently bearish)
+    estimated_improvement_time = None
+    estimated_improvement_date = None
+    improvement_confidence = None
+
+    if not is_bullish:
+        # Calculate rate of change for EMA 12 and EMA 21 over last 10 periods
+        lookback_periods = min(10, state['data_points'] - 1)
+        if lookback_periods > 0:
+            # Get recent EMA values
+            recent_ema_12 = ema_12[-lookback_periods:]
+            recent_ema_21 = ema_21[-lookback_periods:]
+
+            # Calculate average rate of change per 4H period
+            ema_12_changes = np.diff(recent_ema_12)
+            ema_21_changes = np.diff(recent_ema_21)
+
+            avg_ema_12_change = np.mean(ema_12_changes) if len(ema_12_changes) > 0 else 0
+            avg_ema_21_change = np.mean(ema_21_changes) if len(ema_21_changes) > 0 else 0
+
+            # Net convergence rate (how fast EMA 12 is catching up to EMA 21)
+            convergence_rate = avg_ema_12_change - avg_ema_21_change
+
+            # Current gap
+            current_gap = latest_ema_21 - latest_ema_12
+
+            # Estimate periods needed for crossover (if convergence is positive)
+            if convergence_rate > 0 and current_gap > 0:
+                periods_to_crossover = current_gap / convergence_rate
+                # Convert 4H periods to hours, then to days
+                hours_to_improvement = periods_to_crossover * 4
+                days_to_improvement = hours_to_improvement / 24
+
+                # Cap at reasonable maximum (e.g., 90 days)
+                if days_to_improvement > 0 and days_to_improvement <= 90:
+                    estimated_improvement_time = {
+                        "days": int(days_to_improvement),
+                        "hours": int(hours_to_improvement % 24),
+                        "total_hours": int(hours_to_improvement)
+                    }
+
+                    # Calculate estimated date
+                    estimated_date = datetime.now() + timedelta(hours=hours_to_improvement)
+                    estimated_improvement_date = estimated_date.isoformat()
+
+                    # Calculate confidence based on trend consistency
+                    ema_12_std = np.std(ema_12_changes) if len(ema_12_changes) > 0 else 1
+                    ema_21_std = np.std(ema_21_changes) if len(ema_21_changes) > 0 else 1
+
+                    # Lower volatility = higher confidence
+                    volatility_score = (ema_12_std + ema_21_std) / 2
+                    if volatility_score < abs(convergence_rate) * 0.3:
+                        improvement_confidence = "high"
+                    elif volatility_score < abs(convergence_rate) * 0.6:
+                        improvement_confidence = "medium"
+                    else:
+                        improvement_confidence = "low"
+                else:
+                    # If estimate is too far out or negative, provide general guidance
+                    estimated_improvement_time = {
+                        "days": None,
+                        "hours": None,
+                        "total_hours": None,
+                        "message": "Market recovery timeline uncertain. Monitor EMA convergence trends."
+                    }
+                    improvement_confidence = "low"
+            else:
+                # Diverging trend - market getting worse
+                estimated_improvement_time = {
+                    "days": None,
+                    "hours": None,
+                    "total_hours": None,
+                    "message": "EMAs are diverging. Wait for trend reversal signals before investing."
+                }
+                improvement_confidence = "low"
+
+    response = {
+        "ticker": ticker,
+        "current_price": latest_price,
+        "ema_12": latest_ema_12,
+        "ema_21": latest_ema_21,
+        "ema_diff_percent": round(ema_diff_percent, 2),
+        "condition": condition,
+        "recommendation": recommendation,
+        "message": message,
+        "crossover": crossover,
+        "trend_strength": strength,
+        "last_updated": datetime.now().isoformat(),
+        "timeframe": "4H",
+        "data_points": state['data_points'],
+        "period": "1 year"
+    }
+
+    # Add improvement estimates if available
+    if estimated_improvement_time:
+        response["estimated_improvement_time"] = estimated_improvement_time
+    if estimated_improvement_date:
+        response["estimated_improvement_date"] = estimated_improvement_date
+    if improvement_confidence:
+        response["improvement_confidence"] = improvement_confidence
+
+    return response
+
+
+def fetch_market_condition(ticker=NIFTY_TICKER, store=None):
+    """
+    Analyze the 4H EMA crossover from the incrementally maintained indicator.
+
+    The first run (without a checkpoint) replays a year of hourly bars; after
+    that only the bars since the start of the last, provisional, 4H bar are
+    read, resampled and folded in, and the state is checkpointed next to the
+    bar store.
+    """
+    store = store or get_bar_store()
+    checkpoint_path = store.state_path(ticker, "ema_4h.json")
+    indicator = get_indicator((ticker, "4h"), checkpoint_path)
+
+    # Network I/O happens outside the lock; bars older than the provisional
+    # bar are skipped by update(), so a concurrent update in between is harmless
+    lookback = timedelta(days=365)  # Past 1 year
+    provisional_start = indicator.provisional_start
+    if provisional_start is not None:
+        since_provisional = pd.Timestamp.now(tz='UTC') - provisional_start
+        if since_provisional < lookback:
+            # Small margin so the provisional bar's first hourly bar is included
+            lookback = since_provisional + timedelta(minutes=1)
+
+    # Only bars newer than the local store's last timestamp are downloaded
+    data = store.get_bars(ticker, "1h", lookback)
+
+    with _indicator_lock:
+        if data.empty and indicator.provisional_close is None:
+            raise MarketDataError("Failed to fetch Nifty 50 data")
+
+        # Resample to 4H timeframe
+        closes_4h = data['Close'].resample('4H').last().dropna()
+        indicator.update(closes_4h)
+
+        try:
+            indicator.save(checkpoint_path)
+        except OSError as e:
+            print(f"❌ Could not checkpoint EMA state: {e}")
+
+        return evaluate_market_condition(indicator, ticker)
+
+
+def classify_market_regime(ema_diff_percent: float, trend_strength: str, volatility: float = None) -> str:
+    """
+    Classify market regime based on EMA analysis and volatility
+    Returns: "bull", "sideways", or "volatile"
+    """
+    # Strong bullish trend
+    if ema_diff_percent > 1.0 and trend_strength in ["strong", "moderate"]:
+        return "bull"
+
+    # Strong bearish trend or high volatility
+    if ema_diff_percent < -1.0 or (volatility and volatility > 15):
+        return "volatile"
+
+    # Sideways market (weak trend, small EMA difference)
+    return "sideways"
+
+
+def fetch_simulation_regime(ticker=NIFTY_TICKER, store=None):
+    """Classify the market regime for the what-if simulation from 90 days of daily bars"""
+    store = store or get_bar_store()
+    data = store.get_bars(ticker, "1d", timedelta(days=90))
+
+    if data.empty:
+        raise MarketDataError("Failed to fetch Nifty 50 data")
+
+    # Calculate volatility (standard deviation of returns)
+    returns = data['Close'].pct_change().dropna()
+    volatility = float(returns.std() * 100) if len(returns) > 0 else 10.0
+
+    # Get EMA-based regime
+    closes = data['Close'].resample('4H').last().dropna()
+    if len(closes) < 21:
+        raise MarketDataError("Insufficient data for EMA calculation")
+
+    ema_12 = closes.ewm(span=12, adjust=False).mean()
+    ema_21 = closes.ewm(span=21, adjust=False).mean()
+    ema_diff = ((ema_12.iloc[-1] - ema_21.iloc[-1]) / ema_21.iloc[-1]) * 100
+    trend_strength = "strong" if abs(ema_diff) > 1.5 else ("moderate" if abs(ema_diff) > 0.5 else "weak")
+    return classify_market_regime(float(ema_diff), trend_strength, volatility)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for an upstream data source.
+
+    After `failure_threshold` failures in a row the circuit opens and callers
+    are refused for `cooldown` seconds; the first call after that is let
+    through as a trial (half-open) and closes the circuit again on success.
+    """
+
+    def __init__(self, failure_threshold=MARKET_DATA_CIRCUIT_FAILURES, cooldown=MARKET_DATA_CIRCUIT_COOLDOWN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.time() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def retry_after(self):
+        if self.opened_at is None:
+            return 0.0
+        return max(0.0, self.cooldown - (time.time() - self.opened_at))
+
+    def allow(self):
+        return self.state != "open"
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.time()
+
+
+class _SourceState:
+    def __init__(self, fetch, breaker):
+        self.fetch = fetch
+        self.breaker = breaker
+        self.value = None
+        self.computed_at = None
+        self.last_error = None
+        self.inflight = None
+        # The executor call of the current fetch; outlives a timed-out fetch until its thread returns
+        self.worker = None
+
+
+class MarketRegimeService:
+    """
+    Shared, fault-tolerant access to the market data derived snapshots.
+
+    Each source (the 4H market condition and the what-if simulation regime)
+    is fetched through the same path:
+
+    - single-flight: concurrent callers (and the background scheduler) join
+      the one in-flight fetch instead of starting their own
+    - timeout-bounded: a fetch that takes longer than `timeout` seconds fails
+      the waiting callers; fetches run on a small dedicated thread pool and a
+      fetch started while the thread of a timed-out one is still running
+      waits on that thread instead of submitting another, so a hung upstream
+      can never occupy more than one thread per source
+    - circuit breaker: after repeated failures the upstream is not called
+      until the cooldown has passed
+    - stale-while-revalidate: once a snapshot exists it is always served
+      immediately, flagged `stale` when older than `max_age`, while a
+      refresh runs in the background
+    """
+
+    def __init__(self, sources=None, refresh_interval=MARKET_CONDITION_REFRESH_SECONDS,
+                 max_age=MARKET_CONDITION_MAX_AGE_SECONDS, timeout=MARKET_DATA_TIMEOUT_SECONDS,
+                 failure_threshold=MARKET_DATA_CIRCUIT_FAILURES, cooldown=MARKET_DATA_CIRCUIT_COOLDOWN_SECONDS):
+        sources = sources or {
+            "condition": fetch_market_condition,
+            "simulation": fetch_simulation_regime
+        }
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.timeout = timeout
+        self._sources = {
+            name: _SourceState(fetch, CircuitBreaker(failure_threshold, cooldown))
+            for name, fetch in sources.items()
+        }
+        self._executor = ThreadPoolExecutor(max_workers=len(self._sources), thread_name_prefix="market-data")
+        self._task = None
+        self._listeners = []
+
+    def add_listener(self, listener):
+        """Call listener(name, value) on the event loop after every successful fetch of a source"""
+        self._listeners.append(listener)
+
+    async def _run(self, name):
+        source = self._sources[name]
+        if source.worker is None:
+            source.worker = asyncio.get_running_loop().run_in_executor(self._executor, source.fetch)
+            source.worker.add_done_callback(lambda future: self._worker_done(source, future))
+        try:
+            # shield: a timeout stops the wait, not the thread, which stays this source's worker
+            value = await asyncio.wait_for(asyncio.shield(source.worker), self.timeout)
+        except asyncio.TimeoutError:
+            source.breaker.record_failure()
+            source.last_error = f"Market data fetch timed out after {self.timeout:g}s"
+            raise MarketDataUnavailableError(source.last_error)
+        except Exception as e:
+            source.breaker.record_failure()
+            source.last_error = str(e)
+            raise
+        else:
+            source.breaker.record_success()
+            source.value = value
+            source.computed_at = time.time()
+            source.last_error = None
+            for listener in self._listeners:
+                try:
+                    listener(name, value)
+                except Exception as e:
+                    print(f"❌ Market data listener failed ({name}): {e}")
+            return value
+        finally:
+            source.inflight = None
+
+    @staticmethod
+    def _worker_done(source, future):
+        source.worker = None
+        # Retrieve the outcome of a fetch nobody is waiting on any more
+        future.cancelled() or future.exception()
+
+    def _start_fetch(self, name):
+        """Return the in-flight fetch for a source, starting one if none is running"""
+        source = self._sources[name]
+        if source.inflight is None:
+            source.inflight = asyncio.get_running_loop().create_task(self._run(name))
+            # Background revalidations may finish with nobody awaiting them
+            source.inflight.add_done_callback(lambda task: task.cancelled() or task.exception())
+        return source.inflight
+
+    async def refresh(self, name):
+        """Fetch a source now (joining any in-flight fetch) and return its value"""
+        source = self._sources[name]
+        if source.inflight is None and not source.breaker.allow():
+            raise MarketDataUnavailableError(
+                f"Market data source unavailable after repeated failures ({source.last_error}); "
+                f"retrying in {source.breaker.retry_after():.0f}s"
+            )
+        # shield: a caller that goes away must not cancel the fetch other callers share
+        return await asyncio.shield(self._start_fetch(name))
+
+    async def get(self, name):
+        """
+        Return (value, info) for a source. Callers only wait on the upstream
+        when no snapshot exists yet; otherwise the current snapshot is
+        returned and, if it is stale, revalidated in the background.
+        """
+        source = self._sources[name]
+        if source.value is None:
+            await self.refresh(name)
+
+        age = time.time() - source.computed_at
+        stale = age > self.max_age
+        if stale and source.inflight is None and source.breaker.allow():
+            self._start_fetch(name)
+
+        info = {
+            "snapshot_age_seconds": round(age, 1),
+            "stale": stale,
+            "circuit_state": source.breaker.state
+        }
+        if source.last_error:
+            info["last_error"] = source.last_error
+        return source.value, info
+
+    async def market_condition(self):
+        """The market condition snapshot merged with its freshness metadata"""
+        value, info = await self.get("condition")
+        return {
+            **value,
+            **info,
+            "refresh_interval_seconds": self.refresh_interval
+        }
+
+    async def simulation_regime(self):
+        """The what-if regime ("bull", "sideways" or "volatile") and its freshness metadata"""
+        return await self.get("simulation")
+
+    def snapshots(self):
+        """The last fetched value of each source (None before its first fetch)"""
+        return {name: source.value for name, source in self._sources.items()}
+
+    async def _refresh_loop(self):
+        while True:
+            for name, source in self._sources.items():
+                if not source.breaker.allow():
+                    continue
+                try:
+                    await self.refresh(name)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Keep serving the previous snapshot; the next tick retries
+                    print(f"❌ Market data refresh failed ({name}): {e}")
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        """Start the background refresh scheduler (no-op when the interval is 0)"""
+        if self.refresh_interval > 0 and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,211 @@
+"""
+Server-sent events for market condition and regime updates.
+
+MarketEventStream listens to the MarketRegimeService: every successful fetch
+of a source (by the background scheduler, or by a request joining it) is
+reduced to the part of its state a viewer cares about, and an event is
+published only when that changes:
+
+- market-condition: a new 4H bar (data_points), condition, crossover or
+  trend strength of the Nifty 50 EMA 12/21 state
+- index-regimes: the same for any tracked index, or its regime
+- simulation-regime: the what-if regime ("bull", "sideways", "volatile")
+
+One computation is fanned out to every connected client through a bounded
+queue per client, so load scales with market updates rather than viewers.
+Events carry ids ("<process>:<sequence>") and the last HISTORY_SIZE are
+kept: a client reconnecting with Last-Event-ID is replayed what it missed,
+or, when that is no longer possible (restart, another worker, too far
+behind), sent the current state. Idle connections get a heartbeat comment
+every MARKET_STREAM_HEARTBEAT_SECONDS. A client too slow to keep up is
+disconnected and resumes on reconnect.
+"""
+
+import asyncio
+import json
+import os
+import time
+from collections import deque
+
+from .instrumentation import format_labels
+
+# Interval of heartbeat comments on idle streams (keeps proxies from closing them)
+MARKET_STREAM_HEARTBEAT_SECONDS = float(os.getenv("MARKET_STREAM_HEARTBEAT_SECONDS", 15))
+
+# Concurrent stream connections per process; more are refused with 503
+MARKET_STREAM_MAX_CLIENTS = int(os.getenv("MARKET_STREAM_MAX_CLIENTS", 1000))
+
+HISTORY_SIZE = 100
+CLIENT_QUEUE_SIZE = 32
+RECONNECT_MS = 5000
+
+
+def _condition_key(value):
+    return (value["data_points"], value["condition"], value["crossover"], value["trend_strength"])
+
+
+def _index_regimes_key(value):
+    return tuple(
+        (name, regime["data_points"], regime["condition"], regime["crossover"], regime["market_regime"])
+        for name, regime in sorted(value["indices"].items())
+    )
+
+
+def _simulation_key(value):
+    return value
+
+
+# Service source -> (event type, function of a fetched value deciding whether it is news)
+STREAM_SOURCES = {
+    "condition": ("market-condition", _condition_key),
+    "indices": ("index-regimes", _index_regimes_key),
+    "simulation": ("simulation-regime", _simulation_key)
+}
+
+
+class MarketStreamFullError(Exception):
+    """Raised when a process already serves MARKET_STREAM_MAX_CLIENTS streams"""
+
+
+class _Subscriber:
+    __slots__ = ("queue", "sources", "dropped")
+
+    def __init__(self, sources):
+        self.queue = asyncio.Queue(maxsize=CLIENT_QUEUE_SIZE)
+        self.sources = sources
+        self.dropped = False
+
+
+class MarketEventStream:
+    """Publishes changed market snapshots as SSE events to every subscriber"""
+
+    def __init__(self, service, sources=STREAM_SOURCES, heartbeat=MARKET_STREAM_HEARTBEAT_SECONDS,
+                 max_clients=MARKET_STREAM_MAX_CLIENTS):
+        self.service = service
+        self.sources = {name: source for name, source in sources.items() if name in service.snapshots()}
+        self.heartbeat = heartbeat
+        self.max_clients = max_clients
+        # Event ids restart with the process; a different prefix means "cannot resume"
+        self.process_id = format(int(time.time() * 1000), "x")
+        self._sequence = 0
+        self._history = deque(maxlen=HISTORY_SIZE)  # (sequence, source, message)
+        self._latest = {}  # source -> (sequence, source, message)
+        self._keys = {}
+        self._subscribers = set()
+        self.published = 0
+        self._published_by_source = {}
+        service.add_listener(self._on_update)
+
+    def _on_update(self, name, value):
+        if name not in self.sources:
+            return
+        event_type, key_of = self.sources[name]
+        key = key_of(value)
+        if name in self._keys and self._keys[name] == key:
+            return
+        self._keys[name] = key
+        self._publish(name, event_type, value)
+
+    def _publish(self, name, event_type, value):
+        self._sequence += 1
+        self.published += 1
+        self._published_by_source[name] = self._published_by_source.get(name, 0) + 1
+        message = (f"id: {self.process_id}:{self._sequence}\n"
+                   f"event: {event_type}\n"
+                   f"data: {json.dumps(value, default=str)}\n\n")
+        event = (self._sequence, name, message)
+        self._history.append(event)
+        self._latest[name] = event
+        for subscriber in list(self._subscribers):
+            if name not in subscriber.sources:
+                continue
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # Too slow to keep up: end its stream, it resumes from its last id on reconnect
+                subscriber.dropped = True
+                self._subscribers.discard(subscriber)
+
+    def _replay(self, last_event_id, sources):
+        """Events after last_event_id, or None when they cannot all be replayed"""
+        process_id, _, sequence = (last_event_id or "").partition(":")
+        if process_id != self.process_id or not sequence.isdigit():
+            return None
+        sequence = int(sequence)
+        if sequence > self._sequence or (self._history and sequence < self._history[0][0] - 1):
+            return None
+        return [event for event in self._history if event[0] > sequence and event[1] in sources]
+
+    async def _current(self, sources):
+        """The latest event of each source, fetching sources that have no snapshot yet"""
+        events, errors = [], []
+        for name in sources:
+            if name not in self._latest:
+                try:
+                    await self.service.get(name)
+                except Exception as e:
+                    errors.append(f"event: unavailable\ndata: {json.dumps({'source': name, 'detail': str(e)})}\n\n")
+                    continue
+            if name in self._latest:
+                events.append(self._latest[name])
+        return sorted(events), errors
+
+    def subscribe(self, sources=None):
+        """Register a client (before it is sent anything, so no event is missed)"""
+        if len(self._subscribers) >= self.max_clients:
+            raise MarketStreamFullError(f"Too many market stream clients ({self.max_clients})")
+        subscriber = _Subscriber(set(sources or self.sources))
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    async def events(self, subscriber, last_event_id=None):
+        """SSE messages for one subscriber: catch-up first, then live events and heartbeats"""
+        try:
+            yield f"retry: {RECONNECT_MS}\n\n"
+            backlog = self._replay(last_event_id, subscriber.sources)
+            if backlog is None:
+                backlog, errors = await self._current(subscriber.sources)
+                for message in errors:
+                    yield message
+            last_sent = 0
+            for sequence, _, message in backlog:
+                yield message
+                last_sent = sequence
+
+            while True:
+                try:
+                    sequence, _, message = await asyncio.wait_for(subscriber.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    if subscriber.dropped:
+                        return
+                    yield ": heartbeat\n\n"
+                    continue
+                # Queued while the backlog was being sent
+                if sequence <= last_sent:
+                    continue
+                yield message
+                last_sent = sequence
+                if subscriber.dropped and subscriber.queue.empty():
+                    return
+        finally:
+            self._subscribers.discard(subscriber)
+
+    def stats(self):
+        return {
+            "clients": len(self._subscribers),
+            "max_clients": self.max_clients,
+            "published_events": self.published,
+            "last_event_id": f"{self.process_id}:{self._sequence}" if self._sequence else None
+        }
+
+    def metric_lines(self):
+        """Prometheus exposition lines for the /metrics collector"""
+        return [
+            "# HELP market_stream_clients Connected market event stream clients.",
+            "# TYPE market_stream_clients gauge",
+            f"market_stream_clients {len(self._subscribers)}",
+            "# HELP market_stream_events_total Market events published, by source.",
+            "# TYPE market_stream_events_total counter",
+            *(f"market_stream_events_total{{{format_labels(source=name)}}} {self._published_by_source.get(name, 0)}"
+              for name in sorted(self.sources))
+        ]
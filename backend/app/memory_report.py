@@ -0,0 +1,394 @@
+"""
+Memory accounting for the loaded datasets, models, caches and indexes.
+
+    python -m app.memory_report                  # footprint of everything loaded
+    python -m app.memory_report --trace POST /api/recommend '{"amount": 10000, "tenure": 3}'
+    python -m app.memory_report --benchmark      # peak traced memory per endpoint
+    python -m app.memory_report --json           # machine-readable report
+
+The same data is served by GET /api/admin/memory (with ?benchmark=true for
+the per-endpoint peaks), and POST /api/admin/memory/trace runs one request
+in-process under tracemalloc.
+
+Byte counts are deep sizes: NumPy arrays by nbytes, DataFrames and Series
+by memory_usage(deep=True), other objects recursively. An object reachable
+from several entries is counted in each entry but once in the totals. Bytes
+backed by the memory-mapped snapshot bundle are also reported as mapped:
+they are file-backed pages shared by every process on the host.
+"""
+
+import argparse
+import asyncio
+import json
+import mmap
+import os
+import sys
+import tracemalloc
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SMAPS_FIELDS = ["Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty"]
+
+MB = 1024 * 1024
+
+
+def read_smaps_rollup(pid="self"):
+    """Memory totals (kB) of a process from /proc/<pid>/smaps_rollup"""
+    totals = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].rstrip(":") in SMAPS_FIELDS:
+                totals[parts[0].rstrip(":")] = int(parts[1])
+    return totals
+
+
+def process_memory():
+    """Resident / proportional / private memory of this process in MB (peak RSS where /proc is unavailable)"""
+    try:
+        smaps = read_smaps_rollup()
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return {"peak_rss_mb": peak / (MB if sys.platform == "darwin" else 1024)}
+    return {
+        "rss_mb": smaps.get("Rss", 0) / 1024,
+        "pss_mb": smaps.get("Pss", 0) / 1024,
+        "private_mb": (smaps.get("Private_Clean", 0) + smaps.get("Private_Dirty", 0)) / 1024
+    }
+
+
+def is_mapped(array):
+    """Whether a NumPy array is a view of a memory map (e.g. the snapshot bundle)"""
+    base = array
+    while isinstance(base, np.ndarray) and base.base is not None:
+        base = base.base
+    if isinstance(base, memoryview):
+        base = base.obj
+    return isinstance(base, (mmap.mmap, np.memmap))
+
+
+class SizeCounter:
+    """Deep byte size of object graphs, each object counted once per counter"""
+
+    def __init__(self):
+        self.seen = set()
+        self.mapped = 0
+        self._temporaries = []  # keeps reduced state alive so its ids are not reused
+
+    def size(self, obj):
+        if id(obj) in self.seen:
+            return 0
+        self.seen.add(id(obj))
+
+        if isinstance(obj, np.ndarray):
+            if obj.dtype == object:
+                return obj.nbytes + sum(self.size(item) for item in obj.ravel())
+            if is_mapped(obj):
+                self.mapped += obj.nbytes
+            return obj.nbytes
+        if isinstance(obj, (pd.DataFrame, pd.Series, pd.Index)):
+            usage = obj.memory_usage(deep=True)
+            return int(usage.sum()) if isinstance(usage, pd.Series) else int(usage)
+        if isinstance(obj, (str, bytes, int, float, bool, type(None))):
+            return sys.getsizeof(obj)
+
+        total = sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            return total + sum(self.size(key) + self.size(value) for key, value in obj.items())
+        if isinstance(obj, (list, tuple, set, frozenset, deque)):
+            return total + sum(self.size(item) for item in obj)
+        if hasattr(obj, "__dict__"):
+            return total + self.size(vars(obj))
+        if hasattr(obj, "__slots__"):
+            return total + sum(self.size(getattr(obj, slot)) for slot in obj.__slots__ if hasattr(obj, slot))
+        # Extension types (e.g. sklearn's Tree) expose their buffers through pickling state
+        try:
+            reduced = obj.__reduce_ex__(5)
+        except Exception:
+            return total
+        if isinstance(reduced, tuple) and len(reduced) > 2 and isinstance(reduced[2], dict):
+            self._temporaries.append(reduced)
+            return total + self.size(reduced[2])
+        return total
+
+
+def deep_size(obj):
+    counter = SizeCounter()
+    return counter.size(obj), counter.mapped
+
+
+def model_structure(model):
+    """(trees, nodes) of a tree-ensemble model (compiled or scikit-learn), or (None, None)"""
+    if hasattr(model, "roots") and hasattr(model, "left"):
+        return len(model.roots), len(model.left)
+    estimators = getattr(model, "estimators_", None)
+    if estimators is None:
+        tree = getattr(model, "tree_", None)
+        return (1, tree.node_count) if tree is not None else (None, None)
+    trees = [estimator.tree_ for estimator in np.ravel(estimators) if hasattr(estimator, "tree_")]
+    return len(trees), sum(tree.node_count for tree in trees)
+
+
+def collect_report(ml_system, model_loader, funds_data, extra_caches=None):
+    """
+    Footprint of the loaded DataFrames, models, caches and indexes.
+
+    extra_caches is an optional {name: object} of further caches to size
+    (e.g. the market regime snapshots).
+    """
+    from . import data_store, regime_indicator
+
+    sections = {name: [] for name in ["dataframes", "models", "caches", "indexes"]}
+    section_bytes = dict.fromkeys(sections, 0)
+    total = SizeCounter()  # objects shared between entries are counted once, where first seen
+
+    def add(section, name, obj, **extra):
+        size, mapped = deep_size(obj)
+        section_bytes[section] += total.size(obj)
+        sections[section].append({"name": name, **extra, "bytes": size, "mapped_bytes": mapped})
+
+    frames = {}
+    for path, df in list(data_store._snapshots.items()):
+        frames.setdefault(id(df), (f"data_store:{os.path.relpath(path, BACKEND_DIR)}", df))
+    for name, df in [("funds_data", funds_data), ("ml_system.df", getattr(ml_system, "df", None)),
+                     ("model_loader.df", getattr(model_loader, "df", None))]:
+        if df is not None:
+            frames.setdefault(id(df), (name, df))
+    for name, df in frames.values():
+        add("dataframes", name, df, rows=len(df), columns=df.shape[1])
+
+    for owner_name, owner in [("ml_system", ml_system), ("model_loader", model_loader)]:
+        for target, model in sorted(getattr(owner, "models", {}).items()):
+            trees, nodes = model_structure(model)
+            add("models", f"{owner_name}.{target}", model, type=type(model).__name__, trees=trees, nodes=nodes)
+
+    caches = {
+        "ml_system.feature_matrices": getattr(ml_system, "_feature_matrices", None),
+        "ml_system.predictions": getattr(ml_system, "_predictions", None),
+        "ml_system.risk_model": getattr(ml_system, "_risk_model_cache", None),
+        "model_loader.predictions": getattr(model_loader, "_predictions", None),
+        "regime_indicators": regime_indicator._indicators,
+        **(extra_caches or {})
+    }
+    for name, cache in caches.items():
+        if cache is not None:
+            add("caches", name, cache, entries=len(cache) if isinstance(cache, (dict, list, tuple)) else 1)
+
+    for (_, column), (_, index) in list(data_store._name_indexes.items()):
+        add("indexes", f"name_index:{column}", index, entries=len(index))
+
+    return {
+        "process": process_memory(),
+        **sections,
+        "totals_mb": {
+            **{section: round(size / MB, 3) for section, size in section_bytes.items()},
+            "all": round(sum(section_bytes.values()) / MB, 3),
+            "mapped": round(total.mapped / MB, 3)
+        }
+    }
+
+
+def _location(frame):
+    filename = frame.filename
+    for prefix in [BACKEND_DIR + os.sep] + [path + os.sep for path in sys.path if path.endswith("site-packages")]:
+        if filename.startswith(prefix):
+            filename = filename[len(prefix):]
+            break
+    return f"{filename}:{frame.lineno}"
+
+
+async def call_app(app, method, path, body=None, headers=None):
+    """Run one request through an ASGI app in-process; returns (status, response body size)"""
+    path, _, query = path.partition("?")
+    payload = json.dumps(body).encode("utf-8") if body is not None else b""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method.upper(), "scheme": "http", "path": path, "raw_path": path.encode("utf-8"),
+        "query_string": query.encode("utf-8"), "root_path": "",
+        "headers": [(b"host", b"memory-report"), (b"content-type", b"application/json"),
+                    (b"content-length", str(len(payload)).encode("ascii"))]
+                   + [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in (headers or {}).items()],
+        "client": ("127.0.0.1", 0), "server": ("memory-report", 80)
+    }
+    received = False
+
+    async def receive():
+        nonlocal received
+        if received:
+            await asyncio.Event().wait()  # no disconnect until the response is done
+        received = True
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    response = {"status": None, "bytes": 0}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["bytes"] += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return response["status"], response["bytes"]
+
+
+async def trace_request(app, method, path, body=None, top=15, headers=None):
+    """
+    Run one request under tracemalloc: the peak memory it allocated, what it
+    retained, and the source lines that allocated most (net of frees).
+    Other requests running at the same time are traced too.
+    """
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before_snapshot = tracemalloc.take_snapshot()
+        before, _ = tracemalloc.get_traced_memory()
+        status, response_bytes = await call_app(app, method, path, body, headers)
+        current, peak = tracemalloc.get_traced_memory()
+        after_snapshot = tracemalloc.take_snapshot()
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")]
+    differences = after_snapshot.filter_traces(ignore).compare_to(before_snapshot.filter_traces(ignore), "lineno")
+    return {
+        "method": method.upper(),
+        "path": path,
+        "status": status,
+        "response_bytes": response_bytes,
+        "peak_bytes": peak - before,
+        "retained_bytes": current - before,
+        "top_allocators": [
+            {"location": _location(stat.traceback[0]), "size_diff": stat.size_diff, "count_diff": stat.count_diff}
+            for stat in differences[:top]
+        ]
+    }
+
+
+def sample_requests(funds_data):
+    """A representative request per endpoint (no live market data needed)"""
+    names = funds_data["scheme_name"].tolist()
+    return [
+        ("GET", "/api/amcs", None),
+        ("GET", "/api/categories", None),
+        ("GET", "/api/dashboard-data", None),
+        ("GET", "/api/descriptive-analysis", None),
+        ("GET", "/api/enhanced-analysis", None),
+        ("GET", "/api/market-trends", None),
+        ("GET", "/api/top-performers", None),
+        ("POST", "/api/funds", {"limit": 50}),
+        ("POST", "/api/recommend", {"amount": 100000, "tenure": 3, "risk_tolerance": "moderate", "num_funds": 4}),
+        ("POST", "/api/recommend/batch", {"profiles": [
+            {"amount": amount, "tenure": tenure, "risk_tolerance": risk}
+            for amount in [10000, 100000] for tenure in [1, 3, 5] for risk in ["conservative", "moderate", "aggressive"]
+        ]}),
+        ("POST", "/api/forecast", {"fund_name": names[0], "horizon": 5, "investment_mode": "sip", "amount": 5000}),
+        ("POST", "/api/forecast/batch", {"fund_names": names[:200], "horizons": [1, 3, 5]}),
+        ("POST", "/api/compare-funds", {"fund_names": names[:5]}),
+        ("POST", "/api/what-if-simulation", {"fund_names": names[:10], "investment_amount": 100000,
+                                             "duration_years": 5, "market_regime": "bull"})
+    ]
+
+
+async def benchmark_peaks(app, requests, repeats=3):
+    """Peak traced memory (max over repeats) and the status of each sample request"""
+    results = []
+    for method, path, body in requests:
+        runs = [await trace_request(app, method, path, body, top=0) for _ in range(repeats)]
+        results.append({
+            "method": method,
+            "path": path,
+            "status": runs[-1]["status"],
+            "peak_bytes": max(run["peak_bytes"] for run in runs),
+            "retained_bytes": runs[-1]["retained_bytes"]
+        })
+    return results
+
+
+def _print_rows(title, rows, columns):
+    if not rows:
+        return
+    print(f"\n{title}")
+    print("   " + "".join(f"{label:>{width}}" if i else f"{label:<{width}}" for i, (label, _, width) in enumerate(columns)))
+    for row in rows:
+        cells = []
+        for i, (_, key, width) in enumerate(columns):
+            value = row.get(key)
+            if key.endswith("bytes"):
+                value = f"{value / MB:.2f} MB"
+            value = "" if value is None else str(value)
+            cells.append(f"{value:>{width}}" if i else f"{value:<{width}}")
+        print("   " + "".join(cells))
+
+
+def print_report(report):
+    process = report["process"]
+    print("📊 Process memory: " + ", ".join(f"{key[:-3]} {value:.1f} MB" for key, value in process.items()))
+    _print_rows("DataFrames", report["dataframes"],
+                [("name", "name", 44), ("rows", "rows", 8), ("cols", "columns", 6), ("size", "bytes", 12), ("mapped", "mapped_bytes", 12)])
+    _print_rows("Models", report["models"],
+                [("name", "name", 32), ("type", "type", 28), ("trees", "trees", 7), ("nodes", "nodes", 9),
+                 ("size", "bytes", 12), ("mapped", "mapped_bytes", 12)])
+    _print_rows("Caches", report["caches"],
+                [("name", "name", 44), ("entries", "entries", 8), ("size", "bytes", 12), ("mapped", "mapped_bytes", 12)])
+    _print_rows("Indexes", report["indexes"],
+                [("name", "name", 44), ("entries", "entries", 8), ("size", "bytes", 12)])
+    totals = report["totals_mb"]
+    print("\nTotals (shared objects counted once): " + ", ".join(f"{key} {value:.2f} MB" for key, value in totals.items()))
+
+
+def print_trace(trace):
+    print(f"\n🔍 {trace['method']} {trace['path']} -> {trace['status']} ({trace['response_bytes']} response bytes)")
+    print(f"   peak {trace['peak_bytes'] / MB:.2f} MB, retained {trace['retained_bytes'] / MB:.2f} MB")
+    for stat in trace["top_allocators"]:
+        print(f"   {stat['size_diff'] / 1024:>10.1f} KB {stat['count_diff']:>8} blocks  {stat['location']}")
+
+
+def print_benchmark(results):
+    _print_rows("Peak traced memory per endpoint", results,
+                [("request", "label", 40), ("status", "status", 8), ("peak", "peak_bytes", 12), ("retained", "retained_bytes", 12)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory footprint of the loaded data, models and caches")
+    parser.add_argument("--trace", nargs="+", metavar=("METHOD", "PATH"),
+                        help="trace one request: METHOD PATH [JSON_BODY]")
+    parser.add_argument("--top", type=int, default=15, help="allocating lines shown for --trace")
+    parser.add_argument("--benchmark", action="store_true", help="peak traced memory of a sample request per endpoint")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    from . import main as api
+    api.ensure_initialized()
+
+    output = {}
+    if args.trace:
+        if len(args.trace) < 2:
+            parser.error("--trace needs METHOD and PATH")
+        body = json.loads(args.trace[2]) if len(args.trace) > 2 else None
+        output["trace"] = asyncio.run(trace_request(api.app, args.trace[0], args.trace[1], body, args.top))
+    if args.benchmark:
+        output["benchmark"] = asyncio.run(benchmark_peaks(api.app, sample_requests(api.funds_data), args.repeats))
+    # After any requests, so lazily filled caches are included
+    output["report"] = collect_report(api.ml_system, api.model_loader, api.funds_data)
+
+    if args.json:
+        print(json.dumps(output, indent=2, default=str))
+        return
+    print_report(output["report"])
+    if "trace" in output:
+        print_trace(output["trace"])
+    if "benchmark" in output:
+        print_benchmark([{**row, "label": f"{row['method']} {row['path']}"} for row in output["benchmark"]])
+
+
+if __name__ == "__main__":
+    main()
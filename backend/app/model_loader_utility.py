@@ -2,19 +2,20 @@ import pandas as pd
 import numpy as np
 import pickle
 from datetime import datetime
+from .data_store import DEFAULT_DATA_PATH, load_funds_data, build_feature_matrix
 
 class MutualFundModelLoader:
     """Utility class to load and use pre-trained mutual fund models"""
     
     def __init__(self, data_path=None):
         if data_path is None:
-            import os
-            data_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'mutual_funds_cleaned.csv')
+            data_path = DEFAULT_DATA_PATH
         """Initialize the model loader"""
-        self.df = pd.read_csv(data_path)
+        self.df = load_funds_data(data_path)
         self.models = {}
         self.feature_columns = {}
         self.model_info = {}
+        self._predictions = {}
         
     def load_individual_model(self, target):
         """Load a specific model for a target (return_1yr, return_3yr, return_5yr)"""
@@ -61,6 +62,20 @@ class MutualFundModelLoader:
         print(f"\n✅ Successfully loaded {loaded_count}/3 models")
         return loaded_count == 3
     
+    def load_snapshot(self, snapshot):
+        """Use the models and precomputed predictions of a snapshot bundle"""
+        for target, model_data in snapshot.models.items():
+            self.models[target] = model_data['model']
+            self.feature_columns[target] = model_data['feature_columns']
+            self.model_info[target] = {
+                'model_type': model_data['model_type'],
+                'performance': model_data['performance'],
+                'training_date': model_data['training_date']
+            }
+        self._predictions.update(snapshot.predictions)
+        print(f"✅ Loaded {len(snapshot.models)} models from snapshot bundle")
+        return len(snapshot.models) == 3
+    
     def predict_fund_return(self, fund_data, horizon):
         """Predict return for a specific fund and horizon"""
         target_col = f'return_{horizon}yr'
@@ -83,6 +98,34 @@ class MutualFundModelLoader:
         prediction = model.predict([fund_features])[0]
         return prediction
     
+    def predict_fund_returns_batch(self, funds, horizon):
+        """Predict returns for every row of a DataFrame with a single model call
+        
+        Rows whose features cannot be scored (missing values) get NaN.
+        """
+        target_col = f'return_{horizon}yr'
+        
+        if target_col not in self.models:
+            raise ValueError(f"Model for {horizon}-year horizon not loaded")
+        
+        # Use median value for missing features, as in the single-fund path
+        feature_cols = self.feature_columns[target_col]
+        medians = {col: self.df[col].median() for col in feature_cols if col not in funds.columns}
+        X = build_feature_matrix(funds, feature_cols, medians)
+        
+        predictions = np.full(len(X), np.nan)
+        valid = ~np.isnan(X).any(axis=1)
+        if valid.any():
+            predictions[valid] = self.models[target_col].predict(X[valid])
+        return predictions
+    
+    def dataset_predictions(self, horizon):
+        """Predictions for every row of the dataset (NaN where unscorable), computed once"""
+        target_col = f'return_{horizon}yr'
+        if target_col not in self._predictions:
+            self._predictions[target_col] = self.predict_fund_returns_batch(self.df, horizon)
+        return self._predictions[target_col]
+    
     def get_model_info(self):
         """Get information about loaded models"""
         if not self.models:
@@ -118,7 +161,7 @@ class MutualFundModelLoader:
         df_filtered = self.df[
             (self.df['risk_level'] >= min_risk) & 
             (self.df['risk_level'] <= max_risk)
-        ].copy()
+        ]
         
         # Remove funds with missing target returns
         df_filtered = df_filtered.dropna(subset=[target_col])
@@ -139,7 +182,7 @@ class MutualFundModelLoader:
             return pd.DataFrame()
         
         # Create results dataframe
-        results_df = df_filtered.loc[fund_indices].copy()
+        results_df = df_filtered.loc[fund_indices]
         results_df['predicted_return'] = predictions
         results_df['actual_return'] = results_df[target_col]
         results_df['prediction_error'] = abs(results_df['predicted_return'] - results_df['actual_return'])
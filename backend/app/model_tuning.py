@@ -0,0 +1,393 @@
+"""
+Per-horizon model configurations and the hyperparameter search that tunes them.
+
+Training (DiversifiedMutualFundSystem.train_optimized_models and
+train_single_model) builds each horizon's model from load_model_configs():
+the defaults below, overridden by models/model_configs.json when a tuning
+run has been applied.
+
+    python -m app.model_tuning                       # report only
+    python -m app.model_tuning --horizons 5 --workers 8 --output /tmp/tuning.json
+    python -m app.model_tuning --apply               # write the recommended configs
+
+The search runs successive halving over model family (gradient boosting,
+extra trees, random forest), tree count, depth and learning rate:
+
+- the feature matrix and K cross-validation folds of each horizon are built
+  once and handed to every worker of a process pool at start-up; candidates
+  only ship their parameters
+- rung k trains every surviving candidate on the first min_resource * eta^k
+  rows of each training fold (a fixed shuffle) and scores it on the full
+  validation fold; the last rung uses the whole training fold
+- the best 1/eta by CV RMSE are promoted, plus every candidate on the
+  (RMSE, tree node count) front, so small models that are nearly as
+  accurate are not eliminated early; the current configuration is always
+  carried to the end for comparison
+
+Finalists are refit on all rows and measured in the parent process, one at
+a time: single-row and batch prediction latency (scikit-learn and compiled,
+see app.compiled_models) and pickled artifact size. The report holds the
+Pareto front of CV RMSE against single-row latency and artifact size, and
+the recommended configuration: the cheapest front member whose RMSE is
+within --tolerance of the best.
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELS_DIR = os.path.join(BACKEND_DIR, 'models')
+
+# Tuned per-horizon model configurations read by training (written by --apply)
+MODEL_CONFIG_PATH = os.getenv("MODEL_CONFIG_PATH", os.path.join(MODELS_DIR, 'model_configs.json'))
+
+RANDOM_STATE = 42
+
+FAMILY_LABELS = {
+    'GradientBoostingRegressor': 'Gradient Boosting',
+    'ExtraTreesRegressor': 'Extra Trees',
+    'RandomForestRegressor': 'Random Forest'
+}
+
+DEFAULT_MODEL_CONFIGS = {
+    'return_1yr': {'family': 'GradientBoostingRegressor', 'params': {'n_estimators': 200}},
+    'return_3yr': {'family': 'GradientBoostingRegressor', 'params': {'n_estimators': 200}},
+    'return_5yr': {'family': 'ExtraTreesRegressor', 'params': {'n_estimators': 200}}
+}
+
+SEARCH_SPACE = {
+    'GradientBoostingRegressor': {
+        'n_estimators': [50, 100, 200, 400],
+        'max_depth': [2, 3, 4, 5],
+        'learning_rate': [0.03, 0.1, 0.2]
+    },
+    'ExtraTreesRegressor': {
+        'n_estimators': [50, 100, 200, 400],
+        'max_depth': [8, 16, 32, None]
+    },
+    'RandomForestRegressor': {
+        'n_estimators': [50, 100, 200, 400],
+        'max_depth': [8, 16, 32, None]
+    }
+}
+
+
+def model_name(config):
+    """Display name stored with trained models, e.g. "Gradient Boosting (200 trees)" """
+    n_estimators = config['params'].get('n_estimators', 100)
+    return f"{FAMILY_LABELS[config['family']]} ({n_estimators} trees)"
+
+
+def load_model_configs(path=MODEL_CONFIG_PATH):
+    """{target: {'family', 'params', 'name'}}: the defaults, overridden by a tuned config file"""
+    configs = {target: dict(config) for target, config in DEFAULT_MODEL_CONFIGS.items()}
+    if path and os.path.exists(path):
+        try:
+            with open(path) as f:
+                tuned = json.load(f)
+            for target, config in tuned.get('models', {}).items():
+                if config['family'] not in FAMILY_LABELS:
+                    raise ValueError(f"unknown model family {config['family']}")
+                configs[target] = {'family': config['family'], 'params': dict(config['params'])}
+        except (OSError, ValueError, KeyError) as e:
+            print(f"❌ Ignoring model configs {path}: {e}")
+            configs = {target: dict(config) for target, config in DEFAULT_MODEL_CONFIGS.items()}
+    for config in configs.values():
+        config['name'] = model_name(config)
+    return configs
+
+
+def build_model(config):
+    """Unfitted estimator for a model config"""
+    from sklearn import ensemble
+    return getattr(ensemble, config['family'])(random_state=RANDOM_STATE, **config['params'])
+
+
+def candidate_grid(search_space=SEARCH_SPACE, families=None):
+    """Every (family, params) combination of the search space"""
+    candidates = []
+    for family, space in search_space.items():
+        if families and family not in families:
+            continue
+        names = list(space)
+        for values in itertools.product(*(space[name] for name in names)):
+            candidates.append({'family': family, 'params': dict(zip(names, values))})
+    return candidates
+
+
+def _same_config(a, b):
+    if a['family'] != b['family']:
+        return False
+    defaults = build_model({'family': a['family'], 'params': {}}).get_params()
+    return {**defaults, **a['params']} == {**defaults, **b['params']}
+
+
+def build_folds(n_rows, n_folds, seed=RANDOM_STATE):
+    """[(train positions in a fixed shuffled order, validation positions)] for K-fold CV"""
+    from sklearn.model_selection import KFold
+    rng = np.random.default_rng(seed)
+    folds = []
+    for train, valid in KFold(n_splits=n_folds, shuffle=True, random_state=seed).split(np.arange(n_rows)):
+        folds.append((rng.permutation(train), valid))
+    return folds
+
+
+def rung_sizes(train_size, min_resource, eta):
+    """Training rows per fold at each rung (the last one is the full training fold)"""
+    sizes = []
+    size = min(min_resource, train_size)
+    # A rung within a factor eta of the full fold is merged into the last one
+    while size * eta <= train_size:
+        sizes.append(int(size))
+        size *= eta
+    sizes.append(train_size)
+    return sizes
+
+
+# Worker state: set once per process by the pool initializer
+_worker_data = {}
+
+
+def _init_worker(X, y, folds):
+    _worker_data.update(X=X, y=y, folds=folds)
+
+
+def _node_count(model):
+    return int(sum(estimator.tree_.node_count for estimator in np.ravel(model.estimators_)))
+
+
+def evaluate_candidate(config, n_rows):
+    """CV scores of one config trained on the first n_rows of each training fold (worker side)"""
+    from sklearn.metrics import r2_score
+    X, y, folds = _worker_data['X'], _worker_data['y'], _worker_data['folds']
+    rmse, r2, nodes = [], [], []
+    start = time.perf_counter()
+    for train, valid in folds:
+        rows = train[:n_rows]
+        model = build_model(config).fit(X[rows], y[rows])
+        pred = model.predict(X[valid])
+        rmse.append(float(np.sqrt(np.mean((y[valid] - pred) ** 2))))
+        r2.append(float(r2_score(y[valid], pred)))
+        nodes.append(_node_count(model))
+    return {
+        'cv_rmse': float(np.mean(rmse)),
+        'cv_rmse_std': float(np.std(rmse)),
+        'cv_r2': float(np.mean(r2)),
+        'n_nodes': int(np.mean(nodes)),
+        'fit_seconds': round((time.perf_counter() - start) / len(folds), 4)
+    }
+
+
+def fit_full(config):
+    """Pickled model fitted on every row (worker side)"""
+    model = build_model(config).fit(_worker_data['X'], _worker_data['y'])
+    return pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def pareto_front(points, objectives):
+    """Indices of the points not dominated on the objectives (all minimized)"""
+    front = []
+    for i, a in enumerate(points):
+        dominated = any(
+            all(b[key] <= a[key] for key in objectives) and any(b[key] < a[key] for key in objectives)
+            for j, b in enumerate(points) if j != i
+        )
+        if not dominated:
+            front.append(i)
+    return front
+
+
+def promote(results, keep, always=()):
+    """Indices surviving a rung: the best `keep` by CV RMSE, the (RMSE, nodes) front and `always`"""
+    ranked = sorted(range(len(results)), key=lambda i: results[i]['cv_rmse'])
+    survivors = set(ranked[:keep])
+    survivors.update(pareto_front(results, ['cv_rmse', 'n_nodes']))
+    survivors.update(always)
+    return sorted(survivors, key=lambda i: results[i]['cv_rmse'])
+
+
+def _median_seconds(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return float(np.median(samples))
+
+
+def measure_inference(model_bytes, X, single_calls=200, batch_repeats=5):
+    """Prediction latency and artifact size of a pickled model (run sequentially, in one process)"""
+    from .compiled_models import CompiledTreeEnsemble
+    model = pickle.loads(model_bytes)
+    compiled = CompiledTreeEnsemble.from_sklearn(model)
+    rows = [X[i:i + 1] for i in range(min(single_calls, len(X)))]
+
+    def single(predict):
+        predict(rows[0])
+        start = time.perf_counter()
+        for row in rows:
+            predict(row)
+        return (time.perf_counter() - start) / len(rows) * 1000
+
+    return {
+        'single_row_ms': round(single(model.predict), 4),
+        'compiled_single_row_ms': round(single(compiled.predict), 4),
+        'batch_ms_per_1k_rows': round(_median_seconds(lambda: model.predict(X), batch_repeats) / len(X) * 1000 * 1000, 3),
+        'artifact_bytes': len(model_bytes)
+    }
+
+
+def tune_horizon(df, target, args):
+    """Successive halving for one horizon; returns its report section"""
+    from .data_store import training_features
+
+    X_frame, y_series, feature_cols = training_features(df, target)
+    X = X_frame.to_numpy(dtype=np.float64)
+    y = y_series.to_numpy(dtype=np.float64)
+    folds = build_folds(len(X), args.folds, args.seed)
+    train_size = min(len(train) for train, _ in folds)
+    sizes = rung_sizes(train_size, args.min_resource, args.eta)
+
+    current = load_model_configs().get(target, DEFAULT_MODEL_CONFIGS[target])
+    current = {'family': current['family'], 'params': current['params']}
+    candidates = candidate_grid(families=args.families)
+    current_index = next((i for i, c in enumerate(candidates) if _same_config(c, current)), None)
+    if current_index is None:
+        candidates.append(current)
+        current_index = len(candidates) - 1
+
+    print(f"\n🔎 {target}: {len(candidates)} candidates, {args.folds} folds, rungs of {sizes} rows")
+    rungs = []
+    alive = list(range(len(candidates)))
+    results = {}
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(X, y, folds)) as pool:
+        for rung, n_rows in enumerate(sizes):
+            start = time.perf_counter()
+            scores = list(pool.map(evaluate_candidate, [candidates[i] for i in alive], itertools.repeat(n_rows)))
+            for i, score in zip(alive, scores):
+                results[i] = {**score, 'rung': rung, 'rows': n_rows}
+            elapsed = time.perf_counter() - start
+            best = min(scores, key=lambda s: s['cv_rmse'])
+            print(f"   rung {rung}: {len(alive)} candidates on {n_rows} rows, best CV RMSE "
+                  f"{best['cv_rmse']:.3f} ({elapsed:.1f} s)")
+            rungs.append({'rows': n_rows, 'candidates': len(alive), 'best_cv_rmse': best['cv_rmse'],
+                          'seconds': round(elapsed, 2)})
+            if rung == len(sizes) - 1:
+                break
+            keep = max(1, math.ceil(len(alive) / args.eta))
+            survivors = promote(scores, keep, always=[alive.index(current_index)])
+            alive = [alive[i] for i in survivors]
+
+        artifacts = list(pool.map(fit_full, [candidates[i] for i in alive]))
+
+    finalists = []
+    for i, model_bytes in zip(alive, artifacts):
+        finalists.append({
+            **candidates[i],
+            'name': model_name(candidates[i]),
+            'current': i == current_index,
+            **{key: results[i][key] for key in ('cv_rmse', 'cv_rmse_std', 'cv_r2', 'n_nodes', 'fit_seconds')},
+            **measure_inference(model_bytes, X)
+        })
+    finalists.sort(key=lambda c: c['cv_rmse'])
+
+    front = [finalists[i] for i in pareto_front(finalists, ['cv_rmse', 'single_row_ms', 'artifact_bytes'])]
+    best_rmse = min(c['cv_rmse'] for c in finalists)
+    eligible = [c for c in front if c['cv_rmse'] <= best_rmse * (1 + args.tolerance)]
+    recommended = min(eligible, key=lambda c: (c['artifact_bytes'], c['single_row_ms']))
+    return {
+        'rows': len(X),
+        'features': len(feature_cols),
+        'rungs': rungs,
+        'finalists': finalists,
+        'pareto_front': front,
+        'current': next(c for c in finalists if c['current']),
+        'recommended': recommended
+    }
+
+
+def print_summary(report):
+    for target, section in report['horizons'].items():
+        print(f"\n📊 {target}: Pareto front (CV RMSE vs single-row latency vs artifact size)")
+        print(f"   {'model':<52}{'CV RMSE':>9}{'R²':>7}{'1-row ms':>10}{'compiled':>10}{'ms/1k':>8}{'size KB':>10}")
+        rows = section['pareto_front'] + [c for c in [section['current']] if c not in section['pareto_front']]
+        for c in rows:
+            params = ", ".join(f"{k}={v}" for k, v in c['params'].items() if k != 'n_estimators')
+            label = f"{c['name']}{' ' + params if params else ''}"
+            marks = (" ◀ recommended" if c == section['recommended'] else "") + (" (current)" if c['current'] else "")
+            print(f"   {label:<52}{c['cv_rmse']:>9.3f}{c['cv_r2']:>7.3f}{c['single_row_ms']:>10.3f}"
+                  f"{c['compiled_single_row_ms']:>10.3f}{c['batch_ms_per_1k_rows']:>8.2f}"
+                  f"{c['artifact_bytes'] / 1024:>10.0f}{marks}")
+
+
+def write_model_configs(report, path=MODEL_CONFIG_PATH):
+    """Store each tuned horizon's recommended config for training (others keep their current config)"""
+    existing = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            existing = json.load(f).get('models', {})
+    for target, section in report['horizons'].items():
+        chosen = section['recommended']
+        existing[target] = {
+            'family': chosen['family'],
+            'params': chosen['params'],
+            'cv_rmse': chosen['cv_rmse'],
+            'artifact_bytes': chosen['artifact_bytes']
+        }
+    with open(path, 'w') as f:
+        json.dump({'tuned_at': report['created_at'], 'models': existing}, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the per-horizon models with successive halving")
+    parser.add_argument("--horizons", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--families", nargs="+", choices=list(SEARCH_SPACE), help="restrict the model families")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--eta", type=float, default=3.0, help="rung growth and elimination factor")
+    parser.add_argument("--min-resource", type=int, default=70, help="training rows per fold at the first rung")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="recommend the cheapest front model within this fraction of the best CV RMSE")
+    parser.add_argument("--seed", type=int, default=RANDOM_STATE)
+    parser.add_argument("--data", default=None, help="funds CSV (default: data/mutual_funds_cleaned.csv)")
+    parser.add_argument("--output", help="write the full report JSON here")
+    parser.add_argument("--apply", action="store_true", help=f"write the recommended configs to {MODEL_CONFIG_PATH}")
+    args = parser.parse_args()
+
+    from .data_store import load_funds_data
+    df = load_funds_data(args.data)
+
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'settings': {key: getattr(args, key) for key in ('folds', 'eta', 'min_resource', 'tolerance', 'seed')},
+        'horizons': {}
+    }
+    for horizon in args.horizons:
+        target = f'return_{horizon}yr'
+        if target not in df.columns:
+            print(f"❌ No {target} column in the dataset")
+            sys.exit(1)
+        report['horizons'][target] = tune_horizon(df, target, args)
+
+    print_summary(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✅ Report written to {args.output}")
+    if args.apply:
+        write_model_configs(report)
+        print(f"✅ Recommended configs written to {MODEL_CONFIG_PATH} (retrain to use them)")
+
+
+if __name__ == "__main__":
+    main()
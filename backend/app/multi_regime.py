@@ -0,0 +1,175 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from .market_data import get_bar_store
+from .market_regime import MarketDataError, classify_market_regime
+
+# Broad and sectoral indices tracked by the multi-index regime engine (Yahoo Finance tickers)
+MARKET_INDICES = {
+    "NIFTY 50": "^NSEI",
+    "SENSEX": "^BSESN",
+    "NIFTY BANK": "^NSEBANK",
+    "NIFTY IT": "^CNXIT",
+    "NIFTY PHARMA": "^CNXPHARMA",
+    "NIFTY FMCG": "^CNXFMCG",
+    "NIFTY AUTO": "^CNXAUTO",
+    "NIFTY INFRA": "^CNXINFRA",
+    "NIFTY ENERGY": "^CNXENERGY",
+    "NIFTY REALTY": "^CNXREALTY",
+    "NIFTY PSE": "^CNXPSE",
+    "NIFTY MNC": "^CNXMNC"
+}
+
+DEFAULT_INDEX = "NIFTY 50"
+
+SECTORAL_COLUMN = 'sub_category_Sectoral / Thematic Mutual Funds'
+
+# Scheme-name keywords of sectoral / thematic funds, first match wins
+SECTOR_KEYWORDS = [
+    ("NIFTY BANK", r"bank|financ|fin serv|fina serv"),
+    ("NIFTY IT", r"technology|digital"),
+    ("NIFTY PHARMA", r"pharma|health|p\.h\.d"),
+    ("NIFTY FMCG", r"fmcg|consum"),
+    ("NIFTY REALTY", r"housing|realty"),
+    ("NIFTY INFRA", r"infra|build india|manufactur"),
+    ("NIFTY ENERGY", r"energy|power|resources"),
+    ("NIFTY PSE", r"\bpsu\b"),
+    ("NIFTY MNC", r"\bmnc\b"),
+    ("NIFTY AUTO", r"auto|transportation")
+]
+
+# Concurrent upstream fetches when refreshing all indices
+MARKET_REGIME_MAX_WORKERS = int(os.getenv("MARKET_REGIME_MAX_WORKERS", 4))
+
+
+def fund_market_index(fund):
+    """Index whose regime applies to a fund (a row dict with scheme_name and sub-category flags)"""
+    if fund.get(SECTORAL_COLUMN, 0) == 1:
+        name = str(fund.get('scheme_name', '')).lower()
+        for index_name, pattern in SECTOR_KEYWORDS:
+            if re.search(pattern, name):
+                return index_name
+    return DEFAULT_INDEX
+
+
+def ema_2d(values, span):
+    """
+    EMA down axis 0 of a (time x series) array, equal to ewm(span, adjust=False)
+    per column, computed for all columns at once with a first-order IIR filter
+    seeded at the first row.
+    """
+    from scipy.signal import lfilter  # deferred: scipy.signal is slow to import
+
+    alpha = 2.0 / (span + 1)
+    zi = (1.0 - alpha) * values[:1]
+    ema, _ = lfilter([alpha], [1.0, alpha - 1.0], values, axis=0, zi=zi)
+    return ema
+
+
+def fetch_index_closes(indices=None, store=None, max_workers=MARKET_REGIME_MAX_WORKERS):
+    """
+    Fetch a year of hourly bars for several indices through a bounded thread
+    pool and resample each to 4H closes.
+
+    Returns ({name: close series}, {name: error message}).
+    """
+    indices = indices or MARKET_INDICES
+    store = store or get_bar_store()
+
+    def fetch(ticker):
+        data = store.get_bars(ticker, "1h", timedelta(days=365))
+        return data['Close'].resample('4H').last().dropna()
+
+    closes, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="index-data") as pool:
+        futures = {name: pool.submit(fetch, ticker) for name, ticker in indices.items()}
+        for name, future in futures.items():
+            try:
+                series = future.result()
+            except Exception as e:
+                errors[name] = str(e)
+                continue
+            if len(series) < 21:
+                errors[name] = "Insufficient data for EMA calculation"
+            else:
+                closes[name] = series
+    return closes, errors
+
+
+def analyze_index_regimes(closes, tickers=None):
+    """
+    EMA 12/21 crossover analysis for many indices in one vectorized pass.
+
+    The 4H closes are aligned on their union calendar into a (time x index)
+    array; gaps are forward-filled and each index's leading gap is filled
+    with its first close, which leaves its EMA unchanged until its data
+    starts.
+    """
+    names = list(closes)
+    frame = pd.concat([closes[name].tz_convert('UTC') for name in names], axis=1, keys=names).sort_index()
+    data_points = frame.notna().sum().to_numpy()
+    values = frame.ffill().bfill().to_numpy(dtype=np.float64)
+
+    ema_12 = ema_2d(values, 12)
+    ema_21 = ema_2d(values, 21)
+
+    latest_price = values[-1]
+    is_bullish = ema_12[-1] > ema_21[-1]
+    was_bullish = ema_12[-2] > ema_21[-2]
+    ema_diff_percent = (ema_12[-1] - ema_21[-1]) / ema_21[-1] * 100
+
+    trend_strength = np.select(
+        [np.abs(ema_diff_percent) < 0.5, np.abs(ema_diff_percent) < 1.5],
+        ["weak", "moderate"],
+        "strong"
+    )
+
+    # Bars since the last sign change of EMA 12 - EMA 21 (None if none in the window)
+    above = ema_12 > ema_21
+    changed = above[1:] != above[:-1]
+    has_crossover = changed.any(axis=0)
+    last_change = changed.shape[0] - 1 - np.argmax(changed[::-1], axis=0)
+    bars_since_crossover = changed.shape[0] - 1 - last_change
+
+    tickers = tickers or MARKET_INDICES
+    regimes = {}
+    for j, name in enumerate(names):
+        crossover = None
+        if is_bullish[j] != was_bullish[j]:
+            crossover = "bullish" if is_bullish[j] else "bearish"
+        diff = round(float(ema_diff_percent[j]), 2)
+        regimes[name] = {
+            "ticker": tickers.get(name),
+            "current_price": float(latest_price[j]),
+            "ema_12": float(ema_12[-1, j]),
+            "ema_21": float(ema_21[-1, j]),
+            "ema_diff_percent": diff,
+            "condition": "bullish" if is_bullish[j] else "bearish",
+            "crossover": crossover,
+            "bars_since_crossover": int(bars_since_crossover[j]) if has_crossover[j] else None,
+            "trend_strength": str(trend_strength[j]),
+            "market_regime": classify_market_regime(diff, str(trend_strength[j])),
+            "data_points": int(data_points[j])
+        }
+    return regimes
+
+
+def fetch_index_regimes(indices=None, store=None):
+    """Fetch all tracked indices concurrently and analyze their regimes together"""
+    indices = indices or MARKET_INDICES
+    closes, errors = fetch_index_closes(indices, store)
+    if not closes:
+        raise MarketDataError(f"No index data available: {errors}")
+
+    return {
+        "indices": analyze_index_regimes(closes, indices),
+        "errors": errors,
+        "timeframe": "4H",
+        "period": "1 year",
+        "last_updated": datetime.now().isoformat()
+    }
@@ -0,0 +1,205 @@
+import numpy as np
+
+# The cleaned dataset stores `standard_deviation` and `beta` as z-scores, so
+# they are mapped back onto a positive, annualized (% units) scale before the
+# covariance is built. Predicted returns are in % as well, which keeps the
+# mean-variance objective in consistent units.
+MARKET_VOLATILITY = 15.0
+BASE_FUND_VOLATILITY = 14.0
+VOLATILITY_DISPERSION = 0.35
+BETA_DISPERSION = 0.25
+MIN_BETA = 0.05
+CATEGORY_VOLATILITY = 4.0
+SUB_CATEGORY_VOLATILITY = 3.0
+MIN_IDIOSYNCRATIC_SHARE = 0.2
+
+# Risk penalty applied to portfolio variance (per %^2) for each risk profile
+RISK_AVERSION = {
+    'conservative': 0.08,
+    'moderate': 0.04,
+    'aggressive': 0.015
+}
+
+
+def estimate_fund_volatility(df):
+    """Annualized volatility (%) per fund from the standardized standard_deviation column"""
+    z = df['standard_deviation'].fillna(0).to_numpy(dtype=np.float64)
+    return BASE_FUND_VOLATILITY * np.exp(VOLATILITY_DISPERSION * z)
+
+
+def estimate_fund_beta(df):
+    """Market beta per fund from the standardized beta column"""
+    z = df['beta'].fillna(0).to_numpy(dtype=np.float64)
+    return np.maximum(1.0 + BETA_DISPERSION * z, MIN_BETA)
+
+
+class CorrelationAwareOptimizer:
+    """
+    Mean-variance portfolio optimizer over a low-rank factor covariance.
+
+    The covariance is never materialized for the full universe: it is kept as
+    Sigma = F F^T + diag(d), where F holds market-beta, main-category and
+    sub-category loadings. Every solver iteration therefore costs O(n * k)
+    with k ~ 60 factors, which keeps tens of thousands of funds interactive.
+    """
+
+    def __init__(self, max_weight=0.6, min_weight=0.05, max_iter=300, tol=1e-7):
+        self.max_weight = max_weight
+        self.min_weight = min_weight
+        self.max_iter = max_iter
+        self.tol = tol
+
+    def build_risk_model(self, df):
+        """Return factor loadings F (n x k) and idiosyncratic variances d (n,)"""
+        n = len(df)
+        volatility = estimate_fund_volatility(df)
+        beta = estimate_fund_beta(df)
+
+        main_cols = [col for col in df.columns if col.startswith('category_')]
+        sub_cols = [col for col in df.columns if col.startswith('sub_category_')]
+
+        main = df[main_cols].to_numpy(dtype=np.float64) if main_cols else np.zeros((n, 0))
+        # Funds without a main category flag (the dropped one-hot level) share their own factor
+        implicit_main = (main.sum(axis=1) == 0).astype(np.float64)[:, None]
+        sub = df[sub_cols].to_numpy(dtype=np.float64) if sub_cols else np.zeros((n, 0))
+
+        loadings = np.hstack([
+            (beta * MARKET_VOLATILITY)[:, None],
+            np.hstack([main, implicit_main]) * CATEGORY_VOLATILITY,
+            sub * SUB_CATEGORY_VOLATILITY
+        ])
+
+        systematic = np.einsum('ij,ij->i', loadings, loadings)
+        idiosyncratic = np.maximum(volatility ** 2 - systematic,
+                                   (MIN_IDIOSYNCRATIC_SHARE * volatility) ** 2)
+        return loadings, idiosyncratic
+
+    @staticmethod
+    def _covariance_dot(loadings, idiosyncratic, w):
+        return loadings @ (loadings.T @ w) + idiosyncratic * w
+
+    @staticmethod
+    def _project_bounded_simplex(v, lower, upper, iterations=60):
+        """Euclidean projection onto {w : sum(w) = 1, lower <= w <= upper}"""
+        if lower == 0.0 and upper >= 1.0:
+            # Plain probability simplex: exact sort-based projection, no bisection needed
+            u = np.sort(v)[::-1]
+            cumulative = np.cumsum(u) - 1.0
+            rho = np.nonzero(u * np.arange(1, len(v) + 1) > cumulative)[0][-1]
+            return np.maximum(v - cumulative[rho] / (rho + 1.0), 0.0)
+
+        lo = v.min() - upper
+        hi = v.max() - lower
+        for _ in range(iterations):
+            tau = 0.5 * (lo + hi)
+            if np.clip(v - tau, lower, upper).sum() > 1.0:
+                lo = tau
+            else:
+                hi = tau
+        return np.clip(v - 0.5 * (lo + hi), lower, upper)
+
+    def _solve(self, mu, loadings, idiosyncratic, risk_aversion, lower, upper):
+        """Accelerated projected gradient ascent on mu'w - lambda w'Sigma w"""
+        n = len(mu)
+        # Lipschitz constant of the gradient: 2 * lambda * ||Sigma||_2
+        factor_norm = np.linalg.eigvalsh(loadings.T @ loadings).max() if loadings.shape[1] else 0.0
+        lipschitz = 2.0 * risk_aversion * (factor_norm + idiosyncratic.max()) + 1e-12
+        step = 1.0 / lipschitz
+
+        w = self._project_bounded_simplex(np.full(n, 1.0 / n), lower, upper)
+        y = w.copy()
+        t = 1.0
+        for _ in range(self.max_iter):
+            gradient = mu - 2.0 * risk_aversion * self._covariance_dot(loadings, idiosyncratic, y)
+            w_next = self._project_bounded_simplex(y + step * gradient, lower, upper)
+            t_next = 0.5 * (1.0 + np.sqrt(1.0 + 4.0 * t * t))
+            y = w_next + ((t - 1.0) / t_next) * (w_next - w)
+            converged = np.abs(w_next - w).max() < self.tol
+            w, t = w_next, t_next
+            if converged:
+                break
+        return w
+
+    def optimize(self, df, expected_returns, n_funds=2, risk_tolerance='moderate', risk_model=None):
+        """
+        Select n_funds funds and their weights.
+
+        Stage 1 solves the long-only problem over the whole universe to find
+        where the optimal mass lands; stage 2 re-solves on the n_funds
+        strongest candidates with per-fund weight bounds.
+
+        risk_model optionally supplies precomputed (loadings, idiosyncratic)
+        rows for the candidates, in which case df is not read.
+
+        Returns a dict with the selected positional indices, weights and
+        portfolio statistics.
+        """
+        mu = np.asarray(expected_returns, dtype=np.float64)
+        n = len(mu)
+        if n == 0:
+            raise ValueError("No candidate funds to optimize over")
+
+        n_funds = max(1, min(int(n_funds), n))
+        risk_aversion = RISK_AVERSION.get(risk_tolerance, RISK_AVERSION['moderate'])
+        if risk_model is None:
+            risk_model = self.build_risk_model(df)
+        loadings, idiosyncratic = risk_model
+
+        # Stage 1: full universe, long-only
+        weights = self._solve(mu, loadings, idiosyncratic, risk_aversion, 0.0, 1.0)
+
+        # Rank by weight, break ties (zero weights) by marginal utility at the optimum
+        marginal = mu - 2.0 * risk_aversion * self._covariance_dot(loadings, idiosyncratic, weights)
+        order = np.lexsort((-marginal, -weights))
+        selected = order[:n_funds]
+
+        # Stage 2: re-solve on the selected funds with weight bounds that stay feasible
+        upper = max(self.max_weight, 1.0 / n_funds)
+        lower = min(self.min_weight, 1.0 / n_funds)
+        sub_loadings = loadings[selected]
+        sub_idiosyncratic = idiosyncratic[selected]
+        sub_weights = self._solve(mu[selected], sub_loadings, sub_idiosyncratic,
+                                  risk_aversion, lower, upper)
+
+        ranking = np.argsort(-sub_weights, kind='stable')
+        selected = selected[ranking]
+        sub_weights = sub_weights[ranking]
+        sub_loadings = sub_loadings[ranking]
+        sub_idiosyncratic = sub_idiosyncratic[ranking]
+
+        covariance = sub_loadings @ sub_loadings.T + np.diag(sub_idiosyncratic)
+        stats = self.portfolio_statistics(mu[selected], covariance, sub_weights)
+        stats.update({
+            'indices': selected,
+            'weights': sub_weights,
+            'risk_aversion': risk_aversion,
+            'universe_size': n
+        })
+        return stats
+
+    @staticmethod
+    def portfolio_statistics(mu, covariance, weights):
+        """Expected return, volatility and correlation structure of a weighted portfolio"""
+        std = np.sqrt(np.diag(covariance))
+        correlation = covariance / np.outer(std, std)
+        k = len(weights)
+        if k > 1:
+            off_diagonal = correlation[~np.eye(k, dtype=bool)]
+            avg_correlation = float(off_diagonal.mean())
+        else:
+            avg_correlation = 1.0
+
+        return {
+            'expected_return': float(mu @ weights),
+            'volatility': float(np.sqrt(weights @ covariance @ weights)),
+            'correlation_matrix': correlation,
+            'average_correlation': avg_correlation
+        }
+
+    def analyze(self, df, expected_returns, weights):
+        """Portfolio statistics for an already selected set of funds"""
+        loadings, idiosyncratic = self.build_risk_model(df)
+        covariance = loadings @ loadings.T + np.diag(idiosyncratic)
+        return self.portfolio_statistics(np.asarray(expected_returns, dtype=np.float64),
+                                         covariance, np.asarray(weights, dtype=np.float64))
+
@@ -0,0 +1,123 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .instrumentation import Histogram
+
+# How long the first prediction of a batch waits for others to join it
+PREDICTION_BATCH_WINDOW_MS = float(os.getenv("PREDICTION_BATCH_WINDOW_MS", 2))
+
+# A batch is dispatched immediately once it holds this many predictions
+PREDICTION_BATCH_MAX_SIZE = int(os.getenv("PREDICTION_BATCH_MAX_SIZE", 256))
+
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256, 512]
+WAIT_MS_BUCKETS = [0.5, 1, 2, 5, 10, 25, 50, 100, 250, 1000]
+
+
+class PredictionMicroBatcher:
+    """
+    Coalesces concurrent single-fund predictions into one model call per horizon.
+
+    A prediction request (fund row position, horizon) joins the pending batch
+    of its horizon; the batch is dispatched when its window (counted from the
+    first request) expires or when it reaches max_batch_size. Each batch runs
+    one predict_fund_returns_batch on a dedicated thread and its results are
+    fanned back to the waiting coroutines. Rows the batch path cannot score
+    (missing features) go through predict_fund_return, so they fail exactly
+    as a direct call would.
+    """
+
+    def __init__(self, model_loader, funds, window_ms=PREDICTION_BATCH_WINDOW_MS,
+                 max_batch_size=PREDICTION_BATCH_MAX_SIZE):
+        self.model_loader = model_loader
+        self.funds = funds
+        self.window = window_ms / 1000
+        self.max_batch_size = max(1, max_batch_size)
+        self._pending = {}  # horizon -> [(position, future, enqueued_at)]
+        self._timers = {}
+        self._tasks = set()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prediction-batch")
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.wait_ms = Histogram(WAIT_MS_BUCKETS)
+        self.predictions = 0
+
+    async def predict(self, position, horizon):
+        """Predicted return of the fund at row `position` for a horizon"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.setdefault(horizon, [])
+        pending.append((position, future, time.perf_counter()))
+
+        if len(pending) >= self.max_batch_size:
+            self._dispatch(horizon)
+        elif len(pending) == 1:
+            self._timers[horizon] = loop.call_later(self.window, self._dispatch, horizon)
+        return await future
+
+    def _dispatch(self, horizon):
+        timer = self._timers.pop(horizon, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(horizon, None)
+        if not batch:
+            return
+
+        dispatched_at = time.perf_counter()
+        self.batch_sizes.observe(len(batch))
+        for _, _, enqueued_at in batch:
+            self.wait_ms.observe((dispatched_at - enqueued_at) * 1000)
+
+        task = asyncio.get_running_loop().create_task(self._run(horizon, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, horizon, batch):
+        positions = np.array([position for position, _, _ in batch], dtype=np.int64)
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(self._executor, self._predict, horizon, positions)
+        except Exception as e:
+            results = [e] * len(batch)
+
+        self.predictions += len(batch)
+        for (_, future, _), result in zip(batch, results):
+            if future.done():  # caller went away
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def _predict(self, horizon, positions):
+        unique, inverse = np.unique(positions, return_inverse=True)
+        rows = self.funds.iloc[unique]
+        if self.funds is self.model_loader.df:
+            # Rows of the model's own dataset: precomputed once for all funds
+            predictions = self.model_loader.dataset_predictions(horizon)[unique]
+        else:
+            predictions = self.model_loader.predict_fund_returns_batch(rows, horizon)
+
+        results = list(predictions)
+        for i in np.flatnonzero(np.isnan(predictions)):
+            try:
+                results[i] = self.model_loader.predict_fund_return(rows.iloc[i].to_dict(), horizon)
+            except Exception as e:
+                results[i] = e
+        return [results[i] for i in inverse]
+
+    def stats(self):
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch_size": self.max_batch_size,
+            "predictions": self.predictions,
+            "batches": self.batch_sizes.count,
+            "pending": sum(len(batch) for batch in self._pending.values()),
+            "batch_size": self.batch_sizes.snapshot(),
+            "wait_ms": self.wait_ms.snapshot()
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,92 @@
+import numpy as np
+
+INVESTMENT_MODES = ("lumpsum", "sip", "step_up_sip")
+
+# Months between step-up increases of a step-up SIP
+STEP_UP_EVERY_MONTHS = 12
+
+
+def monthly_rate(annual_return_percent, compounding="effective"):
+    """
+    Monthly return (fraction) for an annual return in %.
+
+    "effective" compounds to the annual return over 12 months;
+    "nominal" is the simple annual / 12 split used by the forecast curve.
+    """
+    annual = np.asarray(annual_return_percent, dtype=np.float64) / 100
+    if compounding == "nominal":
+        return annual / 12
+    return np.power(1 + annual, 1 / 12) - 1
+
+
+def lumpsum_growth(annual_return_percent, years):
+    """Growth multiple of a lump sum compounded annually over (fractional) years"""
+    return (1 + np.asarray(annual_return_percent, dtype=np.float64) / 100) ** years
+
+
+def contribution_schedule(months, mode="lumpsum", amount=1.0, start_month=0,
+                          step_up_percent=0.0, step_every=STEP_UP_EVERY_MONTHS):
+    """
+    Amount invested at the start of each month, as an array of length `months`.
+
+    lumpsum: `amount` once, at start_month
+    sip: `amount` every month from start_month
+    step_up_sip: like sip, raised by step_up_percent every `step_every` months
+    """
+    if mode not in INVESTMENT_MODES:
+        raise ValueError(f"Unknown investment mode: {mode}. Available: {', '.join(INVESTMENT_MODES)}")
+
+    contributions = np.zeros(months)
+    if start_month >= months:
+        return contributions
+    if mode == "lumpsum":
+        contributions[start_month] = amount
+    elif mode == "sip":
+        contributions[start_month:] = amount
+    else:
+        steps = (np.arange(months - start_month) // step_every).astype(np.float64)
+        contributions[start_month:] = amount * (1 + step_up_percent / 100) ** steps
+    return contributions
+
+
+def project_values(monthly_rates, contributions):
+    """
+    Month-end portfolio values for contribution schedules growing at monthly rates.
+
+    Both arguments broadcast over leading axes with months on the last axis,
+    e.g. (funds x 1) rates against (schedules x 1 x months) contributions
+    gives (schedules x funds x months) curves. With G the running product of
+    (1 + rate), the value after month m is
+
+        V_m = G_m * sum_{k <= m} C_k / G_{k-1}
+
+    i.e. one cumprod and one cumsum, whatever the schedule.
+    """
+    contributions = np.asarray(contributions, dtype=np.float64)
+    rates = np.asarray(monthly_rates, dtype=np.float64)
+    months = contributions.shape[-1]
+    if rates.ndim == 0:
+        rates = rates.reshape(1)
+    if rates.shape[-1] == 1:
+        # Constant rate per curve
+        rates = np.broadcast_to(rates, rates.shape[:-1] + (months,))
+
+    growth = np.cumprod(1 + rates, axis=-1)
+    growth_before = growth / (1 + rates)
+    return growth * np.cumsum(contributions / growth_before, axis=-1)
+
+
+def invested_amounts(contributions):
+    """Cumulative amount invested by the end of each month"""
+    return np.cumsum(contributions, axis=-1)
+
+
+def projection_rows(values, invested, first_month=1):
+    """Per-month projection records for one curve"""
+    for month, (value, paid) in enumerate(zip(values, invested), start=first_month):
+        yield {
+            "month": month,
+            "projected_value": round(float(value), 2),
+            "invested_amount": round(float(paid), 2),
+            "return_percentage": round(float((value - paid) / paid * 100), 2) if paid else 0.0
+        }
@@ -0,0 +1,168 @@
+import json
+import os
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+FAST_SPAN = 12
+SLOW_SPAN = 21
+
+# EMA values kept for the convergence-rate statistics (the improvement estimate looks back 10 bars)
+CONVERGENCE_LOOKBACK = 10
+
+
+class StreamingEMAIndicator:
+    """
+    EMA 12/21 crossover state over a 4H close series, updated one bar at a time.
+
+    The state is what pandas' ewm(span, adjust=False) would produce over the
+    same series, to floating-point rounding (y + a*(x - y) here, (1-a)*y + a*x
+    in pandas; see tests/test_regime_indicator.py), but only the bars newer
+    than the state are folded in, each in O(1). The newest bar of every
+    update is treated as provisional (it may still be forming): it is applied
+    on top of the committed state when evaluating, and is replaced by the
+    next update instead of being folded in. Only bars followed by a newer bar
+    are committed.
+    """
+
+    def __init__(self, fast_span=FAST_SPAN, slow_span=SLOW_SPAN, lookback=CONVERGENCE_LOOKBACK):
+        self.fast_span = fast_span
+        self.slow_span = slow_span
+        self.fast_alpha = 2.0 / (fast_span + 1)
+        self.slow_alpha = 2.0 / (slow_span + 1)
+        self.lookback = lookback
+
+        # Committed state (all bars before the provisional one)
+        self.ema_fast = None
+        self.ema_slow = None
+        self.bars = 0
+        self.recent = deque(maxlen=lookback)  # (ema_fast, ema_slow) of the last committed bars
+
+        # The newest, possibly still forming, bar
+        self.provisional_start = None
+        self.provisional_close = None
+
+    def _fold(self, close):
+        if self.ema_fast is None:
+            self.ema_fast = self.ema_slow = close
+        else:
+            self.ema_fast += self.fast_alpha * (close - self.ema_fast)
+            self.ema_slow += self.slow_alpha * (close - self.ema_slow)
+        self.bars += 1
+        self.recent.append((self.ema_fast, self.ema_slow))
+
+    def update(self, closes):
+        """
+        Fold a 4H close series into the state.
+
+        `closes` must start at (or before) the current provisional bar; bars
+        older than it are already part of the state and are skipped.
+        """
+        closes = closes.dropna()
+        if self.provisional_start is not None:
+            closes = closes[closes.index >= self.provisional_start]
+        if closes.empty:
+            return
+
+        if self.provisional_start is not None and closes.index[0] > self.provisional_start:
+            # The provisional bar was not re-delivered but newer bars exist: it is final
+            self._fold(self.provisional_close)
+
+        values = closes.to_numpy(dtype=np.float64)
+        for close in values[:-1]:
+            self._fold(float(close))
+
+        self.provisional_start = closes.index[-1]
+        self.provisional_close = float(values[-1])
+
+    @property
+    def data_points(self):
+        return self.bars + (1 if self.provisional_close is not None else 0)
+
+    def snapshot(self):
+        """
+        Latest close, the EMA values of the most recent bars (provisional bar
+        last, at most lookback of them) and the number of bars seen.
+        """
+        if self.provisional_close is None:
+            return None
+
+        if self.ema_fast is None:
+            fast = slow = self.provisional_close
+        else:
+            fast = self.ema_fast + self.fast_alpha * (self.provisional_close - self.ema_fast)
+            slow = self.ema_slow + self.slow_alpha * (self.provisional_close - self.ema_slow)
+
+        history = list(self.recent) + [(fast, slow)]
+        history = history[-self.lookback:]
+        return {
+            'latest_price': self.provisional_close,
+            'ema_fast': np.array([h[0] for h in history]),
+            'ema_slow': np.array([h[1] for h in history]),
+            'data_points': self.data_points
+        }
+
+    def to_dict(self):
+        return {
+            'fast_span': self.fast_span,
+            'slow_span': self.slow_span,
+            'lookback': self.lookback,
+            'ema_fast': self.ema_fast,
+            'ema_slow': self.ema_slow,
+            'bars': self.bars,
+            'recent': [list(item) for item in self.recent],
+            'provisional_start': self.provisional_start.isoformat() if self.provisional_start is not None else None,
+            'provisional_close': self.provisional_close
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        indicator = cls(state['fast_span'], state['slow_span'], state['lookback'])
+        indicator.ema_fast = state['ema_fast']
+        indicator.ema_slow = state['ema_slow']
+        indicator.bars = state['bars']
+        indicator.recent.extend(tuple(item) for item in state['recent'])
+        if state['provisional_start']:
+            indicator.provisional_start = pd.Timestamp(state['provisional_start'])
+        indicator.provisional_close = state['provisional_close']
+        return indicator
+
+    def save(self, path):
+        """Checkpoint the state as JSON (write-then-rename)"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, fast_span=FAST_SPAN, slow_span=SLOW_SPAN, lookback=CONVERGENCE_LOOKBACK):
+        """Restore a checkpoint, or return None if it is missing or was built with other parameters"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                state = json.load(f)
+            indicator = cls.from_dict(state)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"❌ Ignoring unreadable EMA checkpoint {path}: {e}")
+            return None
+        if (indicator.fast_span, indicator.slow_span, indicator.lookback) != (fast_span, slow_span, lookback):
+            return None
+        return indicator
+
+
+_indicators = {}
+_indicators_lock = threading.Lock()
+
+
+def get_indicator(key, checkpoint_path):
+    """Process-wide indicator per key, restored from its checkpoint on first use"""
+    with _indicators_lock:
+        indicator = _indicators.get(key)
+        if indicator is None:
+            indicator = StreamingEMAIndicator.load(checkpoint_path) or StreamingEMAIndicator()
+            _indicators[key] = indicator
+        return indicator
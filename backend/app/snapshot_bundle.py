@@ -0,0 +1,300 @@
+"""
+Prebuilt snapshot bundle for fast (serverless) cold starts.
+
+A build step writes the funds dataset, the models and the state derived from
+them (fund-name index, per-model feature matrices, full-dataset predictions
+and the factor risk model) into one file:
+
+    MAGIC | header length (uint64) | JSON header | 64-byte aligned sections
+
+At runtime the file is memory-mapped copy-on-write. Numeric and boolean
+columns and all derived arrays are zero-copy views of the mapping, string
+columns are decoded from one UTF-8 blob each, and the tree-ensemble models
+are stored compiled (app.compiled_models), so loading them needs neither
+unpickling nor scikit-learn. Other models are pickled with their NumPy
+buffers out-of-band in the mapping. No CSV is parsed and nothing is
+recomputed.
+
+    python -m app.snapshot_bundle build [--output PATH]
+    python -m app.snapshot_bundle info [PATH]
+"""
+
+import argparse
+import json
+import mmap
+import os
+import pickle
+import struct
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from .compiled_models import COMPILED_ARRAYS, CompiledTreeEnsemble
+from .data_store import DEFAULT_DATA_PATH, file_sha256, name_index, register_snapshot
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODELS_DIR = os.path.join(BACKEND_DIR, 'models')
+MODEL_TARGETS = ['return_1yr', 'return_3yr', 'return_5yr']
+
+# Bundle used at startup when it exists (build it with `python -m app.snapshot_bundle build`)
+SNAPSHOT_BUNDLE_PATH = os.getenv("SNAPSHOT_BUNDLE_PATH", os.path.join(BACKEND_DIR, 'data', 'snapshot.bundle'))
+
+MAGIC = b"MFBUNDLE"
+VERSION = 2
+ALIGNMENT = 64
+
+
+class SnapshotBundleError(Exception):
+    """Raised when a snapshot bundle is missing, malformed or out of date"""
+
+
+def _model_path(target):
+    return os.path.join(MODELS_DIR, f"mutual_fund_model_{target}.pkl")
+
+
+def _source_hashes(data_path):
+    """Content hashes of the files a bundle is built from (the staleness check at load time)"""
+    paths = {"data": data_path, **{target: _model_path(target) for target in MODEL_TARGETS}}
+    return {name: file_sha256(path) for name, path in paths.items() if os.path.exists(path)}
+
+
+class _SectionWriter:
+    def __init__(self):
+        self.sections = {}
+        self.chunks = []
+        self.size = 0
+
+    def add(self, name, data, dtype=None, shape=None):
+        padding = -self.size % ALIGNMENT
+        if padding:
+            self.chunks.append(b"\0" * padding)
+            self.size += padding
+        raw = memoryview(data).cast("B")
+        self.sections[name] = {"offset": self.size, "length": raw.nbytes, "dtype": dtype, "shape": shape}
+        self.chunks.append(raw)
+        self.size += raw.nbytes
+
+    def add_array(self, name, array):
+        array = np.ascontiguousarray(array)
+        self.add(name, array, array.dtype.str, list(array.shape))
+
+
+def build_bundle(output_path=SNAPSHOT_BUNDLE_PATH, data_path=None):
+    """Load the dataset and models, precompute the derived state and write the bundle"""
+    from .diversified_portfolio_system import DiversifiedMutualFundSystem
+
+    data_path = os.path.abspath(data_path or DEFAULT_DATA_PATH)
+    system = DiversifiedMutualFundSystem(data_path, load_from_pickle=True)
+    df = system.df
+
+    models = {}
+    for target in MODEL_TARGETS:
+        with open(_model_path(target), 'rb') as f:
+            models[target] = pickle.load(f)
+
+    writer = _SectionWriter()
+
+    columns = []
+    for name in df.columns:
+        values = df[name].to_numpy()
+        if values.dtype.kind in "biuf":
+            writer.add_array(f"column/{name}", values)
+            columns.append({"name": name, "kind": "array"})
+        else:
+            encoded = [str(value).encode("utf-8") for value in values]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            offsets[1:] = np.cumsum([len(item) for item in encoded])
+            writer.add(f"column/{name}", b"".join(encoded))
+            writer.add_array(f"offsets/{name}", offsets)
+            columns.append({"name": name, "kind": "strings"})
+
+    writer.add_array("name_index", name_index(df).to_numpy(dtype=np.int64))
+    for target in MODEL_TARGETS:
+        writer.add_array(f"features/{target}", system._feature_matrix(target))
+        writer.add_array(f"predictions/{target}", system._dataset_predictions(target))
+    loadings, idiosyncratic = system._risk_model()
+    writer.add_array("risk_model/loadings", loadings)
+    writer.add_array("risk_model/idiosyncratic", idiosyncratic)
+
+    # Tree ensembles are stored compiled (plain arrays); anything else is pickled
+    model_entries, pickled = {}, {}
+    for target, model_data in models.items():
+        entry = {key: value for key, value in model_data.items() if key != 'model'}
+        try:
+            compiled = CompiledTreeEnsemble.from_sklearn(model_data['model'])
+        except ValueError as e:
+            print(f"❌ Pickling {target} model: {e}")
+            pickled[target] = model_data['model']
+            entry["compiled"] = None
+        else:
+            for name, array in compiled.arrays().items():
+                writer.add_array(f"compiled/{target}/{name}", array)
+            entry["compiled"] = compiled.metadata()
+        model_entries[target] = entry
+
+    buffers = []
+    writer.add("models", pickle.dumps(pickled, protocol=5, buffer_callback=buffers.append))
+    for i, buffer in enumerate(buffers):
+        writer.add(f"model_buffer/{i}", buffer.raw())
+
+    header = json.dumps({
+        "version": VERSION,
+        "created_at": datetime.now().isoformat(),
+        "rows": len(df),
+        "columns": columns,
+        "targets": MODEL_TARGETS,
+        "models": model_entries,
+        "model_buffers": len(buffers),
+        "source_sha256": _source_hashes(data_path),
+        "sections": writer.sections
+    }).encode("utf-8")
+
+    os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    data_start = len(MAGIC) + 8 + len(header)
+    data_start += -data_start % ALIGNMENT
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        f.write(b"\0" * (data_start - len(MAGIC) - 8 - len(header)))
+        for chunk in writer.chunks:
+            f.write(chunk)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+class SnapshotBundle:
+    """Memory-mapped (copy-on-write) view of a snapshot bundle"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            # Copy-on-write: pages stay shared with the file until written (pandas
+            # writes into column arrays in place, e.g. in median), the file never is
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise SnapshotBundleError(f"{path} is not a snapshot bundle")
+        (header_length,) = struct.unpack_from("<Q", self._mmap, len(MAGIC))
+        header_start = len(MAGIC) + 8
+        self.header = json.loads(self._mmap[header_start:header_start + header_length])
+        if self.header["version"] != VERSION:
+            raise SnapshotBundleError(f"Unsupported bundle version {self.header['version']}")
+        self._data_start = header_start + header_length + (-(header_start + header_length) % ALIGNMENT)
+        self._models = None
+
+    def _buffer(self, name):
+        section = self.header["sections"][name]
+        start = self._data_start + section["offset"]
+        return memoryview(self._mmap)[start:start + section["length"]]
+
+    def array(self, name):
+        section = self.header["sections"][name]
+        dtype = np.dtype(section["dtype"])
+        return np.frombuffer(self._buffer(name), dtype=dtype).reshape(section["shape"])
+
+    def check_sources(self, data_path=None):
+        """Raise SnapshotBundleError when a source file present here differs from the one bundled"""
+        current = _source_hashes(os.path.abspath(data_path or DEFAULT_DATA_PATH))
+        for name, digest in self.header["source_sha256"].items():
+            if name in current and current[name] != digest:
+                raise SnapshotBundleError(f"Bundle is out of date ({name} changed); rebuild it")
+
+    def funds_data(self):
+        """The dataset as a DataFrame whose numeric blocks are views of the mapping"""
+        data = {}
+        for column in self.header["columns"]:
+            name = column["name"]
+            if column["kind"] == "array":
+                data[name] = self.array(f"column/{name}")
+            else:
+                blob = bytes(self._buffer(f"column/{name}"))
+                offsets = self.array(f"offsets/{name}")
+                values = np.empty(len(offsets) - 1, dtype=object)
+                values[:] = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(values))]
+                data[name] = values
+        return pd.DataFrame(data, copy=False)
+
+    @property
+    def models(self):
+        """{target: model data} as stored in the model pickles, with compiled models where available"""
+        if self._models is None:
+            buffers = [self._buffer(f"model_buffer/{i}") for i in range(self.header["model_buffers"])]
+            pickled = pickle.loads(self._buffer("models"), buffers=buffers)
+            self._models = {}
+            for target, entry in self.header["models"].items():
+                model_data = {key: value for key, value in entry.items() if key != "compiled"}
+                if entry["compiled"] is None:
+                    model_data["model"] = pickled[target]
+                else:
+                    arrays = {name: self.array(f"compiled/{target}/{name}") for name in COMPILED_ARRAYS}
+                    model_data["model"] = CompiledTreeEnsemble.from_arrays(entry["compiled"], arrays)
+                self._models[target] = model_data
+        return self._models
+
+    @property
+    def name_positions(self):
+        return self.array("name_index")
+
+    @property
+    def feature_matrices(self):
+        return {target: self.array(f"features/{target}") for target in self.header["targets"]}
+
+    @property
+    def predictions(self):
+        return {target: self.array(f"predictions/{target}") for target in self.header["targets"]}
+
+    @property
+    def risk_model(self):
+        return self.array("risk_model/loadings"), self.array("risk_model/idiosyncratic")
+
+
+def open_snapshot_bundle(path=SNAPSHOT_BUNDLE_PATH, data_path=None):
+    """
+    Open the bundle and install its dataset as the shared funds snapshot.
+    Returns None (and the caller loads from the CSV and model pickles) when
+    there is no bundle or it cannot be used.
+    """
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        bundle = SnapshotBundle(path)
+        bundle.check_sources(data_path)
+        register_snapshot(bundle.funds_data(), data_path, bundle.name_positions)
+    except (SnapshotBundleError, OSError, ValueError, KeyError) as e:
+        print(f"❌ Ignoring snapshot bundle {path}: {e}")
+        return None
+    print(f"✅ Snapshot bundle {path} ({bundle.header['created_at']})")
+    return bundle
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect the deployment snapshot bundle")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="write the bundle from the CSV and model pickles")
+    build.add_argument("--output", default=SNAPSHOT_BUNDLE_PATH)
+    build.add_argument("--data", default=None, help="funds CSV (default: data/mutual_funds_cleaned.csv)")
+    info = subparsers.add_parser("info", help="list the sections of a bundle")
+    info.add_argument("path", nargs="?", default=SNAPSHOT_BUNDLE_PATH)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        path = build_bundle(args.output, args.data)
+        print(f"✅ Wrote {path} ({os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+    else:
+        bundle = SnapshotBundle(args.path)
+        print(f"📦 {args.path}: {bundle.header['rows']} funds, built {bundle.header['created_at']}")
+        sections = bundle.header["sections"]
+        for name, section in sections.items():
+            if name.startswith("model_buffer/"):
+                continue
+            shape = f" {tuple(section['shape'])} {section['dtype']}" if section["shape"] is not None else ""
+            print(f"   {name:<40}{section['length'] / 1024:>10.1f} KB{shape}")
+        model_buffers = [section["length"] for name, section in sections.items() if name.startswith("model_buffer/")]
+        if model_buffers:
+            print(f"   {f'model_buffer/* ({len(model_buffers)})':<40}{sum(model_buffers) / 1024:>10.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
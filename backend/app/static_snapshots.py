@@ -0,0 +1,302 @@
+"""
+Static snapshots of the dataset-only GET endpoints.
+
+The analytics endpoints below are pure functions of the funds dataset. A
+deploy step renders them once, through the same handlers and JSON encoding
+as the live API, to versioned files:
+
+    <dir>/manifest.json                        current version, dataset hash, files
+    <dir>/<version>/api/amcs.json[.gz]         one file per endpoint (gzip with --gzip)
+
+The version is a hash of the rendered content, so a new dataset gives new
+file names and the versioned files can be cached forever by a CDN; the
+frontend reads manifest.json (short-lived) to find the current version.
+
+At runtime, when STATIC_SNAPSHOT_DIR holds a manifest built from the
+dataset being served, requests for these endpoints are answered from the
+files without running the handler, loading the models (first request on
+serverless) or taking an admission slot: gzip when the client accepts it,
+with an ETag, Cache-Control and 304s for If-None-Match. The files are also
+served under /static-snapshots/ for use as a CDN origin. A manifest built
+from a different dataset is ignored.
+
+    python -m app.static_snapshots build [--output DIR] [--gzip]
+    python -m app.static_snapshots info [DIR]
+"""
+
+import argparse
+import gzip
+import hashlib
+import inspect
+import json
+import os
+import shutil
+import threading
+from datetime import datetime
+
+from .data_store import DEFAULT_DATA_PATH, file_sha256
+from .instrumentation import format_labels, metrics
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Directory of prebuilt endpoint snapshots ("" disables serving them)
+STATIC_SNAPSHOT_DIR = os.getenv("STATIC_SNAPSHOT_DIR", os.path.join(BACKEND_DIR, 'data', 'static_snapshots'))
+
+# Cache-Control max-age of the snapshot-served endpoints and of manifest.json
+STATIC_SNAPSHOT_MAX_AGE_SECONDS = int(os.getenv("STATIC_SNAPSHOT_MAX_AGE_SECONDS", 300))
+
+STATIC_ENDPOINTS = [
+    "/api/descriptive-analysis",
+    "/api/enhanced-analysis",
+    "/api/market-trends",
+    "/api/categories",
+    "/api/amcs",
+    "/api/dashboard-data"
+]
+
+MANIFEST_NAME = "manifest.json"
+URL_PREFIX = "/static-snapshots"
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _snapshot_file(path):
+    """Relative file name of an endpoint's snapshot ("/api/amcs" -> "api/amcs.json")"""
+    return path.lstrip("/") + ".json"
+
+
+async def render_endpoints(app, paths=STATIC_ENDPOINTS):
+    """{path: response body} rendered by the app's own GET handlers and response class"""
+    from fastapi.datastructures import DefaultPlaceholder
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.routing import APIRoute
+    from starlette.concurrency import run_in_threadpool
+
+    routes = {route.path: route for route in app.routes if isinstance(route, APIRoute) and "GET" in route.methods}
+    bodies = {}
+    for path in paths:
+        route = routes[path]
+        if inspect.iscoroutinefunction(route.endpoint):
+            result = await route.endpoint()
+        else:
+            result = await run_in_threadpool(route.endpoint)
+        response_class = route.response_class
+        if isinstance(response_class, DefaultPlaceholder):
+            response_class = response_class.value
+        bodies[path] = response_class(content=jsonable_encoder(result)).body
+    return bodies
+
+
+def write_snapshots(bodies, output_dir=STATIC_SNAPSHOT_DIR, data_path=None, compress=False):
+    """Write the versioned files and the manifest; returns the manifest"""
+    digest = hashlib.sha256()
+    for path in sorted(bodies):
+        digest.update(path.encode() + b"\0" + bodies[path] + b"\0")
+    version = digest.hexdigest()[:12]
+
+    version_dir = os.path.join(output_dir, version)
+    if os.path.exists(version_dir):
+        shutil.rmtree(version_dir)
+    files = {}
+    for path, body in bodies.items():
+        name = _snapshot_file(path)
+        target = os.path.join(version_dir, name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            f.write(body)
+        entry = {"file": f"{version}/{name}", "sha256": hashlib.sha256(body).hexdigest(), "bytes": len(body)}
+        if compress:
+            # mtime=0 keeps the compressed bytes reproducible
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            with open(target + ".gz", 'wb') as f:
+                f.write(compressed)
+            entry["gzip_bytes"] = len(compressed)
+        files[path] = entry
+
+    data_path = os.path.abspath(data_path or DEFAULT_DATA_PATH)
+    manifest = {
+        "version": version,
+        "created_at": datetime.now().isoformat(),
+        "data_sha256": file_sha256(data_path) if os.path.exists(data_path) else None,
+        "files": files
+    }
+    tmp_path = os.path.join(output_dir, MANIFEST_NAME + ".tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, os.path.join(output_dir, MANIFEST_NAME))
+    return manifest
+
+
+class _Response:
+    __slots__ = ("body", "gzip_body", "etag", "cache_control")
+
+    def __init__(self, body, gzip_body, etag, cache_control):
+        self.body = body
+        self.gzip_body = gzip_body
+        self.etag = etag
+        self.cache_control = cache_control
+
+
+class StaticSnapshotStore:
+    """The snapshot files of one manifest, loaded into memory on first use"""
+
+    def __init__(self, snapshot_dir=STATIC_SNAPSHOT_DIR, data_path=None):
+        self.snapshot_dir = snapshot_dir
+        self.data_path = data_path
+        self.version = None
+        self._responses = None
+        self._lock = threading.Lock()
+        self._counts = {}  # (path, encoding) -> responses
+
+    @property
+    def responses(self):
+        if self._responses is None:
+            with self._lock:
+                if self._responses is None:
+                    self._responses = self._load()
+        return self._responses
+
+    def _load(self):
+        manifest_path = os.path.join(self.snapshot_dir, MANIFEST_NAME) if self.snapshot_dir else None
+        if not manifest_path or not os.path.exists(manifest_path):
+            return {}
+        try:
+            with open(manifest_path, 'rb') as f:
+                manifest_body = f.read()
+            manifest = json.loads(manifest_body)
+            data_path = os.path.abspath(self.data_path or DEFAULT_DATA_PATH)
+            if manifest["data_sha256"] and os.path.exists(data_path) and file_sha256(data_path) != manifest["data_sha256"]:
+                print(f"❌ Ignoring static snapshots in {self.snapshot_dir}: built from a different dataset")
+                return {}
+
+            responses = {}
+            for path, entry in manifest["files"].items():
+                file_path = os.path.join(self.snapshot_dir, entry["file"])
+                with open(file_path, 'rb') as f:
+                    body = f.read()
+                gzip_body = None
+                if os.path.exists(file_path + ".gz"):
+                    with open(file_path + ".gz", 'rb') as f:
+                        gzip_body = f.read()
+                etag = f'"{entry["sha256"][:16]}"'
+                responses[path] = _Response(body, gzip_body, etag, f"public, max-age={STATIC_SNAPSHOT_MAX_AGE_SECONDS}")
+                responses[f"{URL_PREFIX}/{entry['file']}"] = _Response(body, gzip_body, etag, IMMUTABLE_CACHE_CONTROL)
+            manifest_etag = f'"{hashlib.sha256(manifest_body).hexdigest()[:16]}"'
+            responses[f"{URL_PREFIX}/{MANIFEST_NAME}"] = _Response(
+                manifest_body, None, manifest_etag, f"public, max-age={STATIC_SNAPSHOT_MAX_AGE_SECONDS}"
+            )
+        except (OSError, ValueError, KeyError) as e:
+            print(f"❌ Ignoring static snapshots in {self.snapshot_dir}: {e}")
+            return {}
+
+        self.version = manifest["version"]
+        print(f"✅ Serving {len(manifest['files'])} endpoints from static snapshots {self.version}")
+        return responses
+
+    def serves(self, scope):
+        return scope["type"] == "http" and scope["method"] in ("GET", "HEAD") and scope["path"] in self.responses
+
+    def count(self, path, encoding):
+        key = (path, encoding)
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def metric_lines(self):
+        with self._lock:
+            counts = sorted(self._counts.items())
+        lines = [
+            "# HELP static_snapshot_responses_total Responses served from static snapshots by path and encoding.",
+            "# TYPE static_snapshot_responses_total counter"
+        ]
+        for (path, encoding), count in counts:
+            lines.append(f"static_snapshot_responses_total{{{format_labels(path=path, encoding=encoding)}}} {count}")
+        return lines
+
+
+static_snapshot_store = StaticSnapshotStore()
+
+
+def _header(scope, name):
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return ""
+
+
+class StaticSnapshotMiddleware:
+    """Answers snapshot-backed GET / HEAD requests from memory; everything else passes through"""
+
+    def __init__(self, app, store=static_snapshot_store):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if not self.store.serves(scope):
+            await self.app(scope, receive, send)
+            return
+
+        response = self.store.responses[scope["path"]]
+        headers = [
+            (b"etag", response.etag.encode()),
+            (b"cache-control", response.cache_control.encode())
+        ]
+        if response.gzip_body is not None:
+            headers.append((b"vary", b"Accept-Encoding"))
+
+        if_none_match = _header(scope, b"if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or response.etag in if_none_match):
+            self.store.count(scope["path"], "not_modified")
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        body = response.body
+        encoding = "identity"
+        if response.gzip_body is not None and "gzip" in _header(scope, b"accept-encoding"):
+            body = response.gzip_body
+            encoding = "gzip"
+            headers.append((b"content-encoding", b"gzip"))
+        headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+
+        self.store.count(scope["path"], encoding)
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": b"" if scope["method"] == "HEAD" else body})
+
+
+def install_static_snapshots(app):
+    """Serve the endpoints of a prebuilt manifest from STATIC_SNAPSHOT_DIR (a no-op without one)"""
+    if not STATIC_SNAPSHOT_DIR:
+        return
+    app.add_middleware(StaticSnapshotMiddleware)
+    metrics.add_collector(static_snapshot_store.metric_lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect the static endpoint snapshots")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build = subparsers.add_parser("build", help="render the dataset-only endpoints to versioned JSON files")
+    build.add_argument("--output", default=STATIC_SNAPSHOT_DIR)
+    build.add_argument("--gzip", action="store_true", help="also write pre-compressed .gz files")
+    info = subparsers.add_parser("info", help="show the manifest of a snapshot directory")
+    info.add_argument("path", nargs="?", default=STATIC_SNAPSHOT_DIR)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        import asyncio
+        from .main import app, ensure_initialized
+
+        ensure_initialized()
+        bodies = asyncio.run(render_endpoints(app))
+        os.makedirs(args.output, exist_ok=True)
+        manifest = write_snapshots(bodies, args.output, compress=args.gzip)
+        print(f"✅ Wrote {len(bodies)} endpoint snapshots, version {manifest['version']}, to {args.output}")
+    else:
+        with open(os.path.join(args.path, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+        print(f"📦 {args.path}: version {manifest['version']}, built {manifest['created_at']}")
+        for path, entry in manifest["files"].items():
+            compressed = f"{entry['gzip_bytes'] / 1024:>10.1f} KB gzip" if "gzip_bytes" in entry else ""
+            print(f"   {path:<28}{entry['bytes'] / 1024:>10.1f} KB{compressed}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,394 @@
+import numpy as np
+
+from .projections import contribution_schedule, lumpsum_growth, monthly_rate, project_values
+from .portfolio_optimizer import MARKET_VOLATILITY, MIN_IDIOSYNCRATIC_SHARE, estimate_fund_beta, estimate_fund_volatility
+
+# Historical return adjustments based on market regime, by months waited.
+# These are based on historical analysis of how different regimes affect returns;
+# waits in between are interpolated and longer waits keep the 6-month adjustment.
+REGIME_ADJUSTMENTS = {
+    "bull": {
+        1: 0.02,   # +2% for waiting in bull market (missed gains)
+        3: 0.05,   # +5%
+        6: 0.10    # +10%
+    },
+    "sideways": {
+        1: 0.0,    # No significant impact
+        3: -0.01,  # Slight negative
+        6: -0.02   # Slight negative
+    },
+    "volatile": {
+        1: -0.03,  # -3% (waiting might be better in volatile market)
+        3: -0.05,  # -5%
+        6: -0.08   # -8%
+    }
+}
+
+DEFAULT_WAIT_MONTHS = [1, 3, 6]
+
+# Opportunity cost: money sitting idle during the wait period earns a
+# conservative 4% annual return (FD/savings account)
+IDLE_ANNUAL_RETURN = 0.04
+
+# Waiting never leaves less than this much of the horizon invested
+MIN_INVESTED_YEARS = 0.5
+
+# Return (%) assumed when a fund can be scored neither by a model nor from history
+DEFAULT_ANNUAL_RETURN = 10.0
+
+MODEL_HORIZONS = [1, 3, 5]
+
+
+def regime_adjustment(market_regime, wait_months):
+    """Return adjustment (fraction) for each wait period, interpolated between the tabulated waits"""
+    table = REGIME_ADJUSTMENTS.get(market_regime, REGIME_ADJUSTMENTS["sideways"])
+    knots = [0] + sorted(table)
+    values = [0.0] + [table[k] for k in sorted(table)]
+    return np.interp(np.asarray(wait_months, dtype=np.float64), knots, values)
+
+
+def predicted_returns_grid(model_loader, funds, horizons):
+    """
+    Predicted annual return (%) of each fund for each horizon, as a
+    (funds x horizons) array.
+
+    Every available horizon model is run once over all funds; funds a model
+    cannot score fall back to their historical return for that horizon.
+    Horizons between the model horizons are interpolated linearly (and
+    clamped outside them), expressed as one (models x horizons) weight matrix.
+    """
+    horizons = np.asarray(horizons, dtype=np.float64)
+    model_horizons = [h for h in MODEL_HORIZONS if f'return_{h}yr' in model_loader.models]
+    if not model_horizons:
+        return np.full((len(funds), len(horizons)), DEFAULT_ANNUAL_RETURN)
+
+    per_model = np.empty((len(funds), len(model_horizons)))
+    for j, h in enumerate(model_horizons):
+        target_col = f'return_{h}yr'
+        try:
+            predictions = model_loader.predict_fund_returns_batch(funds, h)
+        except Exception:
+            predictions = np.full(len(funds), np.nan)
+        # Fallback to historical return
+        history = funds[target_col].to_numpy(dtype=np.float64) if target_col in funds.columns else np.full(len(funds), np.nan)
+        per_model[:, j] = np.where(np.isnan(predictions), np.where(np.isnan(history), DEFAULT_ANNUAL_RETURN, history), predictions)
+
+    weights = np.array([np.interp(horizons, model_horizons, unit) for unit in np.eye(len(model_horizons))])
+    return per_model @ weights
+
+
+def simulate_wait_grid(base_returns, investment_amount, horizons, wait_months, market_regime):
+    """
+    Invest-now vs wait-then-invest outcomes over a (wait x fund x horizon) grid.
+
+    base_returns: (funds x horizons) predicted annual returns in %
+    Returns a dict of broadcast arrays: invest_now_* are (funds x horizons),
+    wait_* and total_wait_* are (waits x funds x horizons), idle_earnings and
+    effective_duration are (waits x horizons) and invested is (horizons,).
+    """
+    horizons = np.asarray(horizons, dtype=np.float64)
+    waits = np.asarray(wait_months, dtype=np.float64)
+    rate = np.asarray(base_returns, dtype=np.float64) / 100
+    adjustment = regime_adjustment(market_regime, waits)
+
+    # Investing now: full duration
+    invest_now_value = investment_amount * lumpsum_growth(base_returns, horizons)
+    invest_now_profit = invest_now_value - investment_amount
+
+    # Waiting: reduced duration (horizon - wait_months/12) at the regime-adjusted return
+    effective_duration = np.maximum(MIN_INVESTED_YEARS, horizons[None, :] - waits[:, None] / 12)  # (W x H)
+    wait_return = np.asarray(base_returns, dtype=np.float64)[None, :, :] + adjustment[:, None, None] * 100
+    wait_rate = wait_return / 100
+    wait_value = investment_amount * lumpsum_growth(wait_return, effective_duration[:, None, :])
+    wait_profit = wait_value - investment_amount
+
+    idle_value = investment_amount * (1 + IDLE_ANNUAL_RETURN * (waits / 12))  # (W,)
+    idle_earnings = np.broadcast_to((idle_value - investment_amount)[:, None], effective_duration.shape)
+    total_wait_value = wait_value + idle_earnings[:, None, :]
+    total_wait_profit = total_wait_value - investment_amount
+
+    return {
+        "invested": np.full(len(horizons), float(investment_amount)),
+        "invest_now_rate": rate,
+        "invest_now_value": invest_now_value,
+        "invest_now_profit": invest_now_profit,
+        "wait_rate": wait_rate,
+        "effective_duration": effective_duration,
+        "wait_value": wait_value,
+        "wait_profit": wait_profit,
+        "idle_earnings": idle_earnings,
+        "total_wait_value": total_wait_value,
+        "total_wait_profit": total_wait_profit
+    }
+
+
+# (waits x funds x months) projected at once by simulate_wait_schedule_grid
+SCHEDULE_CHUNK_ELEMENTS = 2_000_000
+
+
+def simulate_wait_schedule_grid(base_returns, instalment, horizons, wait_months, market_regime,
+                                mode="sip", step_up_percent=0.0):
+    """
+    simulate_wait_grid for SIP and step-up SIP schedules, on the monthly
+    projection engine.
+
+    Investing now runs the schedule from month 0 to the horizon. Waiting
+    holds the instalments due during the wait in cash (earning the idle
+    rate), invests them as one catch-up amount when the wait ends and then
+    continues the schedule, at the regime-adjusted return, until
+    max(horizon, wait + 6 months). Both sides invest the same total, so
+    profits compare directly. Waits are projected in chunks of at most
+    SCHEDULE_CHUNK_ELEMENTS (waits x funds x months) values. Returns the
+    same keys and shapes as simulate_wait_grid.
+    """
+    horizons = np.asarray(horizons, dtype=np.float64)
+    waits = np.asarray(wait_months, dtype=np.int64)
+    base_returns = np.asarray(base_returns, dtype=np.float64)
+    n_funds, n_waits, n_horizons = base_returns.shape[0], len(waits), len(horizons)
+    adjustment = regime_adjustment(market_regime, waits)
+
+    invest_now_value = np.empty((n_funds, n_horizons))
+    wait_value = np.empty((n_waits, n_funds, n_horizons))
+    idle_earnings = np.empty((n_waits, n_horizons))
+    effective_duration = np.empty((n_waits, n_horizons))
+    invested = np.empty(n_horizons)
+    wait_rate = (base_returns[None, :, :] + adjustment[:, None, None] * 100) / 100
+
+    for h, horizon in enumerate(horizons):
+        months = max(1, int(round(horizon * 12)))
+        ends = np.maximum(months, waits + int(MIN_INVESTED_YEARS * 12))
+        span = int(ends.max())
+
+        schedule = contribution_schedule(months, mode, instalment, step_up_percent=step_up_percent)
+        invested[h] = schedule.sum()
+        effective_duration[:, h] = (ends - waits) / 12
+
+        now_curves = project_values(monthly_rate(base_returns[:, h])[:, None], schedule)  # (funds x months)
+        invest_now_value[:, h] = now_curves[:, -1]
+
+        padded = np.zeros(span)
+        padded[:months] = schedule
+        due = np.cumsum(padded)
+        wait_monthly_rate = monthly_rate(wait_rate[:, :, h] * 100)
+
+        # Waits in chunks, each projected only as far as its longest end
+        chunk = max(1, SCHEDULE_CHUNK_ELEMENTS // (n_funds * span))
+        for start in range(0, n_waits, chunk):
+            w = waits[start:start + chunk]
+            chunk_span = int(ends[start:start + chunk].max())
+            month_index = np.arange(chunk_span)
+
+            # Deferred schedules: everything due before the wait ends is invested at the end of the wait
+            deferred = np.where(month_index[None, :] >= w[:, None], padded[None, :chunk_span], 0.0)  # (waits x span)
+            rows = np.flatnonzero(w < chunk_span)
+            deferred[rows, w[rows]] = due[w[rows]]
+
+            # Idle cash: each deferred instalment earns the idle rate until the wait ends
+            held_months = np.clip(w[:, None] - month_index[None, :], 0, None)
+            idle_earnings[start:start + chunk, h] = (padded[None, :chunk_span] * IDLE_ANNUAL_RETURN * held_months / 12).sum(axis=1)
+
+            wait_curves = project_values(wait_monthly_rate[start:start + chunk, :, None], deferred[:, None, :])  # (waits x funds x span)
+            last = (ends[start:start + chunk] - 1)[:, None, None].repeat(n_funds, axis=1)
+            wait_value[start:start + chunk, :, h] = np.take_along_axis(wait_curves, last, axis=2)[:, :, 0]
+
+    invest_now_profit = invest_now_value - invested
+    wait_profit = wait_value - invested
+    total_wait_value = wait_value + idle_earnings[:, None, :]
+
+    return {
+        "invested": invested,
+        "invest_now_rate": base_returns / 100,
+        "invest_now_value": invest_now_value,
+        "invest_now_profit": invest_now_profit,
+        "wait_rate": wait_rate,
+        "effective_duration": effective_duration,
+        "wait_value": wait_value,
+        "wait_profit": wait_profit,
+        "idle_earnings": idle_earnings,
+        "total_wait_value": total_wait_value,
+        "total_wait_profit": total_wait_value - invested
+    }
+
+
+# Market factor (annualized drift shift and volatility) while the detected regime
+# persists; after REGIME_PERSISTENCE_MONTHS the market reverts to neutral
+MONTE_CARLO_REGIMES = {
+    "bull": {"market_drift": 0.12, "market_volatility": 0.12},
+    "sideways": {"market_drift": 0.0, "market_volatility": 0.15},
+    "volatile": {"market_drift": -0.12, "market_volatility": 0.25}
+}
+NEUTRAL_MARKET_VOLATILITY = MARKET_VOLATILITY / 100
+REGIME_PERSISTENCE_MONTHS = 6
+
+MONTE_CARLO_PERCENTILES = [5, 25, 50, 75, 95]
+
+# Upper bound on random draws held in memory at once (paths x funds x pieces)
+MONTE_CARLO_CHUNK_ELEMENTS = 4_000_000
+
+# Streaming histograms of log value multiples: each group's range spans this many
+# standard deviations either side of its expected log multiple, in HISTOGRAM_BINS bins
+HISTOGRAM_SD_RANGE = 6.0
+HISTOGRAM_BINS = 1500
+
+
+def _segment_pieces(horizon_months, waits):
+    """
+    Split the timeline at every segment boundary so each invest-now / wait
+    segment is an exact union of consecutive disjoint pieces.
+
+    Returns (piece starts, piece ends, segment first piece, segment end piece).
+    The first segment is investing now over [0, T); segment i+1 invests after
+    waits[i] months until max(T, wait + 6 months).
+    """
+    ends = [max(horizon_months, w + int(MIN_INVESTED_YEARS * 12)) for w in waits]
+    last = max([horizon_months] + ends)
+    cuts = sorted(c for c in set([0, horizon_months, REGIME_PERSISTENCE_MONTHS] + list(waits) + ends) if c <= last)
+    starts, stops = np.array(cuts[:-1]), np.array(cuts[1:])
+
+    segments = [(0, horizon_months)] + list(zip(waits, ends))
+    first_piece = np.array([cuts.index(a) for a, _ in segments])
+    end_piece = np.array([cuts.index(b) for _, b in segments])
+    return starts, stops, first_piece, end_piece
+
+
+class _LogHistogram:
+    """Fixed-bin histogram of log multiples for many groups (each with its own range), updated chunk by chunk"""
+
+    def __init__(self, lo, hi, bins=HISTOGRAM_BINS):
+        self.lo = np.asarray(lo, dtype=np.float64)
+        self.bins = bins
+        self.width = np.maximum(np.asarray(hi, dtype=np.float64) - self.lo, 1e-6) / bins
+        self.counts = np.zeros((len(self.lo), bins), dtype=np.int64)
+
+    def update(self, values):
+        """values: (paths x groups) log multiples"""
+        idx = np.clip(((values - self.lo) / self.width).astype(np.int64), 0, self.bins - 1)
+        flat = (idx + np.arange(values.shape[1]) * self.bins).ravel()
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape)
+
+    def percentiles(self, qs):
+        """(groups x len(qs)) percentiles, linearly interpolated within bins"""
+        cdf = np.cumsum(self.counts, axis=1)
+        total = cdf[:, -1:]
+        result = np.empty((len(cdf), len(qs)))
+        for k, q in enumerate(qs):
+            target = total[:, 0] * q / 100
+            b = np.minimum((cdf < target[:, None]).sum(axis=1), self.bins - 1)
+            below = np.where(b > 0, cdf[np.arange(len(cdf)), b - 1], 0)
+            in_bin = np.maximum(self.counts[np.arange(len(cdf)), b], 1)
+            result[:, k] = self.lo + (b + (target - below) / in_bin) * self.width
+        return result
+
+
+def simulate_wait_monte_carlo(base_returns, funds, investment_amount, horizon, wait_months,
+                              market_regime, num_paths=10000, seed=None,
+                              chunk_elements=MONTE_CARLO_CHUNK_ELEMENTS):
+    """
+    Monte Carlo version of the invest-now vs wait comparison for one horizon.
+
+    Monthly log returns of fund f are alpha_f + beta_f * m_t + e_t: a market
+    factor m_t (drift and volatility conditioned on the regime for its first
+    REGIME_PERSISTENCE_MONTHS) and an idiosyncratic term sized from the fund's
+    standard_deviation. alpha_f is set so the expected annual growth in a
+    neutral market equals the predicted return. Normal increments add up
+    exactly, so instead of simulating month by month each path draws one
+    market and one idiosyncratic sum per disjoint piece of the timeline and
+    every segment is an exact sum of pieces.
+
+    Paths are generated in chunks of at most `chunk_elements` draws from one
+    seeded generator; results are reduced into exact win counts and streaming
+    histograms, so memory does not grow with num_paths. Every segment's log
+    return is normal with a known mean and standard deviation (returned as
+    segment_log_mean / segment_log_sd), which sizes each histogram's range,
+    so however far a long horizon compounds the bands are accurate to one bin
+    width (2 * HISTOGRAM_SD_RANGE / HISTOGRAM_BINS standard deviations of the
+    log multiple) on top of sampling error; see tests/test_what_if.py.
+
+    base_returns: (funds,) predicted annual returns in % for this horizon
+    """
+    waits = [int(w) for w in wait_months]
+    horizon_months = max(1, int(round(horizon * 12)))
+    n_funds, n_waits = len(funds), len(waits)
+
+    mu = np.asarray(base_returns, dtype=np.float64) / 100
+    volatility = estimate_fund_volatility(funds) / 100
+    beta = estimate_fund_beta(funds)
+    idio_var = np.maximum(volatility ** 2 - (beta * NEUTRAL_MARKET_VOLATILITY) ** 2,
+                          (MIN_IDIOSYNCRATIC_SHARE * volatility) ** 2)
+    total_var = (beta * NEUTRAL_MARKET_VOLATILITY) ** 2 + idio_var
+    alpha = (np.log1p(np.maximum(mu, -0.99)) - 0.5 * total_var) / 12  # monthly
+
+    regime = MONTE_CARLO_REGIMES.get(market_regime, MONTE_CARLO_REGIMES["sideways"])
+    starts, stops, first_piece, end_piece = _segment_pieces(horizon_months, waits)
+    length = (stops - starts).astype(np.float64)
+    in_regime = np.clip(np.minimum(stops, REGIME_PERSISTENCE_MONTHS) - starts, 0, None)
+    neutral = length - in_regime
+
+    # Draws and path arithmetic run in float32; sums of a few dozen pieces lose nothing that matters here
+    market_mean = (regime["market_drift"] / 12 * in_regime).astype(np.float32)
+    market_sd = np.sqrt(in_regime * regime["market_volatility"] ** 2 / 12 + neutral * NEUTRAL_MARKET_VOLATILITY ** 2 / 12).astype(np.float32)
+    idio_sd = np.sqrt(np.outer(idio_var / 12, length)).astype(np.float32)  # (funds x pieces)
+    drift = np.outer(alpha, length).astype(np.float32)  # (funds x pieces)
+    beta32 = beta.astype(np.float32)[:, None]
+
+    idle = IDLE_ANNUAL_RETURN * (np.asarray(waits, dtype=np.float64) / 12)
+    idle_multiple = idle.astype(np.float32)
+
+    # Exact moments of each segment's log return (a sum of independent normal pieces)
+    piece_mean = np.outer(alpha, length) + beta[:, None] * (regime["market_drift"] / 12 * in_regime)
+    piece_var = (np.outer(idio_var / 12, length)
+                 + beta[:, None] ** 2 * (in_regime * regime["market_volatility"] ** 2 / 12
+                                         + neutral * NEUTRAL_MARKET_VOLATILITY ** 2 / 12))
+    cumulative_mean = np.concatenate([np.zeros((n_funds, 1)), np.cumsum(piece_mean, axis=1)], axis=1)
+    cumulative_var = np.concatenate([np.zeros((n_funds, 1)), np.cumsum(piece_var, axis=1)], axis=1)
+    segment_mean = cumulative_mean[:, end_piece] - cumulative_mean[:, first_piece]  # (funds x segments)
+    segment_sd = np.sqrt(np.maximum(cumulative_var[:, end_piece] - cumulative_var[:, first_piece], 0))
+
+    # Groups: per fund (now, each wait), then the equal-weighted portfolio (now, each wait);
+    # idle cash only shifts wait multiples up, and a portfolio lies within its funds' range
+    segment_idle = np.concatenate([[0.0], idle])
+    lo = np.log(np.exp(segment_mean - HISTOGRAM_SD_RANGE * segment_sd) + segment_idle)
+    hi = np.log(np.exp(segment_mean + HISTOGRAM_SD_RANGE * segment_sd) + segment_idle)
+    histogram = _LogHistogram(np.concatenate([lo.ravel(), lo.min(axis=0)]),
+                              np.concatenate([hi.ravel(), hi.max(axis=0)]))
+    fund_wins = np.zeros((n_waits, n_funds), dtype=np.int64)
+    portfolio_wins = np.zeros(n_waits, dtype=np.int64)
+
+    rng = np.random.default_rng(seed)
+    n_pieces = len(length)
+    chunk = max(1, min(num_paths, chunk_elements // max(1, n_funds * n_pieces)))
+    done = 0
+    while done < num_paths:
+        n = min(chunk, num_paths - done)
+        market = market_mean + market_sd * rng.standard_normal((n, n_pieces), dtype=np.float32)
+        pieces = idio_sd * rng.standard_normal((n, n_funds, n_pieces), dtype=np.float32)
+        pieces += drift
+        pieces += beta32 * market[:, None, :]
+
+        # Segment sums as differences of the running sum over pieces
+        cumulative = np.zeros((n, n_funds, n_pieces + 1), dtype=np.float32)
+        np.cumsum(pieces, axis=2, out=cumulative[:, :, 1:])
+        segment_log = cumulative[:, :, end_piece] - cumulative[:, :, first_piece]  # (paths x funds x segments)
+
+        multiple = np.exp(segment_log)
+        multiple[:, :, 1:] += idle_multiple
+        portfolio = multiple.mean(axis=1)  # (paths x segments)
+
+        fund_wins += (multiple[:, :, 1:] > multiple[:, :, :1]).sum(axis=0).T
+        portfolio_wins += (portfolio[:, 1:] > portfolio[:, :1]).sum(axis=0)
+
+        histogram.update(np.log(np.concatenate([multiple.reshape(n, -1), portfolio], axis=1)))
+        done += n
+
+    bands = investment_amount * (np.exp(histogram.percentiles(MONTE_CARLO_PERCENTILES)) - 1)
+    bands = bands.reshape(n_funds + 1, n_waits + 1, len(MONTE_CARLO_PERCENTILES))
+
+    return {
+        "fund_bands": bands[:n_funds],          # (funds x segments x percentiles), profit
+        "portfolio_bands": bands[n_funds],      # (segments x percentiles), profit
+        "fund_prob_wait_beats_now": fund_wins / num_paths,           # (waits x funds)
+        "portfolio_prob_wait_beats_now": portfolio_wins / num_paths,  # (waits,)
+        "segment_log_mean": segment_mean,       # (funds x segments), before idle cash
+        "segment_log_sd": segment_sd,
+        "chunk_paths": chunk
+    }
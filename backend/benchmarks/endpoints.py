@@ -0,0 +1,350 @@
+"""
+Endpoint benchmark suite over synthetic fund universes.
+
+For each scale (a multiple of the real dataset's 789 funds) a synthetic
+universe is generated (benchmarks.synthetic_funds) and the API is started
+in a fresh process on it (FUNDS_DATA_PATH), with the market endpoints
+served from synthetic fixtures (benchmarks.market_fixtures) through the
+`file` provider, so nothing touches the network. Every endpoint is driven
+in-process through ASGI calls and measured for:
+
+- latency: p50 / p95 / p99 / mean over sequential calls after a warm-up
+- throughput: requests per second with `--concurrency` concurrent callers
+- memory: peak traced allocation of one call (tracemalloc), plus process
+  RSS and the loaded-state footprint (app.memory_report) per scale
+
+Results are compared with a stored baseline; a p50 / p95 latency or
+throughput change beyond `--threshold` (and more than `--min-delta-ms`), a
+peak memory growth beyond `--memory-threshold`, new failing requests, or
+an endpoint / scale missing from the baseline count as regressions and
+make the run exit with status 1.
+
+    python -m benchmarks.endpoints                       # 1x, 10x and 100x vs benchmarks/baseline.json
+    python -m benchmarks.endpoints --scales 1 10 --iterations 20
+    python -m benchmarks.endpoints --update-baseline     # store this run as the baseline
+
+Baselines are machine-specific: record one on the hardware that runs the
+comparison.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import secrets
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(BACKEND_DIR, 'benchmarks', 'baseline.json')
+
+# Routes deliberately not driven (tracing inside the traced benchmark would measure
+# itself; the event stream never completes)
+SKIPPED_ROUTES = {("POST", "/api/admin/memory/trace"), ("GET", "/api/market-condition/stream")}
+
+MB = 1024 * 1024
+
+
+def scenarios(names):
+    """(name, method, path, body(i) or None): one or more per endpoint; i varies the fund per call"""
+    def fund(i, offset=0):
+        return names[(i * 7919 + offset) % len(names)]
+
+    profiles = [
+        {"amount": amount, "tenure": tenure, "risk_tolerance": risk}
+        for amount in [10000, 100000] for tenure in [1, 3, 5] for risk in ["conservative", "moderate", "aggressive"]
+    ]
+    return [
+        ("root", "GET", "/", None),
+        ("descriptive_analysis", "GET", "/api/descriptive-analysis", None),
+        ("amcs", "GET", "/api/amcs", None),
+        ("categories", "GET", "/api/categories", None),
+        ("funds", "POST", "/api/funds", lambda i: {"category": "Equity", "min_rating": 3, "limit": 50}),
+        ("recommend", "POST", "/api/recommend",
+         lambda i: {"amount": 100000, "tenure": [1, 3, 5][i % 3], "risk_tolerance": "moderate", "num_funds": 4}),
+        ("recommend_batch", "POST", "/api/recommend/batch", lambda i: {"profiles": profiles}),
+        ("forecast", "POST", "/api/forecast",
+         lambda i: {"fund_name": fund(i), "horizon": 5, "investment_mode": "sip", "amount": 5000}),
+        ("forecast_stream", "POST", "/api/forecast",
+         lambda i: {"fund_name": fund(i), "horizon": 5, "investment_mode": "step_up_sip", "amount": 5000, "stream": True}),
+        ("forecast_batch", "POST", "/api/forecast/batch",
+         lambda i: {"fund_names": [fund(i, k) for k in range(200)], "horizons": [1, 3, 5]}),
+        ("prediction_batcher_stats", "GET", "/api/prediction-batcher/stats", None),
+        ("admission_stats", "GET", "/api/admission/stats", None),
+        ("enhanced_analysis", "GET", "/api/enhanced-analysis", None),
+        ("compare_funds", "POST", "/api/compare-funds", lambda i: {"fund_names": [fund(i, k) for k in range(5)]}),
+        ("market_trends", "GET", "/api/market-trends", None),
+        ("top_performers", "GET", "/api/top-performers?limit=20", None),
+        ("dashboard_data", "GET", "/api/dashboard-data", None),
+        ("market_condition", "GET", "/api/market-condition", None),
+        ("market_regimes", "GET", "/api/market-regimes", None),
+        ("market_stream_stats", "GET", "/api/market-condition/stream/stats", None),
+        ("backtest", "POST", "/api/backtest",
+         lambda i: {"timeframe": "4H", "years": 1, "fast_spans": [8, 12, 16], "slow_spans": [21, 26, 34]}),
+        ("what_if", "POST", "/api/what-if-simulation",
+         lambda i: {"fund_names": [fund(i, k) for k in range(10)], "investment_amount": 100000, "duration_years": 5}),
+        ("what_if_monte_carlo", "POST", "/api/what-if-simulation",
+         lambda i: {"fund_names": [fund(i, k) for k in range(10)], "investment_amount": 100000, "duration_years": 5,
+                    "market_regime": "bull", "monte_carlo": True, "num_paths": 2000, "seed": 1}),
+        ("metrics", "GET", "/metrics", None),
+        ("admin_memory", "GET", "/api/admin/memory", None)
+    ]
+
+
+def uncovered_routes(app, driven):
+    """API routes (method, path) that no scenario drives"""
+    from starlette.routing import Route
+
+    routes = set()
+    for route in app.routes:
+        if isinstance(route, Route) and not route.path.startswith(("/docs", "/redoc", "/openapi")):
+            routes.update((method, route.path) for method in route.methods or [] if method != "HEAD")
+    return sorted(routes - driven - SKIPPED_ROUTES)
+
+
+def _percentiles(samples):
+    values = np.array(samples) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 3), "p95_ms": round(float(p95), 3), "p99_ms": round(float(p99), 3),
+            "mean_ms": round(float(values.mean()), 3)}
+
+
+async def measure(app, method, path, body, iterations, warmup, concurrency, max_seconds, headers=None):
+    from app.memory_report import call_app, trace_request
+
+    def request_body(i):
+        return body(i) if body is not None else None
+
+    statuses = []
+    for i in range(warmup):
+        status, _ = await call_app(app, method, path, request_body(i), headers)
+        statuses.append(status)
+
+    latencies = []
+    deadline = time.perf_counter() + max_seconds
+    for i in range(iterations):
+        start = time.perf_counter()
+        status, _ = await call_app(app, method, path, request_body(i), headers)
+        latencies.append(time.perf_counter() - start)
+        statuses.append(status)
+        if time.perf_counter() > deadline and len(latencies) >= 5:
+            break
+
+    # Throughput: concurrent callers sharing one request budget
+    budget = {"next": 0, "done": 0}
+    throughput_deadline = time.perf_counter() + max_seconds
+
+    async def caller():
+        while budget["next"] < iterations and (budget["done"] < 5 or time.perf_counter() < throughput_deadline):
+            i = budget["next"]
+            budget["next"] += 1
+            status, _ = await call_app(app, method, path, request_body(i), headers)
+            statuses.append(status)
+            budget["done"] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(caller() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    trace = await trace_request(app, method, path, request_body(0), top=0, headers=headers)
+    return {
+        **_percentiles(latencies),
+        "samples": len(latencies),
+        "throughput_rps": round(budget["done"] / elapsed, 2) if elapsed > 0 else None,
+        "peak_mb": round(trace["peak_bytes"] / MB, 3),
+        "errors": sum(1 for status in statuses + [trace["status"]] if status is None or status >= 400)
+    }
+
+
+def run_worker(args):
+    """Benchmark the app loaded on FUNDS_DATA_PATH in this process; writes the result JSON"""
+    # The app logs to stdout; keep it on stderr so progress stays readable
+    with contextlib.redirect_stdout(sys.stderr):
+        start = time.perf_counter()
+        from app import main as api
+        from app.memory_report import collect_report, process_memory
+        api.ensure_initialized()
+        init_seconds = time.perf_counter() - start
+
+        names = api.funds_data['scheme_name'].tolist()
+        plan = scenarios(names)
+
+        async def run_all():
+            results = {}
+            for name, method, path, body in plan:
+                # Admin endpoints only exist with ADMIN_TOKEN (run_scale sets one per run)
+                headers = {"X-Admin-Token": api.ADMIN_TOKEN} if path.startswith("/api/admin/") else None
+                results[name] = await measure(
+                    api.app, method, path, body, args.iterations, args.warmup, args.concurrency, args.max_seconds,
+                    headers
+                )
+                print(f"   {args.scale:g}x {name:<28}p50 {results[name]['p50_ms']:>9.2f} ms  "
+                      f"p95 {results[name]['p95_ms']:>9.2f} ms  {results[name]['throughput_rps']:>9.1f} req/s",
+                      file=sys.stderr)
+            return results
+
+        results = asyncio.run(run_all())
+
+        missing = uncovered_routes(api.app, {(method, path.split("?")[0]) for _, method, path, _ in plan})
+        report = collect_report(api.ml_system, api.model_loader, api.funds_data)
+
+    result = {
+        "funds": len(names),
+        "init_seconds": round(init_seconds, 3),
+        "rss_mb": round(process_memory().get("rss_mb", 0), 1),
+        "footprint_mb": report["totals_mb"]["all"],
+        "uncovered_routes": [f"{method} {path}" for method, path in missing],
+        "endpoints": results
+    }
+    with open(args.result_file, 'w') as f:
+        json.dump(result, f)
+
+
+def run_scale(scale, args, fixture_dir, work_dir):
+    """Generate the universe for one scale and benchmark it in a fresh interpreter"""
+    from benchmarks.synthetic_funds import write_funds
+
+    data_path = os.path.join(work_dir, f"funds_{scale:g}x.csv")
+    n_funds = write_funds(data_path, scale, args.seed)
+    print(f"📦 {scale:g}x: {n_funds} synthetic funds")
+
+    result_file = os.path.join(work_dir, f"result_{scale:g}x.json")
+    env = {
+        **os.environ,
+        "FUNDS_DATA_PATH": data_path,
+        "SNAPSHOT_BUNDLE_PATH": "",
+        "MARKET_DATA_PROVIDER": "file",
+        "MARKET_DATA_FIXTURE_DIR": fixture_dir,
+        "MARKET_DATA_DIR": os.path.join(work_dir, f"market_store_{scale:g}x"),
+        "MARKET_CONDITION_REFRESH_SECONDS": "0",
+        "ADMIN_TOKEN": secrets.token_hex(16),
+        # Callers beyond a class's concurrency queue instead of being shed: measure cost, not overload policy
+        "ADMISSION_QUEUE_TIMEOUT_SECONDS": "3600"
+    }
+    command = [sys.executable, "-m", "benchmarks.endpoints", "--worker", "--scale", str(scale),
+               "--result-file", result_file, "--iterations", str(args.iterations), "--warmup", str(args.warmup),
+               "--concurrency", str(args.concurrency), "--max-seconds", str(args.max_seconds)]
+    subprocess.run(command, cwd=BACKEND_DIR, env=env, check=True,
+                   stderr=None if args.verbose else subprocess.DEVNULL)
+    with open(result_file) as f:
+        return json.load(f)
+
+
+def compare(results, baseline, threshold, memory_threshold, min_delta_ms):
+    """Regressions of `results` against `baseline` as readable strings (unbaselined endpoints included)"""
+    regressions = []
+    for scale, result in results["scales"].items():
+        base_scale = baseline.get("scales", {}).get(scale)
+        if base_scale is None:
+            regressions.append(f"{scale}x: no baseline for this scale (record one with --update-baseline)")
+            continue
+        for name, current in result["endpoints"].items():
+            label = f"{scale}x {name}"
+            base = base_scale["endpoints"].get(name)
+            if base is None:
+                regressions.append(f"{label}: no baseline entry (record one with --update-baseline)")
+                continue
+            for key in ["p50_ms", "p95_ms"]:
+                if current[key] > base[key] * (1 + threshold) and current[key] - base[key] > min_delta_ms:
+                    regressions.append(f"{label}: {key} {base[key]:.2f} -> {current[key]:.2f}")
+            if current["throughput_rps"] and base["throughput_rps"]:
+                slower_ms = 1000 / current["throughput_rps"] - 1000 / base["throughput_rps"]
+                if current["throughput_rps"] < base["throughput_rps"] / (1 + threshold) and slower_ms > min_delta_ms:
+                    regressions.append(f"{label}: throughput {base['throughput_rps']:.1f} -> {current['throughput_rps']:.1f} req/s")
+            if current["peak_mb"] > base["peak_mb"] * (1 + memory_threshold) and current["peak_mb"] - base["peak_mb"] > 1:
+                regressions.append(f"{label}: peak memory {base['peak_mb']:.2f} -> {current['peak_mb']:.2f} MB")
+            if current["errors"] > base.get("errors", 0):
+                regressions.append(f"{label}: {current['errors']} failed requests (baseline {base.get('errors', 0)})")
+    return regressions
+
+
+def print_summary(results, baseline):
+    for scale, result in results["scales"].items():
+        base_scale = baseline.get("scales", {}).get(scale, {}) if baseline else {}
+        print(f"\n📊 {scale}x ({result['funds']} funds): init {result['init_seconds']:.2f} s, "
+              f"RSS {result['rss_mb']:.0f} MB, loaded state {result['footprint_mb']:.1f} MB")
+        print(f"   {'endpoint':<28}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'peak MB':>10}{'vs base p95':>13}")
+        for name, m in result["endpoints"].items():
+            base = base_scale.get("endpoints", {}).get(name)
+            change = f"{(m['p95_ms'] / base['p95_ms'] - 1) * 100:+.0f}%" if base and base["p95_ms"] else ""
+            print(f"   {name:<28}{m['p50_ms']:>10.2f}{m['p95_ms']:>10.2f}{m['p99_ms']:>10.2f}"
+                  f"{m['throughput_rps']:>10.1f}{m['peak_mb']:>10.2f}{change:>13}")
+        if result["uncovered_routes"]:
+            print(f"   ❌ Routes without a scenario: {', '.join(result['uncovered_routes'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every API endpoint on synthetic fund universes")
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--iterations", type=int, default=30, help="calls per endpoint (latency and throughput)")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--max-seconds", type=float, default=10.0, help="time budget per endpoint and phase")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="write this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed latency / throughput change (fraction)")
+    parser.add_argument("--memory-threshold", type=float, default=0.25, help="allowed peak memory growth (fraction)")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="latency changes below this never count")
+    parser.add_argument("--output", help="also write the results JSON here")
+    parser.add_argument("--verbose", action="store_true", help="show app logs and per-endpoint progress")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--scale", type=float, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args)
+        return
+
+    from benchmarks.market_fixtures import write_fixtures
+
+    results = {
+        "created_at": datetime.now().isoformat(),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "settings": {"iterations": args.iterations, "concurrency": args.concurrency, "seed": args.seed},
+        "scales": {}
+    }
+    with tempfile.TemporaryDirectory(prefix="mf-bench-") as work_dir:
+        fixture_dir = os.path.join(work_dir, "fixtures")
+        os.makedirs(fixture_dir)
+        write_fixtures(fixture_dir, args.seed)
+        for scale in args.scales:
+            results["scales"][f"{scale:g}"] = run_scale(scale, args, fixture_dir, work_dir)
+
+    baseline = None
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_summary(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.update_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Baseline written to {args.baseline}")
+        return
+    if baseline is None:
+        print(f"\n❌ No baseline at {args.baseline} (run with --update-baseline to record one)")
+        return
+
+    regressions = compare(results, baseline, args.threshold, args.memory_threshold, args.min_delta_ms)
+    if regressions:
+        print(f"\n❌ {len(regressions)} regressions against {os.path.relpath(args.baseline, BACKEND_DIR)}:")
+        for regression in regressions:
+            print(f"   {regression}")
+        sys.exit(1)
+    print("\n✅ No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Synthetic OHLCV fixtures for the `file` market data provider.
+
+Writes <ticker>_1h.csv and <ticker>_1d.csv for every index in
+app.multi_regime.MARKET_INDICES: a seeded geometric random walk per ticker
+ending at the current time, with hourly bars in Indian market hours on
+weekdays. Point MARKET_DATA_PROVIDER=file and MARKET_DATA_FIXTURE_DIR at the
+directory to run the market endpoints offline.
+"""
+
+import argparse
+import os
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from app.market_data import FileFixtureProvider
+from app.multi_regime import MARKET_INDICES
+
+TIMEZONE = "Asia/Kolkata"
+HOURLY_DAYS = 400
+DAILY_DAYS = 5 * 365
+
+
+def _bars(index, seed, start_price=20000.0, annual_volatility=0.18, annual_drift=0.1):
+    rng = np.random.default_rng(seed)
+    periods_per_year = len(index) / max((index[-1] - index[0]).days / 365, 1 / 365)
+    sigma = annual_volatility / np.sqrt(periods_per_year)
+    mu = annual_drift / periods_per_year - sigma ** 2 / 2
+    close = start_price * np.exp(np.cumsum(rng.normal(mu, sigma, len(index))))
+    open_ = np.concatenate([[start_price], close[:-1]])
+    spread = np.abs(rng.normal(0, sigma, len(index))) * close
+    return pd.DataFrame({
+        "Open": open_,
+        "High": np.maximum(open_, close) + spread,
+        "Low": np.minimum(open_, close) - spread,
+        "Close": close,
+        "Volume": rng.integers(100_000, 1_000_000, len(index)).astype(float)
+    }, index=index.rename("Datetime"))
+
+
+def write_fixtures(fixture_dir, seed=0, now=None):
+    """Write hourly and daily bars for every market index; returns the tickers written"""
+    now = pd.Timestamp(now or pd.Timestamp.now(tz=TIMEZONE)).tz_convert(TIMEZONE)
+    days = pd.bdate_range(end=now.normalize(), periods=HOURLY_DAYS, tz=TIMEZONE)
+    hourly = pd.DatetimeIndex([day + pd.Timedelta(hours=9, minutes=15) + pd.Timedelta(hours=h)
+                               for day in days for h in range(7)])
+    hourly = hourly[hourly <= now]
+    daily = pd.bdate_range(end=now.normalize(), periods=DAILY_DAYS * 5 // 7, tz=TIMEZONE)
+
+    provider = FileFixtureProvider(fixture_dir)
+    tickers = sorted(set(MARKET_INDICES.values()))
+    for ticker in tickers:
+        ticker_seed = seed + zlib.crc32(ticker.encode())
+        _bars(hourly, ticker_seed).to_csv(provider.fixture_path(ticker, "1h"))
+        _bars(daily, ticker_seed + 1).to_csv(provider.fixture_path(ticker, "1d"))
+    return tickers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic market data fixtures")
+    parser.add_argument("--output", required=True, help="fixture directory")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    tickers = write_fixtures(args.output, args.seed)
+    print(f"✅ Wrote 1h and 1d fixtures for {len(tickers)} indices to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Accuracy check of the what-if Monte Carlo bands across horizons.
+
+Investing now, a fund's log value multiple is exactly normal with the mean
+and standard deviation app.what_if.simulate_wait_monte_carlo reports
+(segment_log_mean / segment_log_sd), so its percentile bands have a closed
+form. This runs the simulation for every `--horizons` / `--regimes`
+combination on real funds and compares each invest-now band with the exact
+quantile, in standard deviations of the log multiple. Long horizons are the
+point: their multiples grow far beyond the short ones'.
+
+The run exits with status 1 when any band is off by more than `--tolerance`
+standard deviations (at the default 20k paths sampling error is about 0.015
+per band and the worst of a run's bands around 0.05).
+
+    python -m benchmarks.monte_carlo
+    python -m benchmarks.monte_carlo --horizons 30 --regimes bull --funds 50 --output /tmp/monte_carlo.json
+"""
+
+import argparse
+import json
+import sys
+import time
+from datetime import datetime
+from statistics import NormalDist
+
+import numpy as np
+
+from app.data_store import load_funds_data
+from app.what_if import DEFAULT_WAIT_MONTHS, MONTE_CARLO_PERCENTILES, MONTE_CARLO_REGIMES, simulate_wait_monte_carlo
+
+DEFAULT_HORIZONS = [1, 3, 5, 10, 20, 30]
+INVESTMENT_AMOUNT = 100000
+
+
+def check_horizon(funds, base_returns, horizon, regime, args):
+    start = time.perf_counter()
+    mc = simulate_wait_monte_carlo(base_returns, funds, INVESTMENT_AMOUNT, horizon, DEFAULT_WAIT_MONTHS,
+                                   regime, args.paths, args.seed)
+    elapsed = time.perf_counter() - start
+
+    z = np.array([NormalDist().inv_cdf(q / 100) for q in MONTE_CARLO_PERCENTILES])
+    mean, sd = mc["segment_log_mean"][:, :1], mc["segment_log_sd"][:, :1]
+    exact = mean + sd * z  # (funds x percentiles) log multiples
+    simulated = np.log1p(mc["fund_bands"][:, 0] / INVESTMENT_AMOUNT)
+    error = np.abs(simulated - exact) / sd
+    worst = np.unravel_index(np.argmax(error), error.shape)
+    return {
+        "horizon": horizon,
+        "regime": regime,
+        "max_error_sd": round(float(error.max()), 4),
+        "mean_error_sd": round(float(error.mean()), 4),
+        "worst_fund": funds.iloc[worst[0]]["scheme_name"],
+        "worst_percentile": MONTE_CARLO_PERCENTILES[worst[1]],
+        "max_median_multiple": round(float(np.exp(mean.max())), 2),
+        "seconds": round(elapsed, 3)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check Monte Carlo what-if bands against their exact quantiles")
+    parser.add_argument("--horizons", type=float, nargs="+", default=DEFAULT_HORIZONS)
+    parser.add_argument("--regimes", nargs="+", choices=list(MONTE_CARLO_REGIMES), default=list(MONTE_CARLO_REGIMES))
+    parser.add_argument("--funds", type=int, default=20, help="funds simulated together per run")
+    parser.add_argument("--paths", type=int, default=20000)
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed band error in standard deviations")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write the results JSON here")
+    args = parser.parse_args()
+
+    funds = load_funds_data().head(args.funds)
+    base_returns = funds["return_5yr"].fillna(funds["return_5yr"].median()).to_numpy(dtype=np.float64)
+
+    results = {
+        "created_at": datetime.now().isoformat(),
+        "settings": {"funds": len(funds), "paths": args.paths, "seed": args.seed, "tolerance": args.tolerance},
+        "checks": [check_horizon(funds, base_returns, horizon, regime, args)
+                   for regime in args.regimes for horizon in args.horizons]
+    }
+
+    print(f"\n📊 Invest-now bands vs exact quantiles ({len(funds)} funds, {args.paths} paths)")
+    print(f"   {'regime':<10}{'years':>6}{'median x':>10}{'max err sd':>12}{'mean err sd':>13}{'seconds':>9}")
+    for check in results["checks"]:
+        print(f"   {check['regime']:<10}{check['horizon']:>6g}{check['max_median_multiple']:>10.2f}"
+              f"{check['max_error_sd']:>12.4f}{check['mean_error_sd']:>13.4f}{check['seconds']:>9.2f}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Results written to {args.output}")
+
+    failures = [check for check in results["checks"] if check["max_error_sd"] > args.tolerance]
+    if failures:
+        print(f"\n❌ Bands off by more than {args.tolerance:g} standard deviations:")
+        for check in failures:
+            print(f"   {check['regime']} {check['horizon']:g}y: {check['max_error_sd']:.3f} sd "
+                  f"({check['worst_fund']}, p{check['worst_percentile']})")
+        sys.exit(1)
+    print("\n✅ All Monte Carlo bands match their exact quantiles")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Prediction hot-path micro-benchmark across inference backends.
+
+For every horizon's model and every backend this measures:
+
+- single: latency of MutualFundModelLoader.predict_fund_return on one fund
+  (the per-fund path: feature list assembly plus a one-row model call)
+- batch: latency and rows per second of the model call on feature matrices
+  of each `--batch-sizes` size, plus the full predict_fund_returns_batch
+  path (feature matrix build included) at the same size
+- agreement: the largest absolute / relative difference from the sklearn
+  predictions on every scorable row of the batch data
+
+Backends:
+
+- sklearn: the pickled model as trained
+- sklearn-parallel: forests predicting with n_jobs=-1 (forests only)
+- compiled: app.compiled_models.CompiledTreeEnsemble built from the pickle
+- bundle: the compiled model read from a snapshot bundle (`--bundle`)
+
+Batches larger than the real dataset come from a synthetic universe
+(benchmarks.synthetic_funds). Results are written as JSON (`--output`);
+the run exits with status 1 when a backend disagrees with sklearn by more
+than `--tolerance`.
+
+    python -m benchmarks.predictions --output /tmp/predictions.json
+    python -m benchmarks.predictions --horizons 5 --batch-sizes 1 100 10000 --bundle data/snapshot.bundle
+"""
+
+import argparse
+import copy
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from app.compiled_models import CompiledTreeEnsemble
+from app.data_store import build_feature_matrix
+from app.model_loader_utility import MutualFundModelLoader
+from benchmarks.synthetic_funds import generate_funds
+
+BACKENDS = ["sklearn", "sklearn-parallel", "compiled", "bundle"]
+DEFAULT_BATCH_SIZES = [1, 10, 100, 1000, 10000]
+
+
+def _percentiles(samples):
+    values = np.array(samples) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 4), "p95_ms": round(float(p95), 4), "p99_ms": round(float(p99), 4),
+            "mean_ms": round(float(values.mean()), 4)}
+
+
+def _timed(fn, repeats, max_seconds, warmup=1):
+    """Per-call durations in seconds: at least 3 calls, then up to `repeats` within max_seconds"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    deadline = time.perf_counter() + max_seconds
+    while len(samples) < repeats and (len(samples) < 3 or time.perf_counter() < deadline):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def build_backends(target, model, bundle_models, names):
+    """{backend name: model} for the requested backends that apply to this model"""
+    backends = {}
+    for name in names:
+        if name == "sklearn":
+            backends[name] = model
+        elif name == "sklearn-parallel":
+            if hasattr(model, "n_jobs"):
+                parallel = copy.copy(model)
+                parallel.n_jobs = -1
+                backends[name] = parallel
+        elif name == "compiled":
+            try:
+                backends[name] = CompiledTreeEnsemble.from_sklearn(model)
+            except ValueError as e:
+                print(f"❌ {target}: compiled backend unavailable: {e}")
+        elif name == "bundle":
+            if bundle_models is not None and target in bundle_models:
+                backends[name] = bundle_models[target]["model"]
+    return backends
+
+
+def describe_model(model, feature_cols):
+    info = {"model_type": type(model).__name__, "n_features": len(feature_cols)}
+    if hasattr(model, "estimators_"):
+        estimators = np.ravel(model.estimators_)
+        info["n_estimators"] = len(estimators)
+        info["max_depth"] = int(max(estimator.tree_.max_depth for estimator in estimators))
+        info["n_nodes"] = int(sum(estimator.tree_.node_count for estimator in estimators))
+    return info
+
+
+def agreement(reference, predictions):
+    diff = np.abs(predictions - reference)
+    scale = np.maximum(np.abs(reference), 1e-12)
+    return {"rows": len(reference), "identical": bool(np.array_equal(predictions, reference)),
+            "max_abs_diff": float(diff.max()), "max_rel_diff": float((diff / scale).max())}
+
+
+def benchmark_horizon(loader, horizon, backends, funds, batch_sizes, args):
+    target = f'return_{horizon}yr'
+    feature_cols = loader.feature_columns[target]
+    model = loader.models[target]
+
+    X_all = build_feature_matrix(funds, feature_cols)
+    X_valid = X_all[~np.isnan(X_all).any(axis=1)]
+    single_rows = [row for _, row in loader.df.head(args.single_rows).iterrows()]
+
+    result = {**describe_model(model, feature_cols), "backends": {}}
+    reference = model.predict(X_valid)
+    for name, backend in backends.items():
+        loader.models[target] = backend
+        try:
+            i = iter(range(sys.maxsize))
+            single = _timed(lambda: loader.predict_fund_return(single_rows[next(i) % len(single_rows)], horizon),
+                            args.single_calls, args.max_seconds)
+            batches = {}
+            for size in batch_sizes:
+                X = X_valid[np.arange(size) % len(X_valid)]
+                frame = funds.iloc[np.arange(size) % len(funds)]
+                repeats = max(3, min(args.repeats, args.repeats * 100 // size))
+                model_samples = _timed(lambda: backend.predict(X), repeats, args.max_seconds)
+                pipeline_samples = _timed(lambda: loader.predict_fund_returns_batch(frame, horizon),
+                                          repeats, args.max_seconds)
+                stats = _percentiles(model_samples)
+                batches[str(size)] = {
+                    **stats,
+                    "rows_per_sec": round(size / np.median(model_samples), 1),
+                    "pipeline_p50_ms": _percentiles(pipeline_samples)["p50_ms"],
+                    "pipeline_rows_per_sec": round(size / np.median(pipeline_samples), 1)
+                }
+            result["backends"][name] = {
+                "single": _percentiles(single),
+                "batch": batches,
+                "agreement": agreement(reference, backend.predict(X_valid))
+            }
+        finally:
+            loader.models[target] = model
+        if args.verbose:
+            print(f"   {target} {name}: done", file=sys.stderr)
+    return result
+
+
+def print_summary(results, batch_sizes):
+    for target, result in results["models"].items():
+        print(f"\n📊 {target}: {result['model_type']}, {result.get('n_estimators', '?')} trees, "
+              f"depth {result.get('max_depth', '?')}, {result['n_features']} features")
+        header = f"   {'backend':<18}{'single p50 ms':>15}" + "".join(f"{f'{size} rows/s':>16}" for size in batch_sizes)
+        print(header + f"{'max |diff|':>13}")
+        for name, backend in result["backends"].items():
+            throughput = "".join(f"{backend['batch'][str(size)]['rows_per_sec']:>16,.0f}" for size in batch_sizes)
+            print(f"   {name:<18}{backend['single']['p50_ms']:>15.3f}{throughput}"
+                  f"{backend['agreement']['max_abs_diff']:>13.2e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark model predictions across inference backends")
+    parser.add_argument("--horizons", type=int, nargs="+", default=[1, 3, 5])
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=DEFAULT_BATCH_SIZES)
+    parser.add_argument("--single-calls", type=int, default=500, help="predict_fund_return calls per backend")
+    parser.add_argument("--single-rows", type=int, default=200, help="distinct funds cycled through single calls")
+    parser.add_argument("--repeats", type=int, default=50, help="calls per batch size (fewer for large batches)")
+    parser.add_argument("--max-seconds", type=float, default=5.0, help="time budget per measurement")
+    parser.add_argument("--bundle", help="snapshot bundle providing the `bundle` backend")
+    parser.add_argument("--tolerance", type=float, default=1e-9, help="allowed absolute difference from sklearn")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results JSON here")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    loader = MutualFundModelLoader()
+    targets = [f'return_{horizon}yr' for horizon in args.horizons]
+    for target in targets:
+        if not loader.load_individual_model(target):
+            sys.exit(1)
+
+    bundle_models = None
+    if "bundle" in args.backends and args.bundle:
+        from app.snapshot_bundle import SnapshotBundle
+        bundle_models = SnapshotBundle(args.bundle).models
+
+    batch_sizes = sorted(set(args.batch_sizes))
+    funds = generate_funds(max(batch_sizes), args.seed)
+
+    results = {
+        "created_at": datetime.now().isoformat(),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "settings": {"batch_sizes": batch_sizes, "single_calls": args.single_calls, "repeats": args.repeats,
+                     "seed": args.seed, "tolerance": args.tolerance},
+        "models": {}
+    }
+    for horizon, target in zip(args.horizons, targets):
+        backends = build_backends(target, loader.models[target], bundle_models, args.backends)
+        results["models"][target] = benchmark_horizon(loader, horizon, backends, funds, batch_sizes, args)
+
+    print_summary(results, batch_sizes)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\n✅ Results written to {args.output}")
+
+    disagreements = [
+        f"{target} {name}: max |diff| {backend['agreement']['max_abs_diff']:.3e}"
+        for target, result in results["models"].items()
+        for name, backend in result["backends"].items()
+        if backend["agreement"]["max_abs_diff"] > args.tolerance
+    ]
+    if disagreements:
+        print(f"\n❌ Backends disagreeing with sklearn beyond {args.tolerance:g}:")
+        for disagreement in disagreements:
+            print(f"   {disagreement}")
+        sys.exit(1)
+    print("\n✅ All backends agree with sklearn")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Synthetic fund universes with the schema of data/mutual_funds_cleaned.csv.
+
+Rows are bootstrapped from the real dataset, so every synthetic fund keeps
+a coherent one-hot category / sub-category pair, AMC name and code, fund
+manager, risk level and rating. Continuous columns are then jittered by a
+fraction of their standard deviation and clipped to the observed range,
+and discrete-valued numeric columns (min SIP, fund age, ...) are kept as
+sampled. Scheme names are made unique. NaNs stay where the sampled row
+had them.
+
+    python -m benchmarks.synthetic_funds --scale 10 --output /tmp/funds_10x.csv
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TEMPLATE_PATH = os.path.join(BACKEND_DIR, 'data', 'mutual_funds_cleaned.csv')
+
+# Numeric columns with at most this many distinct values are resampled, not jittered
+DISCRETE_MAX_VALUES = 12
+
+# Jitter of continuous columns, as a fraction of the column's standard deviation
+JITTER = 0.1
+
+
+def generate_funds(n_funds, seed=0, template_path=TEMPLATE_PATH):
+    """A synthetic universe of n_funds funds (same columns, dtypes and column order as the template)"""
+    template = pd.read_csv(template_path)
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, len(template), n_funds)
+
+    data = {}
+    for name in template.columns:
+        values = template[name].to_numpy()[rows]
+        if values.dtype.kind == 'f' and template[name].nunique() > DISCRETE_MAX_VALUES:
+            column = template[name]
+            noise = rng.normal(0.0, JITTER * column.std(), n_funds)
+            values = np.clip(values + noise, column.min(), column.max())
+        data[name] = values
+
+    df = pd.DataFrame(data, columns=template.columns)
+    df['scheme_name'] = [f"{name} S{i:06d}" for i, name in enumerate(df['scheme_name'])]
+    return df
+
+
+def write_funds(path, scale=1, seed=0, template_path=TEMPLATE_PATH):
+    """Write a universe of scale x (template size) funds to path; returns the number of funds"""
+    n_funds = int(round(scale * len(pd.read_csv(template_path, usecols=['scheme_name']))))
+    generate_funds(n_funds, seed, template_path).to_csv(path, index=False)
+    return n_funds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic funds dataset")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiple of the real dataset's size")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", required=True)
+    args = parser.parse_args()
+
+    n_funds = write_funds(args.output, args.scale, args.seed)
+    print(f"✅ Wrote {n_funds} synthetic funds to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
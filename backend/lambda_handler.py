@@ -3,7 +3,8 @@ import os
 from mangum import Mangum
 from app.main import app
 
-# Create the Mangum handler for AWS Lambda
+# Create the Mangum handler for AWS Lambda. Without lifespan events the app
+# loads its data and models on the first request of each container.
 handler = Mangum(app, lifespan="off")
 
 # Optional: Add custom error handling
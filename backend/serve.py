@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Mutual Fund AI/ML Backend - production server (Linux)
+
+Loads the funds data and all models once in a parent process, binds the
+listening socket, then forks WEB_CONCURRENCY uvicorn workers that accept on
+the shared socket. Workers inherit the loaded data copy-on-write: the NumPy
+buffers behind the DataFrame and the model trees are never written, and the
+heap is frozen (gc.freeze) before forking so collections in the workers do
+not touch the inherited objects either. Each extra worker therefore costs
+little more than its own interpreter state.
+
+The parent restarts workers that die and prints a resident / shared / private
+memory report per process (from /proc/<pid>/smaps_rollup) shortly after
+start-up and whenever it receives SIGUSR1.
+
+Use run.py for development (single process, auto-reload).
+"""
+
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+# Preloaded objects are never collected in the parent; disable the collector
+# while loading so it does not scan (and later dirty) them
+gc.disable()
+
+import uvicorn
+
+from app import main
+from app.memory_report import read_smaps_rollup
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", 8000))
+
+# Number of forked worker processes
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1))
+
+# Seconds after start-up at which the memory report is printed (0 disables it)
+SERVE_MEMORY_REPORT_DELAY_SECONDS = float(os.getenv("SERVE_MEMORY_REPORT_DELAY_SECONDS", 10))
+
+def memory_report(parent_pid, worker_pids):
+    """Per-process RSS / PSS / shared / private memory in MB"""
+    rows = []
+    for role, pid in [("parent", parent_pid)] + [("worker", pid) for pid in worker_pids]:
+        try:
+            smaps = read_smaps_rollup(pid)
+        except OSError:
+            continue
+        rows.append({
+            "role": role,
+            "pid": pid,
+            "rss_mb": smaps.get("Rss", 0) / 1024,
+            "pss_mb": smaps.get("Pss", 0) / 1024,
+            "shared_mb": (smaps.get("Shared_Clean", 0) + smaps.get("Shared_Dirty", 0)) / 1024,
+            "private_mb": (smaps.get("Private_Clean", 0) + smaps.get("Private_Dirty", 0)) / 1024
+        })
+    return rows
+
+
+def print_memory_report(parent_pid, worker_pids):
+    rows = memory_report(parent_pid, worker_pids)
+    print("📊 Memory per process (MB)")
+    print(f"   {'role':<8}{'pid':>8}{'rss':>10}{'pss':>10}{'shared':>10}{'private':>10}")
+    for row in rows:
+        print(f"   {row['role']:<8}{row['pid']:>8}{row['rss_mb']:>10.1f}{row['pss_mb']:>10.1f}"
+              f"{row['shared_mb']:>10.1f}{row['private_mb']:>10.1f}")
+    workers = [row for row in rows if row["role"] == "worker"]
+    if workers:
+        private = sum(row["private_mb"] for row in workers) / len(workers)
+        total_pss = sum(row["pss_mb"] for row in rows)
+        print(f"   private memory per worker: {private:.1f} MB, total PSS: {total_pss:.1f} MB")
+    sys.stdout.flush()
+
+
+def bind_socket(host, port):
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock):
+    """Worker process: serve the preloaded app on the inherited socket"""
+    signal.signal(signal.SIGUSR1, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    gc.enable()
+
+    config = uvicorn.Config(main.app, log_level="info", lifespan="on")
+    server = uvicorn.Server(config)
+    server.run(sockets=[sock])
+    os._exit(0)
+
+
+def spawn_worker(sock):
+    pid = os.fork()
+    if pid == 0:
+        try:
+            run_worker(sock)
+        finally:
+            os._exit(1)
+    return pid
+
+
+def serve():
+    if not hasattr(os, "fork"):
+        print("❌ serve.py needs os.fork (Linux); use run.py on this platform")
+        sys.exit(1)
+
+    print("🚀 Starting Mutual Fund AI/ML Backend API (preforked)")
+    print(f"📡 Server: http://{HOST}:{PORT} with {WEB_CONCURRENCY} workers")
+    print("=" * 50)
+
+    # Load once; workers inherit the loaded objects
+    main.ensure_initialized()
+    sock = bind_socket(HOST, PORT)
+
+    gc.collect()
+    gc.freeze()
+
+    state = {"running": True, "report": False}
+
+    def stop(signum, frame):
+        state["running"] = False
+
+    def request_report(signum, frame):
+        state["report"] = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGUSR1, request_report)
+
+    workers = set()
+    for _ in range(WEB_CONCURRENCY):
+        workers.add(spawn_worker(sock))
+
+    parent_pid = os.getpid()
+    report_at = time.monotonic() + SERVE_MEMORY_REPORT_DELAY_SECONDS if SERVE_MEMORY_REPORT_DELAY_SECONDS > 0 else None
+
+    while state["running"]:
+        # Replace workers that exited
+        while workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                break
+            workers.discard(pid)
+            if state["running"]:
+                print(f"❌ Worker {pid} exited (status {status}), restarting")
+                workers.add(spawn_worker(sock))
+
+        if state["report"] or (report_at is not None and time.monotonic() >= report_at):
+            state["report"], report_at = False, None
+            print_memory_report(parent_pid, sorted(workers))
+
+        time.sleep(0.5)
+
+    print("🛑 Stopping workers")
+    for pid in workers:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+    for pid in workers:
+        try:
+            os.waitpid(pid, 0)
+        except ChildProcessError:
+            pass
+    sock.close()
+
+
+if __name__ == "__main__":
+    serve()
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import ExtraTreesRegressor, GradientBoostingRegressor, RandomForestRegressor
+
+from app.compiled_models import DENSE_MAX_DEPTH, PREDICT_BLOCK_ROWS, CompiledTreeEnsemble
+
+
+def training_data(n=400, n_features=6, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, n_features))
+    X[:, 0] = rng.integers(0, 5, n)  # repeated values, so rows land exactly on split neighbours
+    y = X[:, 0] * 2 + np.sin(X[:, 1] * 3) + X[:, 2] * X[:, 3] + rng.normal(0, 0.1, n)
+    return X, y
+
+
+MODELS = [
+    GradientBoostingRegressor(n_estimators=50, max_depth=3, random_state=0),
+    GradientBoostingRegressor(n_estimators=30, max_depth=DENSE_MAX_DEPTH, random_state=0),
+    RandomForestRegressor(n_estimators=20, max_depth=4, random_state=0),
+    ExtraTreesRegressor(n_estimators=20, random_state=0)  # grown to full depth: the cursor walk
+]
+
+
+@pytest.mark.parametrize("model", MODELS, ids=lambda model: f"{type(model).__name__}-{model.max_depth}")
+def test_predictions_equal_sklearn(model):
+    X, y = training_data()
+    model.fit(X, y)
+    compiled = CompiledTreeEnsemble.from_sklearn(model)
+
+    rng = np.random.default_rng(1)
+    queries = [
+        X,
+        rng.normal(size=(PREDICT_BLOCK_ROWS * 2 + 3, X.shape[1])) * 3,  # several row blocks
+        X[:1]
+    ]
+    # Rows sitting exactly on (float32-rounded) split thresholds
+    thresholds = compiled.threshold[compiled.left != np.arange(len(compiled.left))]
+    on_split = X[:50].copy()
+    on_split[:, 1] = rng.choice(thresholds, len(on_split)).astype(np.float32)
+    queries.append(on_split)
+
+    for query in queries:
+        np.testing.assert_array_equal(compiled.predict(query), model.predict(query))
+    assert compiled.predict(X[:0]).shape == (0,)
+
+
+def test_round_trip_through_arrays():
+    X, y = training_data()
+    model = GradientBoostingRegressor(n_estimators=20, random_state=0).fit(X, y)
+    compiled = CompiledTreeEnsemble.from_sklearn(model)
+    loaded = CompiledTreeEnsemble.from_arrays(compiled.metadata(), compiled.arrays())
+    np.testing.assert_array_equal(loaded.predict(X), model.predict(X))
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.regime_indicator import CONVERGENCE_LOOKBACK, FAST_SPAN, SLOW_SPAN, StreamingEMAIndicator
+
+# Folding y + a*(x - y) differs from pandas' (1-a)*y + a*x only by rounding
+RTOL = 1e-12
+
+
+def closes(n=300, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2024-01-01", periods=n, freq="4H", tz="UTC")
+    return pd.Series(20000 * np.exp(np.cumsum(rng.normal(0, 0.004, n))), index=index)
+
+
+def assert_matches_pandas(indicator, series):
+    state = indicator.snapshot()
+    fast = series.ewm(span=FAST_SPAN, adjust=False).mean().to_numpy()
+    slow = series.ewm(span=SLOW_SPAN, adjust=False).mean().to_numpy()
+    lookback = min(CONVERGENCE_LOOKBACK, len(series))
+    assert state["data_points"] == len(series)
+    assert state["latest_price"] == series.iloc[-1]
+    np.testing.assert_allclose(state["ema_fast"], fast[-lookback:], rtol=RTOL)
+    np.testing.assert_allclose(state["ema_slow"], slow[-lookback:], rtol=RTOL)
+
+
+def test_single_update_matches_pandas():
+    series = closes()
+    indicator = StreamingEMAIndicator()
+    indicator.update(series)
+    assert_matches_pandas(indicator, series)
+
+
+@pytest.mark.parametrize("chunk", [1, 7, 50])
+def test_incremental_updates_match_pandas(chunk):
+    series = closes()
+    indicator = StreamingEMAIndicator()
+    start = 0
+    while start < len(series):
+        end = min(start + chunk, len(series))
+        # Each update re-delivers the provisional bar, as fetch_market_condition does
+        indicator.update(series.iloc[max(0, start - 1):end])
+        assert_matches_pandas(indicator, series.iloc[:end])
+        start = end
+
+
+def test_revised_provisional_bar_is_replaced():
+    series = closes()
+    indicator = StreamingEMAIndicator()
+    forming = series.iloc[:100].copy()
+    forming.iloc[-1] *= 1.05  # the last bar was still forming at the first fetch
+    indicator.update(forming)
+    assert_matches_pandas(indicator, forming)
+
+    indicator.update(series.iloc[99:])
+    assert_matches_pandas(indicator, series)
+
+
+def test_provisional_bar_not_redelivered_is_committed():
+    series = closes()
+    indicator = StreamingEMAIndicator()
+    indicator.update(series.iloc[:100])
+    indicator.update(series.iloc[100:])
+    assert_matches_pandas(indicator, series)
+
+
+def test_checkpoint_reload_continues_the_series(tmp_path):
+    series = closes()
+    path = str(tmp_path / "state" / "ema_4h.json")
+    indicator = StreamingEMAIndicator()
+    indicator.update(series.iloc[:180])
+    indicator.save(path)
+
+    restored = StreamingEMAIndicator.load(path)
+    assert restored is not None
+    assert_matches_pandas(restored, series.iloc[:180])
+    restored.update(series.iloc[179:])
+    assert_matches_pandas(restored, series)
+
+
+def test_checkpoint_with_other_spans_is_ignored(tmp_path):
+    path = str(tmp_path / "ema_4h.json")
+    StreamingEMAIndicator(fast_span=5, slow_span=8).save(path)
+    assert StreamingEMAIndicator.load(path) is None
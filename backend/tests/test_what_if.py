@@ -0,0 +1,39 @@
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.what_if import simulate_wait_monte_carlo
+
+INVESTMENT_AMOUNT = 100000
+PREDICTED_RETURNS = np.array([6.0, 12.0, 18.0])  # annual %
+
+# Standardized standard_deviation / beta columns: a low-, average- and high-risk fund
+FUNDS = pd.DataFrame({"standard_deviation": [-1.0, 0.0, 1.5], "beta": [-1.0, 0.0, 1.0]})
+
+
+def expected_growth(horizon):
+    """E[value multiple] in a neutral ("sideways") market: the predicted return compounded"""
+    return (1 + PREDICTED_RETURNS / 100) ** horizon
+
+
+@pytest.mark.parametrize("horizon", [1, 10, 30])
+def test_segment_moments_give_expected_growth(horizon):
+    mc = simulate_wait_monte_carlo(PREDICTED_RETURNS, FUNDS, INVESTMENT_AMOUNT, horizon, [3],
+                                   "sideways", num_paths=10, seed=0)
+    mean, sd = mc["segment_log_mean"][:, 0], mc["segment_log_sd"][:, 0]
+    np.testing.assert_allclose(np.exp(mean + sd ** 2 / 2), expected_growth(horizon), rtol=1e-9)
+
+
+@pytest.mark.parametrize("horizon", [1, 10, 30])
+def test_simulated_mean_matches_expected_growth(horizon):
+    mc = simulate_wait_monte_carlo(PREDICTED_RETURNS, FUNDS, INVESTMENT_AMOUNT, horizon, [3],
+                                   "sideways", num_paths=100000, seed=7)
+
+    # Invest-now multiples are lognormal: recover their mean from the p25 / p50 / p75 bands
+    log_multiple = np.log1p(mc["fund_bands"][:, 0] / INVESTMENT_AMOUNT)  # (funds x percentiles)
+    z75 = NormalDist().inv_cdf(0.75)
+    median = log_multiple[:, 2]
+    sd = (log_multiple[:, 3] - log_multiple[:, 1]) / (2 * z75)
+    np.testing.assert_allclose(np.exp(median + sd ** 2 / 2), expected_growth(horizon), rtol=0.02)
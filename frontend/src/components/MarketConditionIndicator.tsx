@@ -53,9 +53,32 @@ export default function MarketConditionIndicator() {
     fetchMarketCondition()
 
     // Poll every 15 minutes (900000 ms) - 4H timeframe updates periodically
-    const interval = setInterval(fetchMarketCondition, 15 * 60 * 1000)
+    let interval: ReturnType<typeof setInterval> | null = null
+    const startPolling = () => {
+      if (interval === null) {
+        interval = setInterval(fetchMarketCondition, 15 * 60 * 1000)
+      }
+    }
 
-    return () => clearInterval(interval)
+    // Updates are pushed when a new 4H bar or a crossover changes the condition;
+    // without EventSource, or once the stream fails (e.g. a serverless backend), poll
+    const unsubscribe = api.subscribeMarketCondition<MarketConditionData>(
+      (result) => {
+        setData(result)
+        setError(null)
+      },
+      startPolling
+    )
+    if (!unsubscribe) {
+      startPolling()
+    }
+
+    return () => {
+      unsubscribe?.()
+      if (interval !== null) {
+        clearInterval(interval)
+      }
+    }
   }, [])
 
   if (loading && !data) {
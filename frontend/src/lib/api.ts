@@ -1,5 +1,11 @@
 const API_BASE_URL = process.env.NEXT_PUBLIC_API_URL || 'http://localhost:8000';
 
+// CDN copy of the backend's static snapshots (python -m app.static_snapshots build)
+const STATIC_SNAPSHOT_URL = process.env.NEXT_PUBLIC_STATIC_SNAPSHOT_URL;
+
+// Server-sent market updates need a long-lived backend (uvicorn / serve.py); "0" polls instead
+const MARKET_STREAM_ENABLED = process.env.NEXT_PUBLIC_MARKET_STREAM !== '0';
+
 export interface RecommendationRequest {
   amc_name?: string;
   category?: string;
@@ -27,6 +33,8 @@ export interface ComparisonRequest {
 }
 
 class ApiClient {
+  private snapshotVersion?: Promise<string | null>;
+
   private async request<T>(endpoint: string, options?: RequestInit): Promise<T> {
     const url = `${API_BASE_URL}${endpoint}`;
     
@@ -45,6 +53,25 @@ class ApiClient {
     return response.json();
   }
 
+  // Dataset-only endpoints: served from the snapshot CDN when configured, else the API
+  private async snapshot<T>(endpoint: string): Promise<T> {
+    if (STATIC_SNAPSHOT_URL) {
+      this.snapshotVersion ??= fetch(`${STATIC_SNAPSHOT_URL}/manifest.json`)
+        .then((response) => (response.ok ? response.json() : null))
+        .then((manifest) => manifest?.version ?? null)
+        .catch(() => null);
+
+      const version = await this.snapshotVersion;
+      if (version) {
+        const response = await fetch(`${STATIC_SNAPSHOT_URL}/${version}${endpoint}.json`).catch(() => null);
+        if (response?.ok) {
+          return response.json();
+        }
+      }
+    }
+    return this.request<T>(endpoint);
+  }
+
   // Health check
   async healthCheck() {
     return this.request('/');
@@ -60,28 +87,28 @@ class ApiClient {
 
   // Data for dropdowns
   async getAMCs() {
-    return this.request<{ amcs: string[] }>('/api/amcs');
+    return this.snapshot<{ amcs: string[] }>('/api/amcs');
   }
 
   async getCategories() {
-    return this.request<{ categories: Array<{ name: string; count: number }> }>('/api/categories');
+    return this.snapshot<{ categories: Array<{ name: string; count: number }> }>('/api/categories');
   }
 
   // Dashboard data
   async getDashboardData() {
-    return this.request('/api/dashboard-data');
+    return this.snapshot('/api/dashboard-data');
   }
 
   async getMarketTrends() {
-    return this.request('/api/market-trends');
+    return this.snapshot('/api/market-trends');
   }
 
   async getDescriptiveAnalysis() {
-    return this.request('/api/descriptive-analysis');
+    return this.snapshot('/api/descriptive-analysis');
   }
 
   async getEnhancedAnalysis() {
-    return this.request('/api/enhanced-analysis');
+    return this.snapshot('/api/enhanced-analysis');
   }
 
   // Fund operations
@@ -146,6 +173,26 @@ class ApiClient {
     }>('/api/market-condition');
   }
 
+  // Market condition pushed over server-sent events when a new 4H bar or crossover
+  // changes it; returns an unsubscribe function, or null where EventSource is unavailable
+  // or the stream is disabled. On error the stream is closed rather than left to
+  // reconnect (serverless backends cannot hold it open) and onError is called.
+  subscribeMarketCondition<T>(onUpdate: (data: T) => void, onError: () => void) {
+    if (!MARKET_STREAM_ENABLED || typeof EventSource === 'undefined') {
+      return null;
+    }
+
+    const source = new EventSource(`${API_BASE_URL}/api/market-condition/stream?sources=condition`);
+    source.addEventListener('market-condition', (event) => {
+      onUpdate(JSON.parse((event as MessageEvent).data));
+    });
+    source.onerror = () => {
+      source.close();
+      onError();
+    };
+    return () => source.close();
+  }
+
   async whatIfSimulation(params: {
     fund_names: string[];
     investment_amount: number;